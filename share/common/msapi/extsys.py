@@ -9,25 +9,76 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 
+import copy
 import json
 import logging
 import re
 
+from django.conf import settings
+
 from common.exceptions import VimDriverNewtonException
+from common.utils import aai_cache
 from common.utils import restcall
+from common.utils import restcall_async
+from common.utils.local_cache import LocalLRUCache
 
 
 logger = logging.getLogger(__name__)
 
+CLOUD_REGION_URL = "/cloud-infrastructure/cloud-regions/cloud-region/%s/%s"
+ESR_SYSTEM_INFO_LIST_URL = CLOUD_REGION_URL + "/esr-system-info-list"
+
+# assembled viminfo by vim_id: (stamp, viminfo)
+# the stamp is the AAI cache key of the esr-system-info-list, which folds
+# the generations of the cloud region, so any AAI write to the cloud region
+# (e.g. a new resource-version) done by any worker invalidates the entry
+_viminfo_cache = LocalLRUCache(
+    max_size=getattr(settings, "VIM_INFO_CACHE_SIZE", 256),
+    ttl=getattr(settings, "VIM_INFO_CACHE_TTL", 300))
+
 
 def get_vim_by_id(vim_id):
     cloud_owner,cloud_region_id = decode_vim_id(vim_id)
 
     if cloud_owner and cloud_region_id:
-        # get cloud region without depth
-        retcode, content, status_code = \
-            restcall.req_to_aai("/cloud-infrastructure/cloud-regions/cloud-region/%s/%s"
-                       % (cloud_owner,cloud_region_id),"GET")
+        # no stamp if the cache is not available, then do not cache
+        stamp = aai_cache.cache_key_by_url(
+            ESR_SYSTEM_INFO_LIST_URL % (cloud_owner, cloud_region_id))
+        cached = _viminfo_cache.get(vim_id)
+        if stamp and cached and cached[0] == stamp:
+            return copy.deepcopy(cached[1])
+
+        viminfo = _get_vim_by_id(vim_id, cloud_owner, cloud_region_id)
+        if stamp and viminfo:
+            _viminfo_cache.set(vim_id, (stamp, copy.deepcopy(viminfo)))
+        return viminfo
+    return None
+
+
+def flush_vim_by_id(vim_id):
+    '''
+    invalidate the viminfo of a cloud region in all the workers,
+    e.g. before registration since ESR updates AAI directly
+    '''
+    cloud_owner, cloud_region_id = decode_vim_id(vim_id)
+    _viminfo_cache.delete(vim_id)
+    aai_cache.flush_cache_by_url(
+        CLOUD_REGION_URL % (cloud_owner, cloud_region_id))
+
+
+def _get_vim_by_id(vim_id, cloud_owner, cloud_region_id):
+    if cloud_owner and cloud_region_id:
+        # get cloud region without depth and the esr-system-info under
+        # this cloud region concurrently
+        (retcode, content, status_code), \
+            (retcode2, content2, status_code2) = restcall_async.run_batch(
+                [(restcall_async.req_to_aai_async,
+                  (CLOUD_REGION_URL % (cloud_owner, cloud_region_id),
+                   "GET")),
+                 (restcall_async.req_to_aai_async,
+                  (ESR_SYSTEM_INFO_LIST_URL
+                   % (cloud_owner, cloud_region_id), "GET"))],
+                return_exceptions=False)
         if retcode != 0:
             logger.error("Status code is %s, detail is %s.", status_code, content)
             raise VimDriverNewtonException(
@@ -35,10 +86,6 @@ def get_vim_by_id(vim_id):
                 status_code, content)
         tmp_viminfo = json.JSONDecoder().decode(content)
 
-        # get esr-system-info under this cloud region
-        retcode2, content2, status_code2 = \
-            restcall.req_to_aai("/cloud-infrastructure/cloud-regions/cloud-region/%s/%s/esr-system-info-list"
-                       % (cloud_owner,cloud_region_id),"GET")
         if retcode2 != 0:
             logger.error("Status code is %s, detail is %s.", status_code2, content2)
             raise VimDriverNewtonException(
@@ -92,6 +139,7 @@ def delete_vim_by_id(vim_id):
         retcode, content, status_code = \
             restcall.req_to_aai("/cloud-infrastructure/cloud-regions/cloud-region/%s/%s?resource-version=%s"
                        % ( cloud_owner, cloud_region_id, viminfo['resource-version']), "DELETE")
+        _viminfo_cache.delete(vim_id)
         if retcode != 0:
             logger.error("Status code is %s, detail is %s.", status_code, content)
             raise VimDriverNewtonException(
@@ -9,8 +9,12 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 
+import heapq
+import itertools
 import json
 import logging
+import os
+from concurrent import futures
 # import re
 import uuid
 import threading
@@ -18,14 +22,74 @@ import datetime
 import time
 #import traceback
 
-# from common.exceptions import VimDriverNewtonException
+from keystoneauth1.exceptions import HttpError
+
+from common.exceptions import VimDriverNewtonException
+from common.utils import aai_bulk
 from common.utils import restcall
+from common.utils import shared_backlog
+from common.utils.local_cache import LocalLRUCache
 
 from rest_framework import status
+from django.conf import settings
 from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
+# Concurrency of the registration:
+# the discovery phases of a cloud region run concurrently, and fan out the
+# AAI updates of their resources over a pool of REGISTRY_AAI_CONCURRENCY
+# threads shared by the process, which bounds the calls in flight to AAI.
+# The discovery requests in flight to the VIMs are bounded by
+# REGISTRY_VIM_CONCURRENCY. The lists are retrieved page by page following
+# the next links, the next page is fetched while a page is processed.
+DEFAULT_REGISTRY_AAI_CONCURRENCY = 8
+DEFAULT_REGISTRY_VIM_CONCURRENCY = 4
+REGISTRY_WORKER_PREFIX = "registry_worker"
+
+_registry_lock = threading.Lock()
+_registry_executor = None
+_vim_slots = None
+# fetches the next page of the lists
+_prefetch_executor = None
+
+
+def _get_registry_executor():
+    global _registry_executor
+    if _registry_executor is None:
+        with _registry_lock:
+            if _registry_executor is None:
+                _registry_executor = futures.ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings, "REGISTRY_AAI_CONCURRENCY",
+                        DEFAULT_REGISTRY_AAI_CONCURRENCY),
+                    thread_name_prefix=REGISTRY_WORKER_PREFIX)
+    return _registry_executor
+
+
+def _get_prefetch_executor():
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _registry_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = futures.ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings, "REGISTRY_VIM_CONCURRENCY",
+                        DEFAULT_REGISTRY_VIM_CONCURRENCY),
+                    thread_name_prefix="registry_prefetch")
+    return _prefetch_executor
+
+
+def _get_vim_slots():
+    global _vim_slots
+    if _vim_slots is None:
+        with _registry_lock:
+            if _vim_slots is None:
+                _vim_slots = threading.BoundedSemaphore(getattr(
+                    settings, "REGISTRY_VIM_CONCURRENCY",
+                    DEFAULT_REGISTRY_VIM_CONCURRENCY))
+    return _vim_slots
+
 
 # Helper of MultiCloud API invocation
 class Helper(object):
@@ -66,6 +130,49 @@ class Helper(object):
         return [1, None, status.HTTP_404_NOT_FOUND] # return resource not found in case no type found
 
 
+# Incremental registration:
+# the cloud region is retrieved from AAI at once with depth=all, and
+# compared with the resources discovered from the VIM, so that only the
+# resources created, changed or removed in the VIM are written to AAI.
+# The hpa capabilities get IDs derived from their content, an unchanged
+# capability keeps its ID and a changed one is replaced.
+# Disabled with REGISTRY_INCREMENTAL = False.
+DEFAULT_REGISTRY_INCREMENTAL = True
+
+HTTP_412_PRECONDITION_FAILED = '412'
+
+
+class AAIRegionSnapshot(object):
+    '''
+    the resources of a cloud region in AAI, indexed by type and ID
+    '''
+
+    # resource type: key attribute
+    RESOURCE_KEYS = {
+        "tenant": "tenant-id",
+        "flavor": "flavor-id",
+        "image": "image-id",
+        "availability-zone": "availability-zone-name",
+        "snapshot": "snapshot-id",
+    }
+
+    def __init__(self, cloud_region):
+        self.cloud_region = cloud_region
+        self._resources = {}
+        for resource_type, key in self.RESOURCE_KEYS.items():
+            collection = cloud_region.get(resource_type + "s") or {}
+            self._resources[resource_type] = dict([
+                (resource[key], resource)
+                for resource in collection.get(resource_type, [])
+                if key in resource])
+
+    def get(self, resource_type, resource_id):
+        return self._resources.get(resource_type, {}).get(resource_id)
+
+    def resources(self, resource_type):
+        return self._resources.get(resource_type, {})
+
+
 # Helper of AAI resource access
 class MultiCloudAAIHelper(object):
     '''
@@ -82,6 +189,74 @@ class MultiCloudAAIHelper(object):
     def _get_list_resources(
             self, resource_url, service_type, session, viminfo,
             vimid, content_key):
+        '''
+        :return: the resources of all the pages, None if failed
+        :raise HttpError, VimDriverNewtonException: left to the callers,
+        e.g. to fall back to the project of the token if forbidden
+        '''
+        resources = None
+        try:
+            for page in self._iter_list_pages(
+                    resource_url, service_type, session, viminfo,
+                    vimid, content_key):
+                if not isinstance(page, list):
+                    return page
+                if resources is None:
+                    resources = []
+                resources.extend(page)
+        except (HttpError, VimDriverNewtonException):
+            raise
+        except Exception as e:
+            self._logger.warn("failed to list %s: %s"
+                              % (resource_url, str(e)))
+            return None # failed to discover resources
+        return resources
+
+    def _iter_list_resources(
+            self, resource_url, service_type, session, viminfo,
+            vimid, content_key, get_page=None):
+        '''
+        yield the resources as the pages arrive
+        '''
+        for page in self._iter_list_pages(
+                resource_url, service_type, session, viminfo,
+                vimid, content_key, get_page):
+            for resource in page or []:
+                yield resource
+
+    def _get_list_page(self, url, service, session):
+        self._logger.debug("making request with URI:%s,%s" % (url, service))
+        resp = session.get(url, endpoint_filter=service)
+        self._logger.debug("request returns with status %s" % resp.status_code)
+        if resp.status_code == status.HTTP_200_OK:
+            return resp.json()
+        return None
+
+    @staticmethod
+    def _next_page_url(content, content_key):
+        # glance
+        if content.get("next"):
+            return content["next"]
+        # nova
+        for link in content.get(content_key + "_links") or []:
+            if link.get("rel") == "next":
+                return link.get("href")
+        # keystone
+        links = content.get("links")
+        if isinstance(links, dict):
+            return links.get("next")
+        return None
+
+    def _iter_list_pages(
+            self, resource_url, service_type, session, viminfo,
+            vimid, content_key, get_page=None):
+        '''
+        yield the pages of a list following the next links, the next page
+        is fetched while the current one is processed
+        :param get_page: gets the content of a page url, None if failed,
+        called within the slots of the VIM
+        :raise Exception: a page could not be retrieved
+        '''
         service = {
             'service_type': service_type,
             'interface': 'public'
@@ -93,17 +268,43 @@ class MultiCloudAAIHelper(object):
             service['region_name'] = viminfo.get('openstack_region_id') \
                 or viminfo['cloud_region_id']
 
-        self._logger.debug("making request with URI:%s,%s" % (resource_url, service))
-        resp = session.get(resource_url, endpoint_filter=service)
-        self._logger.debug("request returns with status %s" % resp.status_code)
-        if resp.status_code == status.HTTP_200_OK:
-            self._logger.debug("with content:%s" % resp.json())
-            content = resp.json()
-            return content.get(content_key)
-        return  None # failed to discover resources
+        fetch_page = get_page or (
+            lambda url: self._get_list_page(url, service, session))
+
+        def get_vim_page(url):
+            with _get_vim_slots():
+                return fetch_page(url)
+
+        url = resource_url
+        visited = set()
+        prefetch = None
+        while url:
+            visited.add(url)
+            content = prefetch.result() if prefetch else get_vim_page(url)
+            if content is None:
+                raise Exception("failed to list %s of %s" % (url, vimid))
+
+            resources = content.get(content_key)
+            url = self._next_page_url(content, content_key) \
+                if isinstance(resources, list) and resources else None
+            if url in visited:
+                url = None
+            prefetch = _get_prefetch_executor().submit(get_vim_page, url) \
+                if url else None
+            try:
+                yield resources
+            except GeneratorExit:
+                if prefetch:
+                    prefetch.cancel()
+                raise
 
     def _update_resoure(self, cloud_owner, cloud_region_id,
-                        resoure_id, resource_info, resource_type):
+                        resoure_id, resource_info, resource_type,
+                        snapshot=None):
+        '''
+        :param snapshot: AAIRegionSnapshot to take the current resource
+        from instead of getting it from AAI before the PUT
+        '''
         if cloud_owner and cloud_region_id:
             self._logger.debug(
                 ("_update_resoure,vimid:%(cloud_owner)s"
@@ -128,9 +329,22 @@ class MultiCloudAAIHelper(object):
                          "resource_type": resource_type,
                      })
 
+            if snapshot is not None:
+                # one call: the resource-version is taken from the snapshot
+                retcode, content, status_code = restcall.req_to_aai(
+                    resource_url, "PUT", content=self._merge_snapshot(
+                        snapshot.get(resource_type, resoure_id),
+                        resource_info))
+                if str(status_code) != HTTP_412_PRECONDITION_FAILED:
+                    return retcode, content
+                # the snapshot is stale, the resource changed since
+                self._logger.info("resource-version of %s is stale: %s"
+                                  % (resource_url, content))
+
             # get cloud-region
             retcode, content, status_code = \
-                restcall.req_to_aai(resource_url, "GET")
+                restcall.req_to_aai(resource_url, "GET",
+                                    nocache=snapshot is not None)
 
             # add resource-version
             if retcode == 0 and content:
@@ -161,7 +375,339 @@ class MultiCloudAAIHelper(object):
             11,
             "Unknown Cloud Region ID: %s ,%s" %(cloud_owner, cloud_region_id)
         )
-    pass
+
+    @staticmethod
+    def _merge_snapshot(current, resource_info):
+        '''
+        :param current: the resource in the snapshot, None if not there
+        :return: the resource to PUT, with the resource-version of current
+        '''
+        if not current:
+            return resource_info
+        # the children of the snapshot (depth=all) are written separately
+        merged = dict([(k, v) for k, v in current.items()
+                       if not isinstance(v, dict) or k == "relationship-list"])
+        merged.update(resource_info)
+        return merged
+
+    def _update_resources(self, cloud_owner, cloud_region_id, resources,
+                          snapshot=None):
+        '''
+        update a batch of resources with bounded concurrency
+        :param resources: list of (resource_id, resource_info, resource_type)
+        :return: list of (retcode, content) in the order of resources
+        '''
+        results = self._fan_out(
+            lambda resource: self._update_resoure(
+                cloud_owner, cloud_region_id, *resource, snapshot=snapshot),
+            resources, return_exceptions=True)
+        return [
+            (11, str(r)) if isinstance(r, Exception) else r
+            for r in results
+        ]
+
+    def _get_region_snapshot(self, cloud_owner, cloud_region_id):
+        '''
+        :return: AAIRegionSnapshot of the cloud region, None if the
+        incremental registration is disabled or the region not available
+        '''
+        if not getattr(settings, "REGISTRY_INCREMENTAL",
+                       DEFAULT_REGISTRY_INCREMENTAL):
+            return None
+        resource_url = ("/cloud-infrastructure/cloud-regions/"
+                        "cloud-region/%s/%s?depth=all"
+                        % (cloud_owner, cloud_region_id))
+        retcode, content, status_code = \
+            restcall.req_to_aai(resource_url, "GET", nocache=True)
+        if retcode != 0 or not content:
+            self._logger.warn(
+                "cloud region %s_%s not retrieved from AAI: %s, "
+                "fall back to full registration"
+                % (cloud_owner, cloud_region_id, status_code))
+            return None
+        try:
+            return AAIRegionSnapshot(json.loads(content))
+        except Exception as e:
+            self._logger.warn("invalid cloud region %s_%s: %s"
+                              % (cloud_owner, cloud_region_id, str(e)))
+            return None
+
+    @staticmethod
+    def _is_unchanged(snapshot, resource_id, resource_info, resource_type):
+        '''
+        :return: True if the snapshot holds the resource with the same
+        attributes, the child resources are not compared
+        '''
+        if snapshot is None:
+            return False
+        current = snapshot.get(resource_type, resource_id)
+        if current is None:
+            return False
+        for key, value in resource_info.items():
+            if isinstance(value, dict):
+                continue
+            # AAI may return the numbers as strings
+            if current.get(key) != value \
+                    and str(current.get(key)) != str(value):
+                return False
+        return True
+
+    def _put_resource(self, cloud_owner, cloud_region_id, resource_id,
+                      resource_info, resource_type, snapshot=None):
+        '''
+        _update_resoure unless the snapshot shows the resource is unchanged
+        '''
+        if self._is_unchanged(
+                snapshot, resource_id, resource_info, resource_type):
+            return 0, "unchanged"
+        return self._update_resoure(
+            cloud_owner, cloud_region_id, resource_id,
+            resource_info, resource_type, snapshot)
+
+    @staticmethod
+    def _stable_hpa_capability_ids(flavor_id, hpa_capabilities):
+        '''
+        derive the ID of each hpa capability from the flavor and its content
+        '''
+        for capability in hpa_capabilities:
+            if not isinstance(capability, dict):
+                continue
+            content = dict(capability)
+            content.pop("hpa-capability-id", None)
+            content["hpa-feature-attributes"] = sorted(
+                content.get("hpa-feature-attributes", []),
+                key=lambda a: a.get("hpa-attribute-key", ""))
+            capability["hpa-capability-id"] = str(uuid.uuid5(
+                uuid.NAMESPACE_URL, "%s/%s" % (
+                    flavor_id, json.dumps(content, sort_keys=True))))
+        return hpa_capabilities
+
+    def _put_flavor(self, cloud_owner, cloud_region_id, flavor_info,
+                    snapshot=None):
+        '''
+        update a flavor and its hpa capabilities, only the capabilities
+        added or removed are written to AAI if the flavor is in the snapshot
+        '''
+        flavor_id = flavor_info['flavor-id']
+        current = snapshot.get("flavor", flavor_id) if snapshot else None
+        if current is None:
+            return self._update_resoure(
+                cloud_owner, cloud_region_id, flavor_id,
+                flavor_info, "flavor", snapshot)
+
+        flavor_info = dict(flavor_info)
+        hpa_capabilities = flavor_info.pop('hpa-capabilities', None) or {}
+        retcode, content = self._put_resource(
+            cloud_owner, cloud_region_id, flavor_id, flavor_info,
+            "flavor", snapshot)
+
+        flavor_url = ("/cloud-infrastructure/cloud-regions/"
+                      "cloud-region/%s/%s/flavors/flavor/%s"
+                      % (cloud_owner, cloud_region_id, flavor_id))
+        wanted = dict([
+            (c['hpa-capability-id'], c)
+            for c in hpa_capabilities.get('hpa-capability', [])
+            if isinstance(c, dict)])
+        existing = dict([
+            (c['hpa-capability-id'], c)
+            for c in (current.get('hpa-capabilities') or {}).get(
+                'hpa-capability', [])])
+        for capability_id in set(wanted) - set(existing):
+            restcall.req_to_aai(
+                flavor_url + "/hpa-capabilities/hpa-capability/%s"
+                % capability_id, "PUT", content=wanted[capability_id])
+        for capability_id in set(existing) - set(wanted):
+            restcall.req_to_aai(
+                flavor_url + "/hpa-capabilities/hpa-capability/%s"
+                "?resource-version=%s"
+                % (capability_id,
+                   existing[capability_id]['resource-version']),
+                "DELETE")
+        return retcode, content
+
+    @staticmethod
+    def _get_related(resource, related_to, key):
+        '''
+        :return: values of key of the relationships of the resource
+        in the snapshot to the resources of type related_to
+        '''
+        values = set()
+        for relationship in ((resource or {}).get("relationship-list")
+                             or {}).get("relationship", []):
+            if relationship.get("related-to") != related_to:
+                continue
+            for data in relationship.get("relationship-data", []):
+                if data.get("relationship-key") == key:
+                    values.add(data.get("relationship-value"))
+        return values
+
+    def _delete_stale_resources(self, cloud_owner, cloud_region_id,
+                                resource_type, resource_ids, snapshot):
+        '''
+        remove from AAI the resources of the snapshot not in resource_ids,
+        i.e. removed from the VIM
+        :return: number of resources removed
+        '''
+        if snapshot is None:
+            return 0
+        resource_ids = set(resource_ids)
+        region_url = ("/cloud-infrastructure/cloud-regions/"
+                      "cloud-region/%s/%s" % (cloud_owner, cloud_region_id))
+        aai_writer = aai_bulk.AAIBulkWriter()
+        removed = 0
+        for resource_id, resource in snapshot.resources(
+                resource_type).items():
+            if resource_id in resource_ids:
+                continue
+            resource_url = "%s/%ss/%s/%s" % (
+                region_url, resource_type, resource_type, resource_id)
+            if resource_type == "tenant" and \
+                    (resource.get("vservers") or {}).get("vserver"):
+                self._logger.warn("tenant %s removed from the VIM still has"
+                                  " vservers in AAI" % resource_id)
+                continue
+            for capability in (resource.get("hpa-capabilities") or {}).get(
+                    "hpa-capability", []):
+                aai_writer.delete(
+                    resource_url + "/hpa-capabilities/hpa-capability/%s"
+                    "?resource-version=%s"
+                    % (capability["hpa-capability-id"],
+                       capability["resource-version"]))
+            if resource_type == "availability-zone":
+                # queued ahead of the az, as in teardown.TeardownPlan
+                for relationship in (resource.get("relationship-list")
+                                     or {}).get("relationship", []):
+                    aai_writer.delete(
+                        resource_url + "/relationship-list/relationship",
+                        relationship)
+            aai_writer.delete(resource_url + "?resource-version=%s"
+                              % resource["resource-version"])
+            removed += 1
+        aai_writer.flush()
+        for op, retcode, content, status_code in aai_writer.failures():
+            self._logger.warn("failed to remove %s from AAI: %s, %s"
+                              % (op["uri"], status_code, content))
+        return removed
+
+    def _fan_out(self, func, items, return_exceptions=False):
+        '''
+        apply func to each item over the registry worker pool
+        :param return_exceptions: if True, an exception raised for an item
+        is returned as its result, otherwise the first one is raised once
+        all the items are processed
+        :return: list of results in the order of items
+        '''
+        items = list(items)
+        if threading.current_thread().name.startswith(
+                REGISTRY_WORKER_PREFIX):
+            # already on the pool, waiting on it could dead lock
+            tasks = [futures.Future() for _ in items]
+            for task, item in zip(tasks, items):
+                try:
+                    task.set_result(func(item))
+                except Exception as e:
+                    task.set_exception(e)
+        else:
+            executor = _get_registry_executor()
+            tasks = [executor.submit(func, item) for item in items]
+            futures.wait(tasks)
+        results = []
+        for task in tasks:
+            error = task.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results.append(error if error is not None else task.result())
+        return results
+
+    def _run_phases(self, phases):
+        '''
+        run independent discovery phases concurrently
+        :param phases: list of (method, args)
+        :return: list of results in the order of phases
+        '''
+        with futures.ThreadPoolExecutor(
+                max_workers=max(len(phases), 1),
+                thread_name_prefix="registry_phase") as executor:
+            tasks = [executor.submit(method, *args)
+                     for method, args in phases]
+        results = []
+        for (method, _), task in zip(phases, tasks):
+            try:
+                results.append(task.result())
+            except Exception as e:
+                self._logger.error("%s failed: %s" % (method.__name__, str(e)))
+                results.append((11, str(e)))
+        return results
+
+
+# Scheduling of the backlog items:
+# the items are kept in a heap by due time. The helper thread waits on a
+# condition variable until the first item is due or the backlog changes,
+# then hands the due items over to a pool of BACKLOG_WORKERS threads, so
+# that a slow item does not hold up the others. An item still running
+# after its "timeout" (BACKLOG_ITEM_TIMEOUT seconds by default) is reported
+# as timed out and its late result is dropped: the thread running it can
+# not be stopped, a repeating item is scheduled again once it returns.
+# The repeating items of a named worker, registered with register_worker in
+# every process, are shared by the uwsgi workers if BACKLOG_SHARED is set:
+# they run in the process holding their lease, see shared_backlog. The
+# helper polls the shared jobs and renews its leases every third of
+# BACKLOG_LEASE_TIME, on a thread of its own: the heartbeat does not queue
+# up behind long items, else their leases would expire while they run.
+# The items are kept as BacklogRecord. Once over, only the status of a one
+# time item is kept, in a store bounded to BACKLOG_EXPIRED_MAX_SIZE items
+# for BACKLOG_EXPIRED_TTL seconds, and in the shared cache which still
+# answers for the items evicted. The status of an item is written to the
+# cache when it changes, or when the entry is about to expire, rather than
+# on every run.
+DEFAULT_BACKLOG_WORKERS = 4
+DEFAULT_BACKLOG_ITEM_TIMEOUT = 3600
+DEFAULT_BACKLOG_EXPIRED_MAX_SIZE = 1024
+DEFAULT_BACKLOG_EXPIRED_TTL = 3600
+# delay in usecond of an item due while its previous run is in progress
+BACKLOG_BUSY_DELAY = 1000000
+# seconds the status of an item is kept in the cache
+BACKLOG_STATUS_TTL = 3600 * 24
+
+
+class BacklogRecord(object):
+    '''
+    backlog item, read and written as a dict: the fields not set are
+    missing keys
+    '''
+    __slots__ = ("id", "worker", "worker_name", "payload", "repeat",
+                 "timeout", "timestamp", "status", "written")
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def from_item(cls, backlog_item):
+        record = cls()
+        for key, value in backlog_item.items():
+            if key in cls.__slots__:
+                setattr(record, key, value)
+            else:
+                logger.warn("ignore the field %s of backlog item %s"
+                            % (key, backlog_item.get("id", None)))
+        return record
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __repr__(self):
+        return repr(dict([(key, getattr(self, key))
+                          for key in self.__slots__ if hasattr(self, key)]))
 
 
 # thread helper
@@ -188,22 +734,51 @@ class MultiCloudThreadHelper(object):
         # {
         #   "id": unique string to identify this item in backlog,
         #   "worker": pointer to helper method
+        #   "worker_name": optional, name of the registered worker,
+        #                  to share a repeating item with the other processes
         #   "payload": opaque object to pass to the worker for processing
         #   "repeat": interval in micro-seconds for repeating this worker, 0 for one time worker
+        #   "timeout": optional, seconds a run of the worker may take
         #   "timestamp": time stamp of last invocation of this worker, 0 for initial state
         #   "status": opaque object to represent the progress of the backlog processing
         # }
         # format of backlog:
-        # {"<id value of backlog item>": <backlog item>, ...}
+        # {"<id value of backlog item>": <BacklogRecord>, ...}
         self.name = name or "default"
         self.backlog = {}
-        # expired backlog items
-        self.expired_backlog = {}
+        # expired backlog items: id and status
+        self.expired_backlog = LocalLRUCache(
+            max_size=getattr(settings, "BACKLOG_EXPIRED_MAX_SIZE",
+                             DEFAULT_BACKLOG_EXPIRED_MAX_SIZE),
+            ttl=getattr(settings, "BACKLOG_EXPIRED_TTL",
+                        DEFAULT_BACKLOG_EXPIRED_TTL))
         self.lock = threading.Lock()
         self.state_ = 0  # 0: stopped, 1: started
         self.cache_prefix = "bi_"+self.name+"_"
         self.cache_expired_prefix = "biex_"+self.name+"_"
 
+        # guards the schedule, notified when it changes
+        self.cond = threading.Condition()
+        # heap of (due time in usecond, sequence, backlog id)
+        self.due = []
+        self.sequence = itertools.count()
+        # backlog id: sequence of its valid entry in the heap
+        self.scheduled = {}
+        # backlog id: {"item", "deadline", "timed_out"}
+        self.running = {}
+        self.executor = None
+        # runs the heartbeat of the shared backlog
+        self.sync_executor = None
+
+        # name: worker method, for the items of the shared backlog
+        self.workers = {}
+        self.shared = None
+        # ids of the shared items leased by this process
+        self.leased = set()
+        self.syncing = False
+        self.next_sync = 0
+
+        self.pid = os.getpid()
         self.thread = MultiCloudThreadHelper.HelperThread(self)
         # self.thread.start()
 
@@ -212,6 +787,17 @@ class MultiCloudThreadHelper(object):
 
     def start(self):
         self.lock.acquire()
+        if self.pid != os.getpid():
+            # the thread of the parent is not running after a fork
+            self.pid = os.getpid()
+            self.state_ = 0
+            self.executor = None
+            self.sync_executor = None
+            self.syncing = False
+            self.thread = MultiCloudThreadHelper.HelperThread(self)
+            if self.shared:
+                self.shared = shared_backlog.SharedBacklog(self.name)
+                self.leased = set()
         if 0 == self.state_:
             self.state_ = 1
             # self.thread = MultiCloudThreadHelper.HelperThread(self)
@@ -221,34 +807,60 @@ class MultiCloudThreadHelper(object):
         self.lock.release()
 
     def stop(self):
-        self.state_ = 0
+        with self.cond:
+            self.state_ = 0
+            self.cond.notify_all()
+
+    def register_worker(self, name, worker):
+        '''
+        register a worker by name, so that the items added by another
+        process with this "worker_name" can run in this one
+        '''
+        self.workers[name] = worker
+        if not getattr(settings, "BACKLOG_SHARED", True):
+            return
+        if not self.shared:
+            self.shared = shared_backlog.SharedBacklog(self.name)
+        # take over the shared items whatever the requests this process serves
+        self.start()
 
     def add(self, backlog_item):
-        cache_for_query = None
+        cache_for_query = False
+        if backlog_item.get("worker_name", None) \
+                and not backlog_item.get("worker", None):
+            backlog_item["worker"] = self.workers.get(
+                backlog_item["worker_name"], None)
         if not backlog_item.get("worker", None):
             logger.warn("Fail to add backlog item: %s" % backlog_item)
             return None
         if not backlog_item.get("id", None):
             backlog_item["id"] = str(uuid.uuid1())
         else:
-            cache_for_query = {
-                "id": backlog_item["id"],
-                "status": backlog_item.get("status", None)
-            }
+            cache_for_query = True
 
         if not backlog_item.get("repeat", None):
             backlog_item["repeat"] = 0
         backlog_item["timestamp"] = 0
+        backlog_item = BacklogRecord.from_item(backlog_item)
 
-        # self.lock.acquire()
         # make sure there is no identical backlog in expired backlog
         if cache_for_query:
-            cache.set(self.cache_prefix + backlog_item["id"],
-                      json.dumps(cache_for_query), 3600 * 24)
+            self._cache_status(backlog_item)
 
-        self.expired_backlog.pop(backlog_item["id"], None)
-        self.backlog[backlog_item["id"]] = backlog_item
-        # self.lock.release()
+        if self._is_shared(backlog_item):
+            self.shared.publish(backlog_item["id"], {
+                "worker": backlog_item["worker_name"],
+                "payload": list(backlog_item.get("payload", None) or []),
+                "repeat": backlog_item["repeat"],
+                "timeout": backlog_item.get("timeout", None),
+            })
+
+        with self.cond:
+            self.expired_backlog.delete(backlog_item["id"])
+            self.backlog[backlog_item["id"]] = backlog_item
+            # due at once
+            self._schedule_locked(backlog_item["id"], 0)
+            self.cond.notify()
         logger.debug("Add backlog item: %s" % backlog_item)
         return len(self.backlog)
 
@@ -266,6 +878,16 @@ class MultiCloudThreadHelper(object):
                     item = json.loads(cache_for_query_str)
         return item
 
+    def report(self, backlog_id, status):
+        '''
+        update the status of a backlog item while its worker is running
+        '''
+        item = self.backlog.get(backlog_id, None)
+        if not item:
+            return
+        item["status"] = status
+        self._cache_status(item)
+
     # check if the backlog item is in expired backlog
     def expired(self, backlog_id):
         if not self.backlog.get(backlog_id, None):
@@ -284,30 +906,281 @@ class MultiCloudThreadHelper(object):
     def expire(self, backlog_id):
         # important: the order of operation should make sure
         # there is at least 1 copy of backlog item in either backlog or expired backlog
-        # self.lock.acquire()
-        backlogitem = self.backlog.get(backlog_id, None)
-        # self.owner.expired_backlog[backlog_id] = backlogitem
-        self.expired_backlog[backlog_id] = backlogitem
-        self.backlog.pop(backlog_id, None)
-        # self.lock.release()
+        with self.cond:
+            backlogitem = self.backlog.get(backlog_id, None)
+            # keep only the id and status
+            self.expired_backlog.set(backlog_id, BacklogRecord(
+                id=backlog_id, status=backlogitem.get("status", None)
+            ) if backlogitem else None)
+            self.backlog.pop(backlog_id, None)
+            self.scheduled.pop(backlog_id, None)
 
     def remove(self, backlog_id):
-        # self.lock.acquire()
-        self.backlog.pop(backlog_id, None)
-        self.expired_backlog.pop(backlog_id, None)
+        with self.cond:
+            self.backlog.pop(backlog_id, None)
+            self.expired_backlog.delete(backlog_id)
+            # the entries left in the heap are skipped
+            self.scheduled.pop(backlog_id, None)
+            self.leased.discard(backlog_id)
+            self.cond.notify()
+        if self.shared:
+            # the other processes drop it on their next poll
+            self.shared.withdraw(backlog_id)
         cache.delete(self.cache_prefix + backlog_id)
         cache.delete(self.cache_expired_prefix + backlog_id)
-        # self.lock.release()
 
     def reset(self):
-        # self.lock.acquire()
-        self.backlog.clear()
-        self.expired_backlog.clear()
-        # self.lock.release()
+        with self.cond:
+            self.backlog.clear()
+            self.expired_backlog.clear()
+            self.scheduled.clear()
+            self.due = []
+            self.cond.notify()
 
     #def count(self):
     #    return len(self.backlog)
 
+    def _is_shared(self, item):
+        return bool(self.shared and item.get("worker_name", None)
+                    and item.get("repeat", 0) > 0)
+
+    def _schedule_locked(self, backlog_id, due):
+        sequence = next(self.sequence)
+        self.scheduled[backlog_id] = sequence
+        heapq.heappush(self.due, (due, sequence, backlog_id))
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = futures.ThreadPoolExecutor(
+                max_workers=getattr(
+                    settings, "BACKLOG_WORKERS", DEFAULT_BACKLOG_WORKERS),
+                thread_name_prefix="backlog_" + self.name)
+        return self.executor
+
+    def _get_sync_executor(self):
+        if self.sync_executor is None:
+            self.sync_executor = futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="backlog_sync_" + self.name)
+        return self.sync_executor
+
+    def _dispatch_locked(self):
+        '''
+        submit the due items and time out the overdue runs
+        :return: seconds to wait for the next due item or deadline,
+        None if there is nothing to wait for
+        '''
+        now = MultiCloudThreadHelper.get_epoch_now_usecond()
+        next_time = None
+
+        for backlog_id, run in list(self.running.items()):
+            if run["timed_out"]:
+                continue
+            if now >= run["deadline"]:
+                self._time_out_locked(backlog_id, run)
+            elif next_time is None or run["deadline"] < next_time:
+                next_time = run["deadline"]
+
+        while self.due and self.due[0][0] <= now:
+            due, sequence, backlog_id = heapq.heappop(self.due)
+            item = self.backlog.get(backlog_id, None)
+            if self.scheduled.get(backlog_id) != sequence or not item:
+                # removed or scheduled again since
+                continue
+            if backlog_id in self.running:
+                # the previous run is not over yet
+                self._schedule_locked(backlog_id, now + BACKLOG_BUSY_DELAY)
+                continue
+            timeout = item.get("timeout", None) or getattr(
+                settings, "BACKLOG_ITEM_TIMEOUT", DEFAULT_BACKLOG_ITEM_TIMEOUT)
+            run = {"item": item, "deadline": now + int(timeout * 1e6),
+                   "timed_out": False}
+            self.running[backlog_id] = run
+            try:
+                self._get_executor().submit(self._run, backlog_id, run, now)
+            except Exception as e:
+                logger.error("failed to run backlog item %s: %s"
+                             % (backlog_id, str(e)))
+                self.running.pop(backlog_id, None)
+                continue
+            if next_time is None or run["deadline"] < next_time:
+                next_time = run["deadline"]
+
+        if self.shared and not self.syncing:
+            if now >= self.next_sync:
+                self.syncing = True
+                try:
+                    self._get_sync_executor().submit(self._sync)
+                except Exception as e:
+                    logger.error("failed to poll the shared backlog %s: %s"
+                                 % (self.name, str(e)))
+                    self.syncing = False
+            elif next_time is None or self.next_sync < next_time:
+                next_time = self.next_sync
+
+        if self.due and (next_time is None or self.due[0][0] < next_time):
+            next_time = self.due[0][0]
+        if next_time is None:
+            return None
+        return max(0, (next_time - now) / 1e6)
+
+    def _time_out_locked(self, backlog_id, run):
+        run["timed_out"] = True
+        item = run["item"]
+        logger.warn("backlog item %s of %s timed out" % (backlog_id, self.name))
+        self._finish_locked(
+            backlog_id, item, "Timed out", item.get("timestamp", 0))
+
+    def _sync(self):
+        '''
+        take the shared items added or removed by the other processes
+        and renew the leases held by this one
+        '''
+        try:
+            jobs = self.shared.jobs()
+            if jobs is not None:
+                self._sync_jobs(jobs)
+            with self.cond:
+                leased = list(self.leased)
+            lost = self.shared.renew(leased)
+            if lost:
+                logger.info("leases of %s lost: %s" % (self.name, lost))
+                with self.cond:
+                    self.leased.difference_update(lost)
+        finally:
+            with self.cond:
+                self.syncing = False
+                self.next_sync = \
+                    MultiCloudThreadHelper.get_epoch_now_usecond() + \
+                    int(shared_backlog.get_lease_time() * 1e6 / 3)
+                self.cond.notify()
+
+    def _sync_jobs(self, jobs):
+        with self.cond:
+            for backlog_id, job in jobs.items():
+                item = self.backlog.get(backlog_id, None)
+                if item:
+                    if self._is_shared(item):
+                        # added again by another process
+                        item["payload"] = tuple(job.get("payload") or [])
+                        item["repeat"] = job["repeat"]
+                    continue
+                worker = self.workers.get(job.get("worker"), None)
+                if not worker:
+                    continue
+                self.expired_backlog.delete(backlog_id)
+                self.backlog[backlog_id] = BacklogRecord(
+                    id=backlog_id,
+                    worker=worker,
+                    worker_name=job["worker"],
+                    payload=tuple(job.get("payload") or []),
+                    repeat=job["repeat"],
+                    timeout=job.get("timeout", None),
+                    timestamp=0,
+                    status=None)
+                self._schedule_locked(backlog_id, 0)
+            for backlog_id, item in list(self.backlog.items()):
+                if self._is_shared(item) and backlog_id not in jobs:
+                    # removed by another process
+                    self.backlog.pop(backlog_id, None)
+                    self.scheduled.pop(backlog_id, None)
+                    self.leased.discard(backlog_id)
+
+    def _run(self, backlog_id, run, now):
+        item = run["item"]
+        if self._is_shared(item):
+            if not self.shared.acquire(backlog_id):
+                self._skip(backlog_id, run, now)
+                return
+            with self.cond:
+                self.leased.add(backlog_id)
+
+        worker = item.get("worker", None)
+        payload = item.get("payload", None)
+        try:
+            returncode, status = worker(*payload) or (0, "Succeed")
+        except Exception as e:
+            status = str(e)
+
+        with self.cond:
+            self.running.pop(backlog_id, None)
+            if run["timed_out"]:
+                # the status was reported already
+                logger.warn("drop the late result of backlog item %s: %s"
+                            % (backlog_id, status))
+                if item.get("repeat", 0) > 0 \
+                        and self.backlog.get(backlog_id, None) is item:
+                    self._schedule_locked(backlog_id, now + item["repeat"])
+            else:
+                self._finish_locked(backlog_id, item, status, now)
+            self.cond.notify()
+
+    def _skip(self, backlog_id, run, now):
+        '''
+        the item runs in another process, take its status from the cache
+        '''
+        item = run["item"]
+        try:
+            cache_for_query_str = cache.get(self.cache_prefix + backlog_id)
+            if cache_for_query_str:
+                item["status"] = json.loads(cache_for_query_str)["status"]
+        except Exception as e:
+            logger.error(str(e))
+        with self.cond:
+            self.running.pop(backlog_id, None)
+            self.leased.discard(backlog_id)
+            if self.backlog.get(backlog_id, None) is item:
+                self._schedule_locked(backlog_id, now + item["repeat"])
+            self.cond.notify()
+
+    def _cache_status(self, item):
+        '''
+        write the status of a pending item to the cache, unless it is the
+        status written already and its entry is not about to expire
+        '''
+        cache_item_for_query_str = json.dumps({
+            "id": item["id"],
+            "status": item.get("status", None)
+        })
+        digest = hash(cache_item_for_query_str)
+        now = time.time()
+        written = item.get("written", None)
+        if written and written[0] == digest \
+                and now - written[1] < BACKLOG_STATUS_TTL / 2:
+            return
+        try:
+            cache.set(self.cache_prefix + item["id"],
+                      cache_item_for_query_str, BACKLOG_STATUS_TTL)
+            item["written"] = (digest, now)
+        except Exception as e:
+            logger.error(str(e))
+
+    def _finish_locked(self, backlog_id, item, status, now):
+        item["status"] = status
+        if self.backlog.get(backlog_id, None) is not item:
+            # removed or replaced while running
+            return
+        if item.get("repeat", 0) == 0:
+            self.backlog.pop(backlog_id, None)
+            self.scheduled.pop(backlog_id, None)
+            # keep only the id and status
+            self.expired_backlog.set(
+                backlog_id, BacklogRecord(id=backlog_id, status=status))
+
+            #update cache
+            try:
+                cache.set(self.cache_expired_prefix + backlog_id,
+                          json.dumps({"id": backlog_id, "status": status}),
+                          BACKLOG_STATUS_TTL)
+                cache.delete(self.cache_prefix + backlog_id)
+            except Exception as e:
+                logger.error(str(e))
+        else:
+            item["timestamp"] = now
+            if not self.running.get(backlog_id, {}).get("timed_out"):
+                self._schedule_locked(backlog_id, now + item["repeat"])
+            #update cache
+            self._cache_status(item)
+
     class HelperThread(threading.Thread):
         def __init__(self, owner):
             threading.Thread.__init__(self)
@@ -319,65 +1192,12 @@ class MultiCloudThreadHelper(object):
 
         def run(self):
             logger.debug("Thread %s starts processing backlogs" % self.owner.name)
-            nexttimer = 0
-            while self.owner.state_ == 1:  # and self.owner.count() > 0:
-                if nexttimer > 1000000:
-                    # sleep in case of interval > 1 second
-                    time.sleep(nexttimer // 1000000)
-                nexttimer = 30*1000000  # initial interval in us to be updated:30 seconds
-                # logger.debug("self.owner.backlog: %s, len: %s" % (self.owner.name, len(self.owner.backlog)))
-                for backlog_id, item in list(self.owner.backlog.items()):
-                    # logger.debug("evaluate backlog item: %s" % item)
-                    # check interval for repeatable backlog item
-                    now = MultiCloudThreadHelper.get_epoch_now_usecond()
-                    repeat_interval = item.get("repeat", 0)
-                    if repeat_interval > 0:
-                        timestamp = item.get("timestamp", 0)
-                        timeleft = (now - timestamp
-                                              if now > timestamp
-                                              else repeat_interval)
-                        nexttimer = timeleft if nexttimer > timeleft else nexttimer
-                        # compare interval with elapsed time.
-                        # workaround the case of timestamp turnaround
-                        if repeat_interval > timeleft:
-                            # not time to run this backlog item yet
-                            continue
-
-                    # logger.debug("process backlog item: %s" % backlog_id)
-                    worker = item.get("worker", None)
-                    payload = item.get("payload", None)
-                    try:
-                        returncode, item["status"] = worker(*payload) or (0, "Succeed")
-                    except Exception as e:
-                        item["status"] = str(e)
-                    cache_item_for_query = {
-                        "id": item["id"],
-                        "status": item["status"]
-                    }
-                    cache_item_for_query_str = json.dumps(cache_item_for_query)
-                    if item.get("repeat", 0) == 0:
-                        self.owner.expire(backlog_id)
-                        # keep only the id and status
-                        self.owner.expired_backlog[backlog_id] = {"status": item["status"]}
-
-                        #update cache
-                        try:
-                            cache.set(self.owner.cache_expired_prefix + cache_item_for_query["id"], cache_item_for_query_str, 3600*24)
-                            cache.delete(self.owner.cache_prefix + cache_item_for_query["id"])
-                        except Exception as e:
-                            logger.error(str(e))
-                    else:
-                        item["timestamp"] = now
-                        #update cache
-                        try:
-                            cache.set(self.owner.cache_prefix + cache_item_for_query["id"], cache_item_for_query_str, 3600*24)
-                        except Exception as e:
-                            logger.error(str(e))
-                pass
-            # end of loop
-            # while True:
-            #     logger.debug("thread sleep for 5 seconds")
-            #     time.sleep(5)  # wait forever, testonly
+            with self.owner.cond:
+                while self.owner.state_ == 1:
+                    timeout = self.owner._dispatch_locked()
+                    if self.owner.state_ == 1:
+                        # woken up by add/remove, a run over or due items
+                        self.owner.cond.wait(timeout)
             logger.debug("Thread %s stops processing backlogs" % self.owner.name)
             self.owner.state_ = 0
             # end of processing
@@ -0,0 +1,172 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import logging
+
+from common.utils import aai_bulk
+
+logger = logging.getLogger(__name__)
+
+# Teardown of a cloud region in AAI:
+# the deletes are planned from the cloud region retrieved with depth=all,
+# as levels of a DAG where the children come before their parents:
+#   0. l-interfaces, hpa-capabilities, relationships of the az
+#   1. vservers
+#   2. tenants, flavors, images, availability-zones, snapshots
+#   3. the cloud region
+# The deletes of a level run concurrently. A resource is not deleted if
+# one of its children could not be, so a failed teardown leaves a
+# consistent subset in AAI and it is resumed by running it again: the
+# plan of the next run holds only what is left.
+
+# AAI answers 404 for the resources removed by a previous run
+STATUS_GONE = "404"
+
+
+class TeardownPlan(object):
+    '''
+    the deletes of a cloud region's resources, children before parents
+    '''
+
+    def __init__(self, cloud_owner, cloud_region_id, cloud_region):
+        self.region_url = ("/cloud-infrastructure/cloud-regions/"
+                           "cloud-region/%s/%s"
+                           % (cloud_owner, cloud_region_id))
+        self.levels = [[], [], [], []]
+
+        for tenant in (cloud_region.get("tenants") or {}).get("tenant", []):
+            tenant_url = self._add(
+                2, "tenant", self.region_url, "/tenants/tenant/%s"
+                % tenant["tenant-id"], tenant)
+            for vserver in (tenant.get("vservers") or {}).get(
+                    "vserver", []):
+                vserver_url = self._add(
+                    1, "vserver", tenant_url, "/vservers/vserver/%s"
+                    % vserver["vserver-id"], vserver)
+                for vport in (vserver.get("l-interfaces") or {}).get(
+                        "l-interface", []):
+                    self._add(0, "l-interface", vserver_url,
+                              "/l-interfaces/l-interface/%s"
+                              % vport["interface-name"], vport)
+
+        for flavor in (cloud_region.get("flavors") or {}).get("flavor", []):
+            flavor_url = self._add(
+                2, "flavor", self.region_url, "/flavors/flavor/%s"
+                % flavor["flavor-id"], flavor)
+            for capability in (flavor.get("hpa-capabilities") or {}).get(
+                    "hpa-capability", []):
+                self._add(0, "hpa-capability", flavor_url,
+                          "/hpa-capabilities/hpa-capability/%s"
+                          % capability["hpa-capability-id"], capability)
+
+        for image in (cloud_region.get("images") or {}).get("image", []):
+            self._add(2, "image", self.region_url, "/images/image/%s"
+                      % image["image-id"], image)
+
+        for az in (cloud_region.get("availability-zones") or {}).get(
+                "availability-zone", []):
+            az_url = self._add(
+                2, "availability-zone", self.region_url,
+                "/availability-zones/availability-zone/%s"
+                % az["availability-zone-name"], az)
+            for relationship in (az.get("relationship-list") or {}).get(
+                    "relationship", []):
+                self.levels[0].append({
+                    "type": "relationship",
+                    "uri": az_url + "/relationship-list/relationship",
+                    "node": None,
+                    "parent": az_url,
+                    "body": relationship,
+                })
+
+        for snapshot in (cloud_region.get("snapshots") or {}).get(
+                "snapshot", []):
+            self._add(2, "snapshot", self.region_url, "/snapshots/snapshot/%s"
+                      % snapshot["snapshot-id"], snapshot)
+
+        self._add(3, "cloud-region", None, "", cloud_region,
+                  node_url=self.region_url)
+
+    def _add(self, level, resource_type, parent_url, path, resource,
+             node_url=None):
+        node_url = node_url or parent_url + path
+        self.levels[level].append({
+            "type": resource_type,
+            "uri": "%s?resource-version=%s"
+                   % (node_url, resource["resource-version"]),
+            "node": node_url,
+            "parent": parent_url,
+            "body": None,
+        })
+        return node_url
+
+    def totals(self):
+        totals = {}
+        for level in self.levels:
+            for op in level:
+                totals[op["type"]] = totals.get(op["type"], 0) + 1
+        return totals
+
+
+def run(plan, fan_out, progress=None, batch_size=None):
+    '''
+    run the deletes of the plan level by level
+    :param fan_out: runs a function over a list of items concurrently,
+    e.g. MultiCloudAAIHelper._fan_out
+    :param progress: called with the progress after each level
+    :return: progress: {"total": {type: n}, "deleted": {type: n},
+    "failed": {type: n}, "skipped": {type: n}}
+    '''
+    batch_size = batch_size or aai_bulk.AAIBulkWriter().batch_size
+    result = {"total": plan.totals(), "deleted": {}, "failed": {},
+              "skipped": {}}
+    # the resources with a child left in AAI
+    blocked = set()
+
+    def write_batch(batch):
+        aai_writer = aai_bulk.AAIBulkWriter(batch_size=len(batch))
+        for op in batch:
+            aai_writer.delete(op["uri"], op["body"])
+        aai_writer.flush()
+        # the results are in the order of the operations
+        return zip(batch, aai_writer.results)
+
+    def count(key, op):
+        result[key][op["type"]] = result[key].get(op["type"], 0) + 1
+
+    for level in plan.levels:
+        ops = []
+        for op in level:
+            if op["node"] and op["node"] in blocked:
+                count("skipped", op)
+                blocked.add(op["parent"])
+            else:
+                ops.append(op)
+
+        batches = [ops[i:i + batch_size]
+                   for i in range(0, len(ops), batch_size)]
+        for results in fan_out(write_batch, batches):
+            for op, (_, retcode, content, status_code) in results:
+                if retcode == 0 or str(status_code) == STATUS_GONE:
+                    count("deleted", op)
+                    continue
+                logger.warn("failed to remove %s from AAI: %s, %s"
+                            % (op["uri"], status_code, content))
+                count("failed", op)
+                blocked.add(op["parent"])
+
+        if progress:
+            try:
+                progress(result)
+            except Exception as e:
+                logger.warn("failed to report the progress: %s" % str(e))
+
+    return result
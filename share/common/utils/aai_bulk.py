@@ -0,0 +1,154 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import json
+import logging
+
+from django.conf import settings
+
+from common.utils import aai_cache
+from common.utils import restcall
+
+logger = logging.getLogger(__name__)
+
+# AAI limits the number of operations of a single transaction
+DEFAULT_BATCH_SIZE = 30
+
+AAI_BULK_SINGLE_TRANSACTION = "/bulk/single-transaction"
+
+# set once AAI answers that the bulk API is not available,
+# then all writers of this process go for individual calls directly
+_bulk_unsupported = False
+
+
+class AAIBulkWriter(object):
+    '''
+    Group AAI PUT/PATCH/DELETE operations into bulk single-transaction
+    requests. Operations are applied in the order they are added, a batch
+    is sent once batch_size operations are pending or on flush().
+
+    If a transaction fails it is rolled back by AAI, then the operations
+    of that batch are retried one by one with restcall.req_to_aai.
+
+    The result of each operation is appended to self.results in the same
+    order as the operations: (op, retcode, content, status_code)
+    '''
+
+    def __init__(self, batch_size=None, appid=settings.MULTICLOUD_APP_ID):
+        self.batch_size = batch_size or getattr(
+            settings, "AAI_BULK_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+        self.appid = appid
+        self.pending = []
+        self.results = []
+        self.round_trips = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def put(self, uri, body):
+        self._add("put", uri, body)
+
+    def patch(self, uri, body):
+        self._add("patch", uri, body)
+
+    def delete(self, uri, body=None):
+        self._add("delete", uri, body or {})
+
+    def failures(self):
+        return [r for r in self.results if r[1] != 0]
+
+    def flush(self):
+        while self.pending:
+            batch = self.pending[:self.batch_size]
+            self.pending = self.pending[self.batch_size:]
+            self._write_batch(batch)
+        return self.results
+
+    def _add(self, action, uri, body):
+        self.pending.append({"action": action, "uri": uri, "body": body})
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _write_batch(self, batch):
+        # the writes bypass req_to_aai, so invalidate the cache here
+        for op in batch:
+            aai_cache.flush_cache_by_url(op["uri"])
+
+        if len(batch) > 1 and not _bulk_unsupported:
+            results = self._write_transaction(batch)
+            if results:
+                self.results.extend(results)
+                return
+
+        for op in batch:
+            self.results.append(self._write_one(op))
+
+    def _write_transaction(self, batch):
+        global _bulk_unsupported
+        self.round_trips += 1
+        try:
+            retcode, content, status_code = restcall.req_to_aai(
+                AAI_BULK_SINGLE_TRANSACTION, "POST",
+                content={"operations": batch}, appid=self.appid)
+        except Exception as e:
+            logger.error("AAI bulk transaction exception: %s" % str(e))
+            return None
+
+        if retcode != 0:
+            if str(status_code) in ["404", "405"]:
+                logger.warn("AAI bulk API not available, status:%s"
+                            % status_code)
+                _bulk_unsupported = True
+            else:
+                logger.warn("AAI bulk transaction of %s operations failed,"
+                            " status:%s, %s, retry one by one"
+                            % (len(batch), status_code, content))
+            return None
+
+        try:
+            if content and not isinstance(content, dict):
+                content = json.loads(content)
+            responses = (content or {}).get("operation-responses") or []
+        except Exception:
+            responses = []
+
+        results = []
+        for i, op in enumerate(batch):
+            resp = responses[i] if i < len(responses) else {}
+            op_status = str(resp.get("response-status-code", status_code))
+            if op_status not in restcall.status_ok_list:
+                # a single transaction is all or nothing
+                logger.warn("AAI bulk operation failed: %s, %s, status:%s"
+                            % (op["action"], op["uri"], op_status))
+                return None
+            results.append(
+                (op, 0, resp.get("response-body"), op_status))
+        return results
+
+    def _write_one(self, op):
+        self.round_trips += 1
+        try:
+            retcode, content, status_code = restcall.req_to_aai(
+                op["uri"], op["action"].upper(),
+                content=op["body"] or '', appid=self.appid)
+        except Exception as e:
+            logger.error("AAI %s %s exception: %s"
+                         % (op["action"], op["uri"], str(e)))
+            return op, 3, str(e), "500"
+        if retcode != 0:
+            logger.warn("AAI %s %s failed, status:%s, %s"
+                        % (op["action"], op["uri"], status_code, content))
+        return op, retcode, content, status_code
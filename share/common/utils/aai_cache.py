@@ -9,41 +9,199 @@
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 
+import hashlib
 import json
 import logging
+import re
+import time
+from django.conf import settings
 from django.core.cache import cache
+from six.moves.urllib.parse import parse_qsl
+from six.moves.urllib.parse import urlencode
+
+from common.utils.local_cache import LocalLRUCache
 
 logger = logging.getLogger(__name__)
 
 # note: memcached key length should be < 250, the value < 1MB
 
+# Invalidation scheme:
+# each path prefix of a resource url, e.g. /cloud-infrastructure,
+# /cloud-infrastructure/cloud-regions, ... has a generation counter in
+# the cache. The generations of all prefixes of an url are folded into
+# the key of its cached entry, so bumping the generation of one prefix
+# makes every cached entry of that subtree unreachable at once.
+# Unreachable entries just expire. Both the lookup (one get_many) and
+# the invalidation (one incr per prefix) cost O(depth), no global key list,
+# and memcached incr is atomic across processes.
+# An url with a depth query also returns the resources under it, so each
+# prefix has a second, subtree generation, bumped by the writes to any
+# resource under the prefix and folded into the keys of the depth queries
+# only: a write to a flavor invalidates the cloud region retrieved with
+# depth=all, not the cloud region retrieved alone.
+
+# Two tiers:
+# the entries decoded from memcached are also kept in a bounded in-process
+# LRU keyed by the same generation folded key. The generations are the
+# version stamp shared by all the uwsgi workers: an AAI write in any worker
+# bumps them, so the entry becomes unreachable in every worker's local tier
+# and ages out of the LRU, and a hit skips the memcached fetch and decoding.
+
+AAI_CACHE_TIMEOUT = 3600 * 24
+
+# Cacheability rules:
+# settings.AAI_CACHE_RULES overrides the list below, the first rule whose
+# "pattern" (regex) is found in the resource path applies:
+#   "ttl": seconds to cache a successful GET, 0 not to cache it
+#   "query": names of the query parameters allowed in a cached url, e.g.
+#            ["depth"]. The parameters are sorted so that equivalent urls
+#            share an entry, an url with any other parameter is not cached
+#   "negative_ttl": seconds to cache a 404, 0 not to cache it
+# Urls matching no rule are not cached.
+DEFAULT_CACHE_RULES = [
+    {
+        "pattern": r"cloud-infrastructure/cloud-regions/cloud-region",
+        "ttl": AAI_CACHE_TIMEOUT,
+        "query": [],
+        "negative_ttl": 0,
+    },
+]
+
+_local_tier = LocalLRUCache(
+    max_size=getattr(settings, "AAI_LOCAL_CACHE_SIZE", 512),
+    ttl=getattr(settings, "AAI_LOCAL_CACHE_TTL", 300))
+
+# (rules from settings, compiled rules)
+_compiled_rules = (None, [])
+
+
+def _cache_rules():
+    global _compiled_rules
+    rules = getattr(settings, "AAI_CACHE_RULES", DEFAULT_CACHE_RULES)
+    if _compiled_rules[0] is not rules:
+        _compiled_rules = (
+            rules, [(re.compile(r["pattern"]), r) for r in rules])
+    return _compiled_rules[1]
+
+
+def cache_rule_by_url(resource_url):
+    '''
+    :param resource_url: AAI resource url, with the query string if any
+    :return: the rule applying to the url, None if it is not cacheable
+    '''
+    path, _, query = resource_url.partition("?")
+    for pattern, rule in _cache_rules():
+        if not pattern.search(path):
+            continue
+        if not rule.get("ttl", AAI_CACHE_TIMEOUT) \
+                and not rule.get("negative_ttl", 0):
+            return None
+        allowed = rule.get("query") or []
+        for name, _ in parse_qsl(query, keep_blank_values=True):
+            if name not in allowed:
+                return None
+        return rule
+    return None
+
+
+def _normalize_url(resource_url):
+    path, _, query = resource_url.partition("?")
+    if not query:
+        return path
+    return "%s?%s" % (path, urlencode(
+        sorted(parse_qsl(query, keep_blank_values=True))))
+
+
+def _path_prefixes(resource_url):
+    resource_wo_query = resource_url.split("?", 1)[0].rstrip("/")
+    segments = [s for s in resource_wo_query.split("/") if s]
+    return ["/" + "/".join(segments[:i + 1]) for i in range(len(segments))]
+
+
+def _generation_key(prefix):
+    return "AAIGEN_" + hashlib.md5(prefix.encode("utf-8")).hexdigest()
+
+
+def _subtree_generation_key(prefix):
+    return "AAISUBGEN_" + hashlib.md5(prefix.encode("utf-8")).hexdigest()
+
+
+def _has_depth(resource_url):
+    query = resource_url.partition("?")[2]
+    return any(name == "depth" and value not in ("", "0")
+               for name, value in parse_qsl(query, keep_blank_values=True))
+
+
+def _initial_generation():
+    # a generation counter may be evicted, start it from a time based value
+    # so that it does not collide with the generations used before
+    return int(time.time() * 1000)
+
+
+def cache_key_by_url(resource_url):
+    '''
+    compose the cache key of a resource url with the current generations
+    of all its path prefixes
+    :return: the key, None if the url is not cacheable
+    '''
+    try:
+        if not filter_cache_by_url(resource_url):
+            return None
+        prefixes = _path_prefixes(resource_url)
+        genkeys = [_generation_key(p) for p in prefixes]
+        if prefixes and _has_depth(resource_url):
+            genkeys.append(_subtree_generation_key(prefixes[-1]))
+        generations = cache.get_many(genkeys)
+        for genkey in genkeys:
+            if genkey not in generations:
+                cache.add(genkey, _initial_generation(), None)
+                generations[genkey] = cache.get(genkey)
+        folded = "%s#%s" % (
+            _normalize_url(resource_url),
+            ".".join([str(generations[k]) for k in genkeys]))
+        return "AAI_" + hashlib.md5(folded.encode("utf-8")).hexdigest()
+    except Exception as e:
+        logger.error("cache_key_by_url exception: %s" % str(e))
+        return None
+
 
 def flush_cache_by_url(resource_url):
     try:
-        # this is to invalidate similar cache data blindly
-        resource_wo_query = resource_url.split("?", 1)[0]
-        aaikey = "AAI_" + resource_wo_query
-        cache.delete(aaikey)
-
-        # AAI entry keys: flush all entries with same prefix
-        aaikeylist = json.loads(cache.get("AAIKeys", '[]'))
-        aaikeyset = set([])
-        for k in aaikeylist:
-            if k.find(aaikey) >= 0:
-                cache.delete(k)
-            else:
-                aaikeyset.add(k)
-        cache.set("AAIKeys", json.dumps(list(aaikeyset)))
+        # invalidate the resource and all the resources under it,
+        # regardless of the query string
+        prefixes = _path_prefixes(resource_url)
+        if not prefixes:
+            return
+        _bump_generation(_generation_key(prefixes[-1]))
+        # and the depth queries of the resources above it
+        for prefix in prefixes[:-1]:
+            _bump_generation(_subtree_generation_key(prefix))
     except:
         pass  # silently drop any exception
 
 
-def get_cache_by_url(resource_url):
+def _bump_generation(genkey):
+    try:
+        cache.incr(genkey)
+    except ValueError:
+        # no generation yet: nothing was cached with it
+        if not cache.add(genkey, _initial_generation(), None):
+            cache.incr(genkey)
+
+
+def get_cache_by_url(resource_url, cache_key=None):
     try:
         if filter_cache_by_url(resource_url):
-            value = cache.get("AAI_" + resource_url)
-            # logger.debug("Find cache the resource: %s, %s" %( resource_url, value))
-            return json.loads(value) if value else None
+            cache_key = cache_key or cache_key_by_url(resource_url)
+            value = _local_tier.get(cache_key)
+            if value is None:
+                value = cache.get(cache_key)
+                # logger.debug("Find cache the resource: %s, %s" %( resource_url, value))
+                value = json.loads(value) if value else None
+                if value is not None:
+                    _local_tier.set(cache_key, value)
+            # a copy so that the caller can not alter the cached entry
+            return list(value) if value else None
         else:
             return None
     except Exception as e:
@@ -51,29 +209,34 @@ def get_cache_by_url(resource_url):
         return None
 
 
-def set_cache_by_url(resource_url, resource_in_json):
+def set_cache_by_url(resource_url, resource_in_json, cache_key=None):
+    '''
+    :param resource_in_json: [retcode, content, status_code] of a GET,
+    a 404 is cached for the negative_ttl of the rule
+    :param cache_key: key composed before the resource was retrieved,
+    so that an invalidation in between is not overridden
+    '''
     try:
         # filter out unmanaged AAI resource
-        if filter_cache_by_url(resource_url):
-            # cache the resource for 24 hours
-            # logger.debug("Cache the resource: "+ resource_url)
-            aaikey = "AAI_" + resource_url
-            cache.set(aaikey, json.dumps(resource_in_json), 3600 * 24)
-            # AAI entry keys
-            aaikeylist = json.loads(cache.get("AAIKeys", '[]'))
-            aaikeyset = set(aaikeylist)
-            aaikeyset.add(aaikey)
-            cache.set("AAIKeys", json.dumps(list(aaikeyset)))
+        rule = cache_rule_by_url(resource_url)
+        if not rule:
+            return
+        if resource_in_json[0] == 0:
+            timeout = rule.get("ttl", AAI_CACHE_TIMEOUT)
+        elif str(resource_in_json[2]) == "404":
+            timeout = rule.get("negative_ttl", 0)
+        else:
+            timeout = 0
+        if not timeout:
+            return
+        # logger.debug("Cache the resource: "+ resource_url)
+        cache_key = cache_key or cache_key_by_url(resource_url)
+        cache.set(cache_key, json.dumps(resource_in_json), timeout)
+        _local_tier.set(cache_key, list(resource_in_json),
+                        min(timeout, _local_tier.ttl or timeout))
     except Exception as e:
         logger.error("set_cache_by_url exception: %s" % str(e))
 
 
 def filter_cache_by_url(resource_url):
-    # cannot cache url with query string, e.g. depth=all
-    if resource_url.find(r"?") >= 0:
-        return False
-    # hardcoded filter: cloud region only
-    if resource_url.find(r"cloud-infrastructure/cloud-regions/cloud-region") >= 0:
-        return True
-    else:
-        return False
+    return cache_rule_by_url(resource_url) is not None
@@ -0,0 +1,229 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from common.msapi import extsys
+
+logger = logging.getLogger(__name__)
+
+# Per VIM bulkhead:
+# the requests to a VIM hold one of PROXY_VIM_MAX_INFLIGHT slots while they
+# are served, so that a slow VIM can not tie up all the workers. The uwsgi
+# workers are processes, the slots in use are a counter in the shared cache
+# taken with an atomic incr and given back with decr. The counter expires
+# PROXY_VIM_SLOT_LEASE seconds after it was created, which recovers the
+# slots of a worker that died holding them. A request waits up to
+# PROXY_VIM_QUEUE_TIMEOUT seconds for a slot, then it is rejected with 503
+# and Retry-After. A streamed response holds its slot until its body is
+# closed. Disabled if PROXY_VIM_MAX_INFLIGHT is 0. The requests in flight
+# and waiting for a VIM are served by VimBulkheadGauges.
+
+DEFAULT_MAX_INFLIGHT = 0
+DEFAULT_QUEUE_TIMEOUT = 2
+DEFAULT_SLOT_LEASE = 300
+POLL_INTERVAL = 0.05
+PROBE_KEY = "bhprobe"
+PROBE_TIME = 60
+
+
+class VimSaturated(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many requests in progress to the VIM.'
+    default_code = 'vim_saturated'
+
+    def __init__(self, vimid, wait):
+        super(VimSaturated, self).__init__(
+            detail="Too many requests in progress to VIM %s" % vimid)
+        # DRF returns it as Retry-After
+        self.wait = wait
+
+
+def _key(vimid, name):
+    return "bh%s_%s" % (name, hashlib.md5(vimid.encode("utf-8")).hexdigest())
+
+
+class Lease(object):
+    def __init__(self, inflight_key):
+        self.inflight_key = inflight_key
+
+    def release(self):
+        if not self.inflight_key:
+            return
+        try:
+            if cache.decr(self.inflight_key) < 0:
+                # the counter expired and was created again meanwhile
+                cache.incr(self.inflight_key)
+        except ValueError:
+            # the counter expired, the slot is free already
+            pass
+        except Exception as e:
+            logger.warn("failed to release %s: %s"
+                        % (self.inflight_key, str(e)))
+        self.inflight_key = None
+
+
+class _LeasedBody(object):
+    '''
+    streamed response body holding the lease of its request, Django closes
+    it with the response once sent or when the client went away
+    '''
+
+    def __init__(self, body, lease):
+        self.body = body
+        self.lease = lease
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        self.lease.release()
+
+
+def _cache_reachable():
+    '''
+    incr fails as well if the cache is not reachable: a probe key written
+    and read back tells it from a counter expired since the add
+    '''
+    try:
+        cache.set(PROBE_KEY, 1, PROBE_TIME)
+        return cache.get(PROBE_KEY) is not None
+    except Exception:
+        return False
+
+
+def _try_slot(inflight_key, max_inflight, lease_time):
+    '''
+    :return: True if a slot is taken, False if all the slots are in use,
+    None if the cache is not available
+    '''
+    try:
+        cache.add(inflight_key, 0, lease_time)
+        inflight = cache.incr(inflight_key)
+    except ValueError:
+        # the counter expired since the add, or the cache is not reachable
+        if not _cache_reachable():
+            return None
+        return False
+    if inflight <= max_inflight:
+        return True
+    cache.decr(inflight_key)
+    return False
+
+
+def admit(vimid):
+    '''
+    take a slot to serve a request to the VIM
+    :return: the Lease to release once the request is served
+    :raise VimSaturated: no slot became free within the queue timeout
+    '''
+    max_inflight = getattr(
+        settings, "PROXY_VIM_MAX_INFLIGHT", DEFAULT_MAX_INFLIGHT)
+    if not max_inflight:
+        return Lease(None)
+    queue_timeout = getattr(
+        settings, "PROXY_VIM_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)
+    lease_time = getattr(settings, "PROXY_VIM_SLOT_LEASE", DEFAULT_SLOT_LEASE)
+    inflight_key = _key(vimid, "inflight")
+
+    try:
+        taken = _try_slot(inflight_key, max_inflight, lease_time)
+        if taken is not False:
+            return Lease(inflight_key if taken else None)
+
+        queued_key = _key(vimid, "queued")
+        cache.add(queued_key, 0, lease_time)
+        cache.incr(queued_key)
+        try:
+            deadline = time.time() + queue_timeout
+            while time.time() < deadline:
+                time.sleep(POLL_INTERVAL)
+                taken = _try_slot(inflight_key, max_inflight, lease_time)
+                if taken is not False:
+                    return Lease(inflight_key if taken else None)
+        finally:
+            try:
+                cache.decr(queued_key)
+            except Exception as e:
+                # the counter expired or was evicted, keep the slot taken
+                logger.warn("failed to dequeue from %s: %s"
+                            % (vimid, str(e)))
+    except Exception as e:
+        # do not turn a cache failure into an outage
+        logger.warn("bulkhead of %s not available: %s" % (vimid, str(e)))
+        return Lease(None)
+
+    logger.warn("reject the request to saturated VIM %s" % vimid)
+    raise VimSaturated(vimid, max(1, int(queue_timeout)))
+
+
+def get_gauges(vimid):
+    '''
+    :return: the number of requests in progress and waiting for the VIM
+    '''
+    max_inflight = getattr(
+        settings, "PROXY_VIM_MAX_INFLIGHT", DEFAULT_MAX_INFLIGHT)
+    try:
+        inflight = max(0, cache.get(_key(vimid, "inflight")) or 0) \
+            if max_inflight else 0
+        queued = cache.get(_key(vimid, "queued")) or 0
+    except Exception:
+        inflight, queued = 0, 0
+    return {"vimid": vimid, "max_inflight": max_inflight,
+            "inflight": inflight, "queued": queued}
+
+
+class VimBulkheadMixin(object):
+    '''
+    admission control by VIM of the requests to an APIView, the VIM is
+    identified by the vimid or the cloud_owner/cloud_region_id of the url
+    '''
+
+    def initial(self, request, *args, **kwargs):
+        super(VimBulkheadMixin, self).initial(request, *args, **kwargs)
+        vimid = kwargs.get("vimid")
+        if not vimid and kwargs.get("cloud_owner") \
+                and kwargs.get("cloud_region_id"):
+            vimid = extsys.encode_vim_id(
+                kwargs["cloud_owner"], kwargs["cloud_region_id"])
+        if vimid:
+            request.bulkhead_lease = admit(vimid)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        lease = getattr(request, "bulkhead_lease", None)
+        if lease and getattr(response, "streaming", False):
+            # the VIM is held until the body is sent
+            response.streaming_content = _LeasedBody(
+                response.streaming_content, lease)
+        elif lease:
+            lease.release()
+        return super(VimBulkheadMixin, self).finalize_response(
+            request, response, *args, **kwargs)
+
+
+class VimBulkheadGauges(APIView):
+    '''
+    requests in progress and waiting for a VIM, over all the workers
+    '''
+
+    def get(self, request, vimid="", cloud_owner="", cloud_region_id=""):
+        if not vimid:
+            vimid = extsys.encode_vim_id(cloud_owner, cloud_region_id)
+        return Response(data=get_gauges(vimid), status=status.HTTP_200_OK)
@@ -0,0 +1,187 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import logging
+import threading
+import time
+
+import httplib2
+from six.moves import urllib
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# max number of pooled http objects (hence keep-alive connections) per target
+DEFAULT_MAX_PER_HOST = 10
+# pooled http objects idle longer than this (seconds) are closed
+DEFAULT_IDLE_TIMEOUT = 60
+# how long (seconds) a caller waits for a free slot before going unpooled
+DEFAULT_ACQUIRE_TIMEOUT = 5
+
+
+class HttpConnectionPool(object):
+    '''
+    Per process pool of httplib2.Http objects keyed by
+    (scheme, host, port, TLS settings).
+
+    httplib2.Http keeps the underlying connection alive between requests,
+    but it is not thread safe, so each Http object is handed out to a
+    single caller at a time and returned to the pool afterwards.
+    '''
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition(threading.Lock())
+        # key: [(http, last_used), ...], most recently used at the end
+        self._idle = {}
+        # key: number of http objects currently handed out
+        self._inuse = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "overflows": 0,
+            "evictions": 0,
+            "discards": 0,
+        }
+
+    @staticmethod
+    def make_key(url, ca_certs=None, disable_ssl_certificate_validation=False):
+        parts = urllib.parse.urlsplit(url)
+        scheme = (parts.scheme or "http").lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        tls = (ca_certs, bool(disable_ssl_certificate_validation)) \
+            if scheme == "https" else None
+        return (scheme, (parts.hostname or "").lower(), port, tls)
+
+    def acquire(self, key):
+        '''
+        get a http object for key, reusing an idle one if possible
+        :return: (http, pooled), pooled is False if the caller got an
+        extra http object because all slots for key were busy
+        '''
+        deadline = time.time() + self.acquire_timeout
+        with self._cond:
+            self._evict_idle_locked()
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    http, _ = idle.pop()
+                    self._inuse[key] = self._inuse.get(key, 0) + 1
+                    self._stats["hits"] += 1
+                    return http, True
+                if self._inuse.get(key, 0) < self.max_per_host:
+                    self._inuse[key] = self._inuse.get(key, 0) + 1
+                    self._stats["misses"] += 1
+                    return self._new_http(key), True
+                timeleft = deadline - time.time()
+                if timeleft <= 0:
+                    self._stats["overflows"] += 1
+                    logger.warn("connection pool exhausted for %s:%s,"
+                                " falling back to unpooled connection"
+                                % key[1:3])
+                    return self._new_http(key), False
+                self._cond.wait(timeleft)
+
+    def release(self, key, http, pooled=True, discard=False):
+        '''
+        return a http object acquired from this pool
+        :param discard: close the http object instead of keeping it alive,
+        e.g. after a connection error
+        '''
+        if not pooled:
+            self._close(http)
+            return
+        with self._cond:
+            self._inuse[key] = max(self._inuse.get(key, 1) - 1, 0)
+            if discard:
+                self._stats["discards"] += 1
+            else:
+                self._idle.setdefault(key, []).append((http, time.time()))
+            self._cond.notify()
+        if discard:
+            self._close(http)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["idle"] = sum([len(v) for v in self._idle.values()])
+            stats["inuse"] = sum(self._inuse.values())
+        return stats
+
+    def clear(self):
+        with self._cond:
+            idle, self._idle = self._idle, {}
+        for items in idle.values():
+            for http, _ in items:
+                self._close(http)
+
+    def _evict_idle_locked(self):
+        expired_before = time.time() - self.idle_timeout
+        for key in list(self._idle.keys()):
+            items = self._idle[key]
+            alive = [i for i in items if i[1] >= expired_before]
+            for http, _ in items[:len(items) - len(alive)]:
+                self._stats["evictions"] += 1
+                self._close(http)
+            if alive:
+                self._idle[key] = alive
+            else:
+                self._idle.pop(key, None)
+
+    @staticmethod
+    def _new_http(key):
+        ca_certs, disable_validation = key[3] or (None, False)
+        http = httplib2.Http(
+            ca_certs=ca_certs,
+            disable_ssl_certificate_validation=disable_validation)
+        http.follow_all_redirects = True
+        return http
+
+    @staticmethod
+    def _close(http):
+        try:
+            http.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HttpConnectionPool(
+                    max_per_host=getattr(
+                        settings, "REST_POOL_MAX_PER_HOST",
+                        DEFAULT_MAX_PER_HOST),
+                    idle_timeout=getattr(
+                        settings, "REST_POOL_IDLE_TIMEOUT",
+                        DEFAULT_IDLE_TIMEOUT),
+                    acquire_timeout=getattr(
+                        settings, "REST_POOL_ACQUIRE_TIMEOUT",
+                        DEFAULT_ACQUIRE_TIMEOUT))
+    return _pool
+
+
+def get_pool_stats():
+    '''
+    hit/miss counters of the process wide pool
+    '''
+    return get_pool().stats()
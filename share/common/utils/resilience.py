@@ -0,0 +1,306 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import logging
+import random
+import socket
+import threading
+import time
+
+import httplib2
+import requests
+from six.moves import http_client
+from six.moves import urllib
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Retry and circuit breaking of the outbound calls (AAI, MSB, VIMs):
+# a call failing with a transport error or one of OUTBOUND_RETRY_STATUSES
+# is retried up to OUTBOUND_RETRY_ATTEMPTS times in total, with an
+# exponential backoff and full jitter. Only idempotent methods are retried,
+# other methods only when the request could not have been sent.
+# After CIRCUIT_BREAKER_THRESHOLD consecutive failures of an endpoint
+# (scheme, host, port), its circuit opens and the calls to it fail at once
+# for CIRCUIT_BREAKER_RESET_TIMEOUT seconds, then a single probe call is let
+# through (half open) which closes the circuit on success.
+# The breakers are per process: they are on the path of every call, so a
+# round trip to the shared cache is not worth it, each worker finds out
+# about a dead endpoint after CIRCUIT_BREAKER_THRESHOLD failures.
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF = 0.2
+DEFAULT_RETRY_BACKOFF_MAX = 2
+DEFAULT_RETRY_STATUSES = (502, 503, 504)
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_TIMEOUT = 30
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+TRANSPORT_ERRORS = (
+    socket.error, http_client.HTTPException, httplib2.HttpLib2Error,
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+# the request did not reach the endpoint
+NOT_SENT_ERRORS = (
+    http_client.ResponseNotReady, httplib2.ServerNotFoundError,
+    requests.exceptions.ConnectTimeout, socket.gaierror,
+    ConnectionRefusedError)
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    '''
+    the call is not made because the circuit of the endpoint is open,
+    keystoneauth handles it as any connection failure
+    '''
+
+    def __init__(self, endpoint, retry_after):
+        super(CircuitOpen, self).__init__(
+            "circuit open to %s, retry in %ds" % (endpoint, retry_after))
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker(object):
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=DEFAULT_BREAKER_THRESHOLD,
+                 reset_timeout=DEFAULT_BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0,
+                       "opened": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state_locked()
+
+    def _current_state_locked(self):
+        if self._state == self.OPEN \
+                and time.time() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self):
+        '''
+        :return: whether a call can be made, in half open state only
+        one probe call at a time is allowed
+        '''
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            state = self._current_state_locked()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            return max(1, int(self._opened_at + self.reset_timeout
+                              - time.time()))
+
+    def record(self, success):
+        '''
+        :param success: outcome of an allowed call, None if the call
+        did not tell anything about the endpoint
+        '''
+        with self._lock:
+            self._probing = False
+            if success is None:
+                return
+            if success:
+                self._stats["successes"] += 1
+                if self._state != self.CLOSED:
+                    logger.warn("circuit to %s closed" % self.name)
+                self._state = self.CLOSED
+                self._failures = 0
+                return
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN \
+                    or (self._state == self.CLOSED and self.failure_threshold
+                        and self._failures >= self.failure_threshold):
+                logger.warn("circuit to %s opened after %d failures"
+                            % (self.name, self._failures))
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._stats["opened"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["state"] = self._current_state_locked()
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+
+class RetryPolicy(object):
+
+    def __init__(self, max_attempts=DEFAULT_RETRY_ATTEMPTS,
+                 backoff=DEFAULT_RETRY_BACKOFF,
+                 backoff_max=DEFAULT_RETRY_BACKOFF_MAX,
+                 retry_statuses=DEFAULT_RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+
+    def is_failure_status(self, status_code):
+        try:
+            return int(status_code) in self.retry_statuses
+        except (TypeError, ValueError):
+            return False
+
+    def should_retry(self, method, attempt, status_code=None, error=None):
+        '''
+        :param attempt: number of attempts made so far
+        '''
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None and isinstance(error, NOT_SENT_ERRORS):
+            return True
+        if method.upper() not in IDEMPOTENT_METHODS:
+            return False
+        return error is not None or self.is_failure_status(status_code)
+
+    def delay(self, attempt):
+        # exponential backoff with full jitter
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff * (2 ** (attempt - 1))))
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def endpoint_of(url):
+    parts = urllib.parse.urlsplit(url)
+    scheme = (parts.scheme or "http").lower()
+    port = parts.port or (443 if scheme == "https" else 80)
+    return "%s://%s:%s" % (scheme, (parts.hostname or "").lower(), port)
+
+
+def get_breaker(url):
+    endpoint = endpoint_of(url)
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=getattr(
+                        settings, "CIRCUIT_BREAKER_THRESHOLD",
+                        DEFAULT_BREAKER_THRESHOLD),
+                    reset_timeout=getattr(
+                        settings, "CIRCUIT_BREAKER_RESET_TIMEOUT",
+                        DEFAULT_BREAKER_RESET_TIMEOUT))
+                _breakers[endpoint] = breaker
+    return breaker
+
+
+def get_breaker_stats():
+    '''
+    state and counters of the circuit breakers of this process by endpoint
+    '''
+    return dict([(endpoint, breaker.snapshot())
+                 for endpoint, breaker in list(_breakers.items())])
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_retry_policy():
+    return RetryPolicy(
+        max_attempts=getattr(
+            settings, "OUTBOUND_RETRY_ATTEMPTS", DEFAULT_RETRY_ATTEMPTS),
+        backoff=getattr(
+            settings, "OUTBOUND_RETRY_BACKOFF", DEFAULT_RETRY_BACKOFF),
+        backoff_max=getattr(
+            settings, "OUTBOUND_RETRY_BACKOFF_MAX", DEFAULT_RETRY_BACKOFF_MAX),
+        retry_statuses=getattr(
+            settings, "OUTBOUND_RETRY_STATUSES", DEFAULT_RETRY_STATUSES))
+
+
+def call(url, method, send, replayable=True, policy=None):
+    '''
+    make an outbound call under the retry policy and the circuit breaker
+    of its endpoint
+    :param send: makes one attempt, returns (status_code, result)
+    :param replayable: False if the request can not be sent twice,
+    e.g. its body is a stream
+    :return: the result of the last attempt
+    :raise CircuitOpen: the circuit of the endpoint is open
+    '''
+    breaker = get_breaker(url)
+    policy = policy or get_retry_policy()
+    attempt = 0
+    while True:
+        attempt += 1
+        if not breaker.allow():
+            raise CircuitOpen(breaker.name, breaker.retry_after())
+        try:
+            status_code, result = send()
+        except TRANSPORT_ERRORS as e:
+            breaker.record(False)
+            if not replayable \
+                    or not policy.should_retry(method, attempt, error=e):
+                raise
+            logger.warn("%s %s failed: %s, attempt %d"
+                        % (method.upper(), url, str(e), attempt))
+        except Exception:
+            breaker.record(None)
+            raise
+        else:
+            failed = policy.is_failure_status(status_code)
+            breaker.record(not failed)
+            if not failed or not replayable or not policy.should_retry(
+                    method, attempt, status_code=status_code):
+                return result
+            logger.warn("%s %s returned %s, attempt %d"
+                        % (method.upper(), url, status_code, attempt))
+            close = getattr(result, "close", None)
+            if close:
+                close()
+        time.sleep(policy.delay(attempt))
+
+
+class ResilientSession(requests.Session):
+    '''
+    requests session applying the retry policy and the circuit breakers,
+    to be handed to keystoneauth1 session.Session(session=...)
+    '''
+
+    def request(self, method, url, *args, **kwargs):
+        data = kwargs.get("data")
+        replayable = data is None or isinstance(data, (bytes, str, dict))
+
+        def send():
+            resp = super(ResilientSession, self).request(
+                method, url, *args, **kwargs)
+            return resp.status_code, resp
+
+        return call(url, method, send, replayable=replayable)
@@ -18,14 +18,16 @@ import traceback
 import sys
 
 import logging
+from six.moves import http_client
 from six.moves import urllib
-import httplib2
 import uuid
 
 from rest_framework import status
 from django.conf import settings
 
 from common.utils import aai_cache
+from common.utils import conn_pool
+from common.utils import resilience
 
 rest_no_auth, rest_oneway_auth, rest_bothway_auth = 0, 1, 2
 HTTP_200_OK, HTTP_201_CREATED = '200', '201'
@@ -34,8 +36,10 @@ status_ok_list = [HTTP_200_OK, HTTP_201_CREATED,
                   HTTP_204_NO_CONTENT, HTTP_202_ACCEPTED]
 HTTP_404_NOTFOUND, HTTP_403_FORBIDDEN = '404', '403'
 HTTP_401_UNAUTHORIZED, HTTP_400_BADREQUEST = '401', '400'
+HTTP_503_SERVICE_UNAVAILABLE = '503'
 
-MAX_RETRY_TIME = 3
+# kept for compatibility, see resilience.DEFAULT_RETRY_ATTEMPTS
+MAX_RETRY_TIME = resilience.DEFAULT_RETRY_ATTEMPTS
 
 logger = logging.getLogger(__name__)
 
@@ -71,31 +75,40 @@ def _call_req(base_url, user, passwd, auth_type,
             logger.debug("with content = %s" % content)
 
         ca_certs = None
-        for retry_times in range(MAX_RETRY_TIME):
-            http = httplib2.Http(
-                ca_certs=ca_certs,
-                disable_ssl_certificate_validation=(auth_type == rest_no_auth))
-            http.follow_all_redirects = True
+        pool = conn_pool.get_pool()
+        pool_key = pool.make_key(
+            full_url, ca_certs=ca_certs,
+            disable_ssl_certificate_validation=(auth_type == rest_no_auth))
+
+        def send():
+            http, pooled = pool.acquire(pool_key)
             try:
                 resp, resp_content = http.request(full_url,
                                                   method=method.upper(),
                                                   body=content,
                                                   headers=headers)
-                resp_status, resp_body = \
-                    resp['status'], codecs.decode(
-                        resp_content, 'UTF-8') if resp_content else None
-                if resp_status in status_ok_list:
-                    ret = [0, resp_body, resp_status]
-                else:
-                    ret = [1, resp_body, resp_status]
-                break
-            except Exception as ex:
-                if 'httplib.ResponseNotReady' in str(sys.exc_info()):
-                    logger.debug("retry_times=%d", retry_times)
-                    logger.error(traceback.format_exc())
-                    ret = [1, "Unable to connect to %s" % full_url, resp_status]
-                    continue
-                raise ex
+            except Exception:
+                # the connection state is unknown, do not reuse it
+                pool.release(pool_key, http, pooled, discard=True)
+                raise
+            pool.release(pool_key, http, pooled)
+            return resp['status'], (resp, resp_content)
+
+        try:
+            resp, resp_content = resilience.call(full_url, method, send)
+        except resilience.CircuitOpen as ex:
+            logger.warn(str(ex))
+            return [2, str(ex), HTTP_503_SERVICE_UNAVAILABLE]
+        except http_client.ResponseNotReady:
+            logger.error(traceback.format_exc())
+            return [1, "Unable to connect to %s" % full_url, resp_status]
+        resp_status, resp_body = \
+            resp['status'], codecs.decode(
+                resp_content, 'UTF-8') if resp_content else None
+        if resp_status in status_ok_list:
+            ret = [0, resp_body, resp_status]
+        else:
+            ret = [1, resp_body, resp_status]
         logger.info("Rest call finished with status = %s", resp_status)
         logger.debug("with response content = %s" % resp_body)
     except urllib.error.URLError as err:
@@ -138,11 +151,15 @@ def req_to_aai(resource, method, content='', appid=settings.MULTICLOUD_APP_ID, n
     }
 
     # hook to flush cache
+    cache_key = None
     if method.upper() in ["PUT", "POST", "PATCH", "DELETE"]:
         aai_cache.flush_cache_by_url(resource)
     elif method.upper() in ["GET"]:
         if not nocache:
-            content = aai_cache.get_cache_by_url(resource)
+            # compose the key before retrieving the resource so that
+            # an invalidation in the meantime is not overridden
+            cache_key = aai_cache.cache_key_by_url(resource)
+            content = aai_cache.get_cache_by_url(resource, cache_key)
             # logger.debug("cached resource: %s, %s" % (resource, content))
             if content:
                 return content
@@ -154,13 +171,29 @@ def req_to_aai(resource, method, content='', appid=settings.MULTICLOUD_APP_ID, n
         settings.AAI_BASE_URL, settings.AAI_USERNAME, settings.AAI_PASSWORD, rest_no_auth,
         resource, method, content=json.dumps(content), extra_headers=headers)
 
-    if method.upper() in ["GET"] and ret == 0 and not nocache:
-        # aai_cache.set_cache_by_url(resource, [ret, resp_body, resp_status])
-        aai_cache.set_cache_by_url(resource, (ret, resp_body, resp_status))
+    if method.upper() in ["GET"] and cache_key:
+        # the cacheability rules decide the ttl, including for a 404
+        aai_cache.set_cache_by_url(
+            resource, (ret, resp_body, resp_status), cache_key)
 
     return [ret, resp_body, resp_status]
 
 
+def get_pool_stats():
+    '''
+    hit/miss counters of the connection pool shared by
+    req_to_aai, req_by_msb and req_to_vim
+    '''
+    return conn_pool.get_pool_stats()
+
+
+def get_breaker_stats():
+    '''
+    state of the circuit breakers of the endpoints called by this process
+    '''
+    return resilience.get_breaker_stats()
+
+
 def _combine_url(base_url, resource):
     full_url = None
 
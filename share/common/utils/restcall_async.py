@@ -0,0 +1,176 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+# asyncio flavour of restcall: the blocking calls keep their semantics
+# (AAI cache hooks, pooled connections) and run on a shared thread pool,
+# with the calls in flight towards one target bounded by a semaphore.
+# The semaphores are shared by all the event loops of the process, each
+# batch runs in its own loop and the concurrent batches, e.g. of the
+# registration threads, are bounded together.
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent import futures
+
+from django.conf import settings
+
+from common.utils import conn_pool
+from common.utils import restcall
+
+logger = logging.getLogger(__name__)
+
+# max number of calls in flight per target, per process
+DEFAULT_MAX_PER_TARGET = conn_pool.DEFAULT_MAX_PER_HOST
+# size of the thread pool running the blocking calls
+DEFAULT_MAX_WORKERS = 32
+# seconds between the attempts to take the semaphore of a busy target
+MIN_POLL_INTERVAL = 0.001
+MAX_POLL_INTERVAL = 0.05
+
+_lock = threading.Lock()
+_executor = None
+# (target, max per target): semaphore
+_semaphores = {}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = futures.ThreadPoolExecutor(
+                    max_workers=getattr(
+                        settings, "REST_ASYNC_MAX_WORKERS",
+                        DEFAULT_MAX_WORKERS),
+                    thread_name_prefix="restcall_async")
+    return _executor
+
+
+def _get_semaphore(target):
+    # not an asyncio primitive, those are bound to the loop they are used in
+    max_per_target = getattr(
+        settings, "REST_ASYNC_MAX_PER_TARGET", DEFAULT_MAX_PER_TARGET)
+    key = (target, max_per_target)
+    with _lock:
+        semaphore = _semaphores.get(key)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max_per_target)
+            _semaphores[key] = semaphore
+    return semaphore
+
+
+def _target_of(url):
+    return conn_pool.HttpConnectionPool.make_key(url)[:3]
+
+
+async def _run_bounded(target, func, *args, **kwargs):
+    semaphore = _get_semaphore(target)
+    # wait without blocking the loop, nor a thread of the pool
+    interval = MIN_POLL_INTERVAL
+    while not semaphore.acquire(blocking=False):
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+    try:
+        future = _get_executor().submit(
+            functools.partial(func, *args, **kwargs))
+    except BaseException:
+        semaphore.release()
+        raise
+    # released once the call is over, even if the caller is cancelled
+    future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.wrap_future(future)
+
+
+async def req_to_aai_async(resource, method, content='',
+                           appid=settings.MULTICLOUD_APP_ID, nocache=False):
+    # look up restcall.req_to_aai at call time so that it can be patched
+    return await _run_bounded(
+        _target_of(settings.AAI_BASE_URL), restcall.req_to_aai,
+        resource, method, content=content, appid=appid, nocache=nocache)
+
+
+async def req_to_vim_async(base_url, resource, method,
+                           extra_headers='', content=''):
+    return await _run_bounded(
+        _target_of(base_url), restcall.req_to_vim,
+        base_url, resource, method,
+        extra_headers=extra_headers, content=content)
+
+
+async def req_by_msb_async(resource, method, content=''):
+    base_url = "%s://%s:%s/" % (
+        settings.MSB_SERVICE_PROTOCOL, settings.MSB_SERVICE_ADDR,
+        settings.MSB_SERVICE_PORT)
+    return await _run_bounded(
+        _target_of(base_url), restcall.req_by_msb,
+        resource, method, content=content)
+
+
+async def call_async(target_url, func, *args, **kwargs):
+    '''
+    run any blocking call (e.g. a keystone session request) on the shared
+    thread pool, bounded by the semaphore of target_url
+    '''
+    return await _run_bounded(_target_of(target_url), func, *args, **kwargs)
+
+
+def run_sync(coro):
+    '''
+    run a coroutine to completion from blocking code
+    '''
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # an event loop is already running in this thread,
+    # so run the coroutine in a new loop on another thread
+    result = {}
+
+    def _runner():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+
+    runner = threading.Thread(target=_runner)
+    runner.start()
+    runner.join()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+def run_batch(calls, return_exceptions=True):
+    '''
+    submit a batch of calls and gather the results
+    :param calls: iterable of (coroutine function, args) or
+    (coroutine function, args, kwargs), e.g.
+        (req_to_aai_async, (resource_url, "PUT"), {"content": info})
+    :param return_exceptions: if True, an exception raised by a call is
+    returned as its result instead of aborting the whole batch
+    :return: list of results in the order of calls
+    '''
+    coros = []
+    for call in calls:
+        func, args = call[0], call[1]
+        kwargs = call[2] if len(call) > 2 else {}
+        coros.append(functools.partial(func, *args, **kwargs))
+
+    async def _gather():
+        return await asyncio.gather(
+            *[c() for c in coros], return_exceptions=return_exceptions)
+
+    if not coros:
+        return []
+    return run_sync(_gather())
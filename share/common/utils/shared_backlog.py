@@ -0,0 +1,172 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at:
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Backlog shared by the uwsgi workers:
+# the repeating jobs of a MultiCloudThreadHelper are published in the shared
+# cache, so that every worker process knows them whichever process served
+# the request adding them. A job runs in the process holding its lease, a
+# key taken with an atomic add which expires after BACKLOG_LEASE_TIME
+# seconds. The owner renews its leases as heartbeat, the lease of a dead
+# or recycled process expires and another process takes the job over.
+# If the cache is not reachable every process runs its own jobs, as
+# without the shared backlog.
+
+DEFAULT_LEASE_TIME = 30
+# the jobs are kept until removed
+JOBS_TTL = None
+LOCK_TIME = 5
+LOCK_TIMEOUT = 2
+POLL_INTERVAL = 0.05
+
+
+def _key(name, kind, backlog_id=""):
+    return "bs%s_%s_%s" % (
+        kind, name, hashlib.md5(backlog_id.encode("utf-8")).hexdigest())
+
+
+def get_lease_time():
+    return getattr(settings, "BACKLOG_LEASE_TIME", DEFAULT_LEASE_TIME)
+
+
+class SharedBacklog(object):
+    '''
+    jobs and leases of a backlog in the shared cache
+    '''
+
+    def __init__(self, name, owner=None):
+        self.name = name
+        # identifies this process as the holder of a lease
+        self.owner = owner or uuid.uuid4().hex
+        self.jobs_key = _key(name, "jobs")
+
+    def jobs(self):
+        '''
+        :return: {backlog id: job}, None if the cache is not reachable
+        '''
+        try:
+            jobs = cache.get(self.jobs_key)
+        except Exception as e:
+            logger.warn("failed to get the jobs of %s: %s"
+                        % (self.name, str(e)))
+            return None
+        return jobs or {}
+
+    def publish(self, backlog_id, job):
+        '''
+        :param job: json serializable description of the job,
+        e.g. {"worker": name, "payload": [...], "repeat": usecond}
+        '''
+        self._update(lambda jobs: jobs.__setitem__(backlog_id, job))
+
+    def withdraw(self, backlog_id):
+        self._update(lambda jobs: jobs.pop(backlog_id, None))
+        try:
+            cache.delete(_key(self.name, "lease", backlog_id))
+        except Exception as e:
+            logger.warn("failed to release %s: %s" % (backlog_id, str(e)))
+
+    def _update(self, change):
+        lock_key = _key(self.name, "lock")
+        try:
+            # serialize the read-modify-write of the jobs across processes
+            locked = self._lock(lock_key)
+            if locked is None:
+                logger.warn("jobs of %s not available" % self.name)
+                return
+            if not locked:
+                logger.warn("update the jobs of %s without the lock"
+                            % self.name)
+            try:
+                jobs = cache.get(self.jobs_key) or {}
+                change(jobs)
+                cache.set(self.jobs_key, jobs, JOBS_TTL)
+            finally:
+                # the lock may have expired and been taken by another process
+                if locked and cache.get(lock_key) == self.owner:
+                    cache.delete(lock_key)
+        except Exception as e:
+            logger.warn("failed to update the jobs of %s: %s"
+                        % (self.name, str(e)))
+
+    def _lock(self, lock_key):
+        '''
+        :return: True if locked, False if still locked by another process
+        after LOCK_TIMEOUT seconds, None if the cache is not reachable
+        '''
+        deadline = time.time() + LOCK_TIMEOUT
+        while True:
+            if cache.add(lock_key, self.owner, LOCK_TIME):
+                return True
+            if cache.get(lock_key) is None:
+                # released meanwhile, or the cache is not reachable
+                if cache.add(lock_key, self.owner, LOCK_TIME):
+                    return True
+                if cache.get(lock_key) is None:
+                    return None
+            if time.time() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def acquire(self, backlog_id):
+        '''
+        take or renew the lease of a job
+        :return: True if this process is to run the job
+        '''
+        lease_key = _key(self.name, "lease", backlog_id)
+        lease_time = get_lease_time()
+        try:
+            if cache.add(lease_key, self.owner, lease_time):
+                return True
+            holder = cache.get(lease_key)
+            if holder == self.owner:
+                cache.set(lease_key, self.owner, lease_time)
+                return True
+            if holder is None:
+                # add fails as well if the cache is not reachable
+                return cache.add(lease_key, self.owner, lease_time) \
+                    or cache.get(lease_key) is None
+            return False
+        except Exception as e:
+            logger.warn("failed to lease %s: %s" % (backlog_id, str(e)))
+            return True
+
+    def renew(self, backlog_ids):
+        '''
+        heartbeat: renew the leases still held by this process
+        :return: the ids of the leases lost
+        '''
+        keys = dict([(_key(self.name, "lease", backlog_id), backlog_id)
+                     for backlog_id in backlog_ids])
+        lost = []
+        try:
+            holders = cache.get_many(list(keys.keys()))
+            renewed = {}
+            for lease_key, backlog_id in keys.items():
+                if holders.get(lease_key) == self.owner:
+                    renewed[lease_key] = self.owner
+                else:
+                    lost.append(backlog_id)
+            if renewed:
+                cache.set_many(renewed, get_lease_time())
+        except Exception as e:
+            logger.warn("failed to renew the leases of %s: %s"
+                        % (self.name, str(e)))
+        return lost
@@ -0,0 +1,162 @@
+# Copyright (c) 2017-2020 Wind River Systems, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from keystoneauth1.exceptions import HttpError
+from rest_framework import status
+
+from common.utils import restcall_async
+
+logger = logging.getLogger(__name__)
+
+# Extra specs of the flavors:
+# since compute API microversion 2.61 the extra_specs are embedded in the
+# flavors of /flavors/detail, so a list of flavors costs one request.
+# A VIM rejecting the microversion is remembered for
+# FLAVOR_MICROVERSION_CACHE_TTL seconds, then the extra_specs are fetched
+# per flavor, concurrently, and cached for FLAVOR_EXTRA_SPECS_CACHE_TTL
+# seconds. The cache of a flavor is invalidated when the flavor is updated
+# through the API, and expires for the updates made directly on the VIM.
+
+EXTRA_SPECS_MICROVERSION = "2.61"
+
+DEFAULT_EXTRA_SPECS_CACHE_TTL = 300
+DEFAULT_MICROVERSION_CACHE_TTL = 3600
+
+
+def _key(vimid, name):
+    return "fs%s_%s" % (name, hashlib.md5(vimid.encode("utf-8")).hexdigest())
+
+
+def _specs_key(vimid, flavorid):
+    return "%s_%s" % (_key(vimid, "specs"), flavorid)
+
+
+def invalidate(vimid, flavorid):
+    '''
+    drop the cached extra_specs of a flavor created, updated or deleted
+    '''
+    try:
+        cache.delete(_specs_key(vimid, flavorid))
+    except Exception as e:
+        logger.warn("failed to invalidate extra_specs of %s: %s"
+                    % (flavorid, str(e)))
+
+
+class FlavorSpecsLoader(object):
+    '''
+    load flavors with their extra_specs from a VIM
+    '''
+
+    def __init__(self, session, vimid, service, target_url, fetch=None):
+        '''
+        :param service: endpoint_filter of the compute service
+        :param target_url: url bounding the concurrent requests,
+        e.g. the url of the VIM
+        :param fetch: gets the extra_specs of a flavor id,
+        get_extra_specs by default
+        '''
+        self.session = session
+        self.vimid = vimid
+        self.service = service
+        self.target_url = target_url
+        self.fetch = fetch or self.get_extra_specs
+
+    def get_flavors(self, resource="/flavors/detail"):
+        '''
+        list the flavors, with their extra_specs embedded if the VIM
+        supports it
+        :return: the response of the VIM
+        '''
+        unsupported_key = _key(self.vimid, "nomv")
+        try:
+            unsupported = cache.get(unsupported_key)
+        except Exception:
+            unsupported = False
+        if not unsupported:
+            resp = None
+            try:
+                resp = self.session.get(
+                    resource, endpoint_filter=self.service,
+                    microversion=EXTRA_SPECS_MICROVERSION)
+                flavors = resp.json().get("flavors") or []
+                if all("extra_specs" in f for f in flavors):
+                    return resp
+            except HttpError as e:
+                # the microversion is not supported
+                if e.http_status not in [status.HTTP_400_BAD_REQUEST,
+                                         status.HTTP_406_NOT_ACCEPTABLE]:
+                    raise
+            logger.info("VIM %s does not embed the extra_specs of flavors"
+                        % self.vimid)
+            try:
+                cache.set(unsupported_key, True, getattr(
+                    settings, "FLAVOR_MICROVERSION_CACHE_TTL",
+                    DEFAULT_MICROVERSION_CACHE_TTL))
+            except Exception as e:
+                logger.warn("failed to cache the microversion support"
+                            " of %s: %s" % (self.vimid, str(e)))
+            if resp is not None:
+                # the VIM ignored the microversion, the list is still valid
+                return resp
+
+        return self.session.get(resource, endpoint_filter=self.service)
+
+    def get_extra_specs(self, flavorid):
+        resp = self.session.get("/flavors/%s/os-extra_specs" % flavorid,
+                                endpoint_filter=self.service)
+        return resp.json().get("extra_specs") or {}
+
+    def load_extra_specs(self, flavors):
+        '''
+        set the extra_specs of the flavors listed without them,
+        from the cache or fetched concurrently
+        :return: flavors
+        '''
+        missing = [f for f in flavors if "extra_specs" not in f]
+        if not missing:
+            return flavors
+
+        keys = dict([(_specs_key(self.vimid, f["id"]), f) for f in missing])
+        try:
+            cached = cache.get_many(list(keys.keys()))
+        except Exception:
+            cached = {}
+        for key, extra_specs in cached.items():
+            keys.pop(key)["extra_specs"] = extra_specs
+
+        to_fetch = list(keys.items())
+        results = restcall_async.run_batch([
+            (restcall_async.call_async,
+             (self.target_url, self.fetch, flavor["id"]))
+            for _, flavor in to_fetch])
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+        for (key, flavor), extra_specs in zip(to_fetch, results):
+            flavor["extra_specs"] = extra_specs
+        try:
+            cache.set_many(
+                dict([(key, flavor["extra_specs"])
+                      for key, flavor in to_fetch]),
+                getattr(settings, "FLAVOR_EXTRA_SPECS_CACHE_TTL",
+                        DEFAULT_EXTRA_SPECS_CACHE_TTL))
+        except Exception as e:
+            logger.warn("failed to cache extra_specs: %s" % str(e))
+        return flavors
@@ -20,6 +20,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 
 logger = logging.getLogger(__name__)
@@ -28,7 +29,7 @@ running_threads = {}
 running_thread_lock = threading.Lock()
 
 
-class Alarms(APIView):
+class Alarms(VimBulkheadMixin, APIView):
     service = {'service_type': 'metering',
                'interface': 'public'}
     keys_mapping = [
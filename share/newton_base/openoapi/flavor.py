@@ -21,13 +21,15 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
+from newton_base import flavor_specs
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
 
 logger = logging.getLogger(__name__)
 
 
-class Flavors(APIView):
+class Flavors(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
     keys_mapping = [
@@ -72,16 +74,17 @@ class Flavors(APIView):
                 if vim.get('openstack_region_id') \
                 else vim['cloud_region_id']
 
-            resp = self._get_flavor(sess, request, flavorid)
+            loader = self._get_flavor_specs_loader(sess, vimid, vim)
+            resp = self._get_flavor(sess, request, flavorid, loader)
             content = resp.json()
 
             if flavorid:
                 flavor = content.pop("flavor", None)
-                extraResp = self._get_flavor_extra_specs(sess, flavor["id"])
-                extraContent = extraResp.json()
-                if extraContent["extra_specs"]:
+                loader.load_extra_specs([flavor])
+                extra_specs = flavor.pop("extra_specs", None)
+                if extra_specs:
                     extra_specs_vfc = []
-                    self._convert_extra_specs(extra_specs_vfc, extraContent["extra_specs"], True)
+                    self._convert_extra_specs(extra_specs_vfc, extra_specs, True)
                     flavor["extraSpecs"] = extra_specs_vfc
 
                 VimDriverUtils.replace_key_by_mapping(flavor,
@@ -105,13 +108,13 @@ class Flavors(APIView):
                        if wanted == flavor["name"]:
                            content["flavors"].append(flavor)
 
-                # iterate each flavor to get extra_specs
+                # get the extra_specs of all flavors at once
+                loader.load_extra_specs(content["flavors"])
                 for flavor in content["flavors"]:
-                    extraResp = self._get_flavor_extra_specs(sess, flavor["id"])
-                    extraContent = extraResp.json()
-                    if extraContent["extra_specs"]:
+                    extra_specs = flavor.pop("extra_specs", None)
+                    if extra_specs:
                         extra_specs_vfc = []
-                        self._convert_extra_specs(extra_specs_vfc, extraContent["extra_specs"], True)
+                        self._convert_extra_specs(extra_specs_vfc, extra_specs, True)
                         flavor["extraSpecs"] = extra_specs_vfc
                     VimDriverUtils.replace_key_by_mapping(flavor,
                                                    self.keys_mapping)
@@ -140,6 +143,12 @@ class Flavors(APIView):
             return Response(data={'error': str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _get_flavor_specs_loader(self, sess, vimid, vim):
+        return flavor_specs.FlavorSpecsLoader(
+            sess, vimid, self.service, vim.get("url") or vimid,
+            fetch=lambda flavorid: self._get_flavor_extra_specs(
+                sess, flavorid).json().get("extra_specs") or {})
+
     def _get_flavor_extra_specs(self, sess, flavorid):
         if flavorid:
             # prepare request resource to vim instance
@@ -157,7 +166,7 @@ class Flavors(APIView):
             return resp
         return {}
 
-    def _get_flavor(self, sess, request, flavorid=""):
+    def _get_flavor(self, sess, request, flavorid="", loader=None):
         if sess:
             # prepare request resource to vim instance
             req_resouce = "/flavors"
@@ -172,7 +181,11 @@ class Flavors(APIView):
 
             logger.info("making request with URI:%s" % req_resouce)
 
-            resp = sess.get(req_resouce, endpoint_filter=self.service)
+            if loader and not flavorid:
+                # with the extra_specs if the VIM supports it
+                resp = loader.get_flavors(req_resouce)
+            else:
+                resp = sess.get(req_resouce, endpoint_filter=self.service)
 
             logger.info("request returns with status %s" % resp.status_code)
             if resp.status_code == status.HTTP_200_OK:
@@ -243,6 +256,7 @@ class Flavors(APIView):
 
 
             flavorid = resp_body['id']
+            flavor_specs.invalidate(vimid, flavorid)
             if extra_specs_vfc:
                 extra_specs_openstack={}
                 self._convert_extra_specs(extra_specs_vfc, extra_specs_openstack, False)
@@ -347,6 +361,7 @@ class Flavors(APIView):
                 else vim['cloud_region_id']
 
             #delete extra specs one by one
+            flavor_specs.invalidate(vimid, flavorid)
             resp = self._delete_flavor_extra_specs(sess, flavorid)
 
             #delete flavor
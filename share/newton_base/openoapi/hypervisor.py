@@ -21,6 +21,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
 
@@ -30,7 +31,7 @@ running_threads = {}
 running_thread_lock = threading.Lock()
 
 
-class Hypervisors(APIView):
+class Hypervisors(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
     keys_mapping = [
@@ -22,6 +22,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
@@ -80,7 +81,7 @@ class ImageThread (threading.Thread):
             logger.error("Failed to transfer_image:%s" % str(e))
             return None
 
-class Images(APIView):
+class Images(VimBulkheadMixin, APIView):
     service = {'service_type': 'image',
                'interface': 'public'}
     keys_mapping = [
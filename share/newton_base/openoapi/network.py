@@ -20,6 +20,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
@@ -27,7 +28,7 @@ from common.msapi import extsys
 logger = logging.getLogger(__name__)
 
 
-class Networks(APIView):
+class Networks(VimBulkheadMixin, APIView):
     service = {'service_type': 'network',
                'interface': 'public'}
     keys_mapping = [
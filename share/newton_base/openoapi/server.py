@@ -23,6 +23,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
 
@@ -141,7 +142,7 @@ class ServerVolumeAttachThread (threading.Thread):
             return None
 
 
-class Servers(APIView):
+class Servers(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
     keys_mapping = [
@@ -552,7 +553,7 @@ class APIv1Servers(Servers):
         return super(APIv1Servers, self).delete(request, vimid, tenantid, serverid)
 
 
-class ServerAction(APIView):
+class ServerAction(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
 
@@ -602,7 +603,7 @@ class APIv1ServerAction(ServerAction):
         return super(APIv1ServerAction, self).post(request, vimid, tenantid, serverid)
 
 
-class ServerOsInterface(APIView):
+class ServerOsInterface(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
 
@@ -653,7 +654,7 @@ class APIv1ServerOsInterface(ServerOsInterface):
         return super(APIv1ServerOsInterface, self).post(request, vimid, tenantid, serverid)
 
 
-class ServerOsInterfacePort(APIView):
+class ServerOsInterfacePort(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
 
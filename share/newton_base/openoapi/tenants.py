@@ -21,13 +21,14 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
 
 logger = logging.getLogger(__name__)
 
 
-class Tenants(APIView):
+class Tenants(VimBulkheadMixin, APIView):
     service = {
         'service_type': 'identity',
         'interface': 'public'
@@ -20,6 +20,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 from common.msapi import extsys
 
@@ -29,7 +30,7 @@ running_threads = {}
 running_thread_lock = threading.Lock()
 
 
-class VMlist(APIView):
+class VMlist(VimBulkheadMixin, APIView):
     service = {'service_type': 'compute',
                'interface': 'public'}
     keys_mapping = [
@@ -23,6 +23,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 
 from newton_base.proxy.services import Services
+from newton_base.proxy.services import get_proxy_context
 
 from newton_base.proxy.proxy_utils import ProxyUtils
 from common.exceptions import VimDriverNewtonException
@@ -46,10 +47,10 @@ class DnsaasDelegate(Services):
     def _do_action(self, action, request, vim_id, servicetype, requri):
         tmp_auth_token = self._get_token(request)
         try:
-            # fetch the auth_state out of cache
-            auth_state_str, metadata_catalog_str = VimDriverUtils.get_token_cache(tmp_auth_token)
+            # the auth_state fetched out of cache by the permission check
+            context = get_proxy_context(request)
 
-            if not auth_state_str:
+            if not context:
                 #invalid token
                 msg = {
                     'error': "request token %s is not valid" % (tmp_auth_token)
@@ -61,7 +62,7 @@ class DnsaasDelegate(Services):
                                 status=status.HTTP_404_NOT_FOUND)
 
             # get project name from auth_state
-            auth_state = json.loads(auth_state_str)
+            auth_state = context.auth_state_json
             if not auth_state:
                 # invalid token
                 msg = {
@@ -11,10 +11,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import datetime
+import hashlib
 import logging
 import json
 import traceback
 
+from django.conf import settings
 from django.core.cache import cache
 
 from keystoneauth1 import access
@@ -25,6 +28,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from newton_base.util import VimDriverUtils
 from newton_base.proxy.proxy_utils import ProxyUtils
 
@@ -48,7 +52,52 @@ v3_version_detail = {
     }
 }
 
-class Tokens(APIView):
+def _token_issuance_key(vimid, vim, proxy_prefix, scope):
+    '''
+    key of the tokens issued for a VIM to a project scope, the credentials
+    are part of the key so that an update in AAI takes effect at once
+    '''
+    identity = json.dumps([vimid, vim.get("url"), vim.get("userName"),
+                           vim.get("password"), vim.get("domain"),
+                           proxy_prefix, scope])
+    return "tokiss_" + hashlib.md5(identity.encode("utf-8")).hexdigest()
+
+
+def _get_issued_token(token_issuance_key):
+    '''
+    :return: (token, auth_data) of a still valid issued token, or None
+    '''
+    issued = cache.get(token_issuance_key)
+    if not issued:
+        return None
+    issued = json.loads(issued)
+    # the proxied requests with this token need its auth_state
+    if not cache.get(issued["token"]):
+        return None
+    return issued["token"], issued["body"]
+
+
+def _cache_issued_token(token_issuance_key, token, auth_data):
+    '''
+    share an issued token across the workers until TOKEN_ISSUANCE_MARGIN
+    seconds before it expires, and no longer than the auth_state of
+    the token is cached
+    '''
+    try:
+        expires = access.create(body=auth_data, auth_token=token).expires
+        lifetime = (expires - datetime.datetime.now(expires.tzinfo)) \
+            .total_seconds()
+        timeout = int(min(lifetime, settings.CACHE_EXPIRATION_TIME) -
+                      getattr(settings, "TOKEN_ISSUANCE_MARGIN", 300))
+        if timeout > 0:
+            cache.set(token_issuance_key,
+                      json.dumps({"token": token, "body": auth_data}),
+                      timeout)
+    except Exception as e:
+        logger.warn("failed to cache the issued token: %s" % str(e))
+
+
+class Tokens(VimBulkheadMixin, APIView):
     service = {'service_type': 'identity',
                'interface': 'public'}
 
@@ -101,13 +150,30 @@ class Tokens(APIView):
 
             # prepare request resource to vim instance
             vim = VimDriverUtils.get_vim_info(vimid)
+
+            # opt-in reuse of a token issued for the same scope
+            token_issuance_key = None
+            if getattr(settings, "TOKEN_ISSUANCE_CACHE", False):
+                token_issuance_key = _token_issuance_key(
+                    vimid, vim, self.proxy_prefix,
+                    [specified_project_idorname, tenant_name, tenant_id])
+                issued = _get_issued_token(token_issuance_key)
+                if issued:
+                    self._logger.info("RESP with status> %s, issued token"
+                                      % status.HTTP_201_CREATED)
+                    return Response(headers={'X-Subject-Token': issued[0]},
+                                    data=issued[1],
+                                    status=status.HTTP_201_CREATED)
+
+            # a new token for each client, the pooled sessions share theirs
             sess = None
             if specified_project_idorname:
                 try:
                     # check if specified with tenant id
                     sess = VimDriverUtils.get_session(
                         vim, tenant_name=None,
-                        tenant_id=specified_project_idorname
+                        tenant_id=specified_project_idorname,
+                        pooled=False
                     )
                 except Exception as e:
                     pass
@@ -117,14 +183,15 @@ class Tokens(APIView):
                         # check if specified with tenant name
                         sess = VimDriverUtils.get_session(
                             vim, tenant_name=specified_project_idorname,
-                            tenant_id=None
+                            tenant_id=None, pooled=False
                         )
                     except Exception as e:
                         pass
 
             if not sess:
                 sess = VimDriverUtils.get_session(
-                    vim, tenant_name=tenant_name, tenant_id=tenant_id)
+                    vim, tenant_name=tenant_name, tenant_id=tenant_id,
+                    pooled=False)
 
             #tmp_auth_state = VimDriverUtils.get_auth_state(vim, sess)
             tmp_auth_state = VimDriverUtils.get_auth_state(sess)
@@ -145,6 +212,10 @@ class Tokens(APIView):
             tmp_auth_data['token']['catalog'] = ProxyUtils.update_catalog_dnsaas(
                 vimid,tmp_auth_data['token']['catalog'], self.proxy_prefix, vim)
 
+            if token_issuance_key:
+                _cache_issued_token(
+                    token_issuance_key, tmp_auth_token, tmp_auth_data)
+
             resp = Response(headers={'X-Subject-Token': tmp_auth_token},
                             data=tmp_auth_data, status=status.HTTP_201_CREATED)
 
@@ -21,33 +21,81 @@ from rest_framework import status
 
 from common.exceptions import VimDriverNewtonException
 from common.msapi import extsys
+from common.utils.local_cache import LocalLRUCache
 
 logger = logging.getLogger(__name__)
 
 # DEBUG=True
 # MULTICLOUD_PREFIX = "http://%s:%s/api/multicloud-newton/v0" %(config.MSB_SERVICE_IP, config.MSB_SERVICE_PORT)
 
+# compiled prefix matchers by metadata_catalog prefixes
+_prefix_matchers = LocalLRUCache(max_size=128, ttl=0)
+
+
+def _prefix_matcher(metadata_catalog):
+    '''
+    compile one pattern matching any of the real prefixes, the longest
+    first, and the map from real prefix to proxy prefix
+    '''
+    prefixes = []
+    for (servicetype, service_metadata) in list(metadata_catalog.items()):
+        real_prefix = service_metadata.get('prefix', None)
+        proxy_prefix = service_metadata.get('proxy_prefix', None)
+        if real_prefix and proxy_prefix:
+            prefixes.append((real_prefix, proxy_prefix))
+    key = tuple(prefixes)
+    matcher = _prefix_matchers.get(key)
+    if matcher is None:
+        replacements = {}
+        for real_prefix, proxy_prefix in prefixes:
+            # services sharing the same endpoint: the first one wins
+            replacements.setdefault(real_prefix, proxy_prefix)
+        pattern = None
+        if replacements:
+            alternatives = sorted(replacements, key=len, reverse=True)
+            # an endpoint prefix not followed by another port number
+            pattern = re.compile(
+                "(?:%s)(?!:)" % "|".join(map(re.escape, alternatives)))
+        matcher = (pattern, replacements)
+        _prefix_matchers.set(key, matcher)
+    return matcher
+
+
 class ProxyUtils(object):
 
     @staticmethod
     def update_prefix(metadata_catalog, content):
-        '''match the longgest prefix and replace it'''
+        '''
+        match the longgest prefix and replace it
+        the string values of content are updated in place
+        '''
 
         if not content:
             return content
 
-        content_str = json.dumps(content)
+        pattern, replacements = _prefix_matcher(metadata_catalog)
+        if not pattern:
+            return content
 
-        for (servicetype, service_metadata) in list(metadata_catalog.items()):
-            real_prefix = service_metadata.get('prefix', None)
-            proxy_prefix = service_metadata.get('proxy_prefix', None)
+        def _replace(match):
+            return replacements[match.group(0)]
 
-            if real_prefix and proxy_prefix:
-                # filter the resp content and replace all endpoint prefix
-                tmp_pattern = re.compile(real_prefix+r'([^:])')
-                content_str = tmp_pattern.sub(proxy_prefix+r'\1', content_str)
+        # walk the decoded content instead of a dumps/loads round trip,
+        # each string value with an url is rewritten in a single pass
+        def _update(item):
+            children = item.items() if isinstance(item, dict) \
+                else enumerate(item)
+            for k, v in children:
+                if isinstance(v, str):
+                    if "://" in v:
+                        item[k] = pattern.sub(_replace, v)
+                elif isinstance(v, (dict, list)):
+                    _update(v)
 
-        content = json.loads(content_str)
+        if isinstance(content, str):
+            return pattern.sub(_replace, content)
+        if isinstance(content, (dict, list)):
+            _update(content)
         return content
 
     @staticmethod
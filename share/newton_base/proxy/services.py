@@ -11,40 +11,247 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
 import logging
 import json
+import time
 import traceback
 
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from keystoneauth1.exceptions import HttpError
 import re
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
+from six.moves.urllib.parse import parse_qsl
+from six.moves.urllib.parse import urlencode
 
 from newton_base.proxy.proxy_utils import ProxyUtils
 from common.exceptions import VimDriverNewtonException
+from common.utils.bulkhead import VimBulkheadMixin
 from common.msapi import extsys
+from common.utils.local_cache import LocalLRUCache
 from newton_base.util import VimDriverUtils
 
 logger = logging.getLogger(__name__)
 
 # DEBUG=True
 
+# Streaming mode:
+# settings.PROXY_STREAMING maps the service types to proxy in streaming
+# mode to a size in bytes, e.g. {"image": 0, "object-store": 0,
+# "orchestration": 1048576}. For these services the non JSON request and
+# response bodies, e.g. image data or objects, are piped in chunks, so are
+# the JSON responses larger than the size if not 0, without rewriting the
+# endpoints.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# response headers passed through in streaming mode, the body is piped as
+# received, not decoded, so that it matches Content-Length
+STREAM_HEADERS = ["Content-Length", "Content-Encoding", "Content-Disposition",
+                  "Content-MD5", "Content-Range", "Accept-Ranges", "ETag",
+                  "Last-Modified"]
+
+
+def _streaming_threshold(servicetype):
+    return getattr(settings, "PROXY_STREAMING", {}).get(servicetype)
+
+
+def _is_json(content_type):
+    return not content_type or "json" in content_type
+
+
+class _RequestBodyStream(object):
+    '''
+    file-like view of the incoming request body, so that requests sends it
+    in chunks with its Content-Length
+    '''
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        return self._stream.read(size) if self._stream else b""
+
+
+class _ResponseBodyStream(object):
+    '''
+    chunks of the upstream response body as received. Django closes it with
+    the response to the client, even if the client went away before the
+    body was iterated
+    '''
+
+    def __init__(self, resp):
+        self._resp = resp
+
+    def __iter__(self):
+        try:
+            for chunk in self._resp.raw.stream(
+                    STREAM_CHUNK_SIZE, decode_content=False):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self._resp is not None:
+            self._resp.close()
+            self._resp = None
+
+
+def _streaming_response(resp, token):
+    streamed = StreamingHttpResponse(
+        _ResponseBodyStream(resp), status=resp.status_code,
+        content_type=resp.headers.get("Content-Type",
+                                      "application/octet-stream"))
+    for header in STREAM_HEADERS:
+        if header in resp.headers:
+            streamed[header] = resp.headers[header]
+    streamed['X-Subject-Token'] = token
+    return streamed
+
+
+# Response cache:
+# settings.PROXY_RESPONSE_CACHE maps the service types whose GET responses
+# are cached to a ttl in seconds, e.g. {"compute": 60, "image": 60}.
+# The responses are keyed by vim, project, service type, path and sorted
+# query. Each collection, e.g. compute /flavors, has a generation counter
+# folded into the keys, a POST/PUT/PATCH/DELETE through the proxy to the
+# collection bumps it for all the projects. The collection is the first
+# segment of the path after the API version, e.g. ports of /v2.0/ports,
+# and after the project for the services with the project in the path,
+# e.g. servers of nova /v2.1/<project id>/servers.
+RESPONSE_CACHE_HEADER = "X-Multicloud-Cache"
+VERSION_SEGMENT = re.compile(r"^v\d+(\.\d+)*$")
+PROJECT_SEGMENT = re.compile(
+    r"^([0-9a-fA-F]{32}|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12})$")
+
+
+def _response_cache_ttl(servicetype):
+    return getattr(settings, "PROXY_RESPONSE_CACHE", {}).get(servicetype)
+
+
+def _collection_generation_key(vim_id, servicetype, req_resource):
+    path = req_resource.split("?", 1)[0]
+    segments = [seg for seg in path.split("/") if seg]
+    while segments and VERSION_SEGMENT.match(segments[0]):
+        segments.pop(0)
+    prefix = segments[:2] \
+        if segments and PROJECT_SEGMENT.match(segments[0]) else segments[:1]
+    collection = "/".join([vim_id, servicetype] + prefix)
+    return "pxygen_" + hashlib.md5(collection.encode("utf-8")).hexdigest()
+
+
+def _response_cache_key(vim_id, project_id, servicetype, req_resource):
+    genkey = _collection_generation_key(vim_id, servicetype, req_resource)
+    generation = cache.get(genkey)
+    if generation is None:
+        cache.add(genkey, int(time.time() * 1000), None)
+        generation = cache.get(genkey)
+    path, _, query = req_resource.partition("?")
+    resource = json.dumps([
+        vim_id, project_id, servicetype, path,
+        urlencode(sorted(parse_qsl(query, keep_blank_values=True))),
+        generation])
+    return "pxy_" + hashlib.md5(resource.encode("utf-8")).hexdigest()
+
+
+def _invalidate_responses(vim_id, servicetype, req_resource):
+    genkey = _collection_generation_key(vim_id, servicetype, req_resource)
+    try:
+        cache.incr(genkey)
+    except ValueError:
+        if not cache.add(genkey, int(time.time() * 1000), None):
+            cache.incr(genkey)
+
+
+# decoded state of the tokens in use: token -> ProxyContext
+_proxy_contexts = LocalLRUCache(
+    max_size=getattr(settings, "PROXY_CONTEXT_CACHE_SIZE", 256),
+    ttl=getattr(settings, "PROXY_CONTEXT_TTL", 300))
+
+
+class ProxyContext(object):
+    '''
+    state of a token, decoded once and shared by the requests with the
+    token: the auth_state, the metadata catalog and the compiled patterns
+    '''
+
+    def __init__(self, auth_state, metadata_catalog):
+        self.auth_state = auth_state
+        self.metadata_catalog_str = metadata_catalog
+        self._metadata_catalog = None
+        self._auth_state_json = None
+        self._suffix_patterns = {}
+
+    def is_current(self, auth_state, metadata_catalog):
+        return self.auth_state == auth_state \
+            and self.metadata_catalog_str == metadata_catalog
+
+    @property
+    def metadata_catalog(self):
+        if self._metadata_catalog is None and self.metadata_catalog_str:
+            self._metadata_catalog = json.loads(self.metadata_catalog_str)
+        return self._metadata_catalog
+
+    @property
+    def auth_state_json(self):
+        if self._auth_state_json is None and self.auth_state:
+            self._auth_state_json = json.loads(self.auth_state)
+        return self._auth_state_json
+
+    def suffix_pattern(self, suffix):
+        pattern = self._suffix_patterns.get(suffix)
+        if pattern is None:
+            pattern = re.compile(suffix)
+            self._suffix_patterns[suffix] = pattern
+        return pattern
+
+
+def get_proxy_context(request):
+    '''
+    context of the request token, the token state is fetched from the cache
+    once per request, so that an expired or revoked token is rejected
+    :return: ProxyContext, None if the token is not valid
+    '''
+    context = getattr(request, "proxy_context", None)
+    if context is not None:
+        return context
+    token = request.META.get('HTTP_X_AUTH_TOKEN', None)
+    if not token:
+        return None
+    auth_state, metadata_catalog = VimDriverUtils.get_token_cache(token)
+    if not auth_state:
+        return None
+    context = _proxy_contexts.get(token)
+    if context is None or not context.is_current(auth_state, metadata_catalog):
+        context = ProxyContext(auth_state, metadata_catalog)
+        _proxy_contexts.set(token, context)
+    request.proxy_context = context
+    return context
+
 
 class HasValidToken(BasePermission):
 
     def has_permission(self, request, view):
         logger.debug("HasValidToken--has_permission::META> %s" % request.META)
-        token = request.META.get('HTTP_X_AUTH_TOKEN', None)
-        if token:
-            state, metadata = VimDriverUtils.get_token_cache(token)
-            if state:
-                return True
-        return False
+        return get_proxy_context(request) is not None
 
 
-class Services(APIView):
+class Services(VimBulkheadMixin, APIView):
     permission_classes = (HasValidToken,)
 
     def __init__(self):
@@ -53,12 +260,12 @@ class Services(APIView):
     def _get_token(self, request):
         return request.META.get('HTTP_X_AUTH_TOKEN', None)
 
-    def _get_resource_and_metadata(self, servicetype, metadata_catalog, requri):
+    def _get_resource_and_metadata(self, servicetype, context, requri):
         real_prefix = None
         proxy_prefix = None
         suffix = None
+        metadata_catalog = context.metadata_catalog if context else None
         if servicetype and metadata_catalog:
-            metadata_catalog = json.loads(metadata_catalog)
             service_metadata = metadata_catalog.get(servicetype, None)
             if service_metadata:
                 real_prefix = service_metadata['prefix']
@@ -75,14 +282,18 @@ class Services(APIView):
 
         if suffix and requri:
             # remove the suffix from the requri to avoid duplicated suffix in real request uri later
-            tmp_pattern = re.compile(suffix)
-            requri = tmp_pattern.sub('', requri)
+            requri = context.suffix_pattern(suffix).sub('', requri)
 
         req_resource = ''
         if requri and requri != '':
             req_resource = "/" if re.match(r'//', requri) else '' + requri
         return req_resource, metadata_catalog
 
+    def _is_streamed_request(self, request, servicetype):
+        # such a body can not be parsed by DRF, do not touch request.data
+        return _streaming_threshold(servicetype) is not None \
+            and not _is_json(request.content_type)
+
     def _do_action(self, action, request, vim_id, servicetype, requri):
         tmp_auth_token = self._get_token(request)
         try:
@@ -93,10 +304,26 @@ class Services(APIView):
 
 
             vim = VimDriverUtils.get_vim_info(vim_id)
-            # fetch the auth_state out of cache
-            auth_state, metadata_catalog = VimDriverUtils.get_token_cache(tmp_auth_token)
-            req_resource, metadata_catalog = self._get_resource_and_metadata(servicetype, metadata_catalog, requri)
-            sess = VimDriverUtils.get_session(vim, auth_state=auth_state)
+            # the auth_state fetched out of cache by the permission check
+            context = get_proxy_context(request)
+            req_resource, metadata_catalog = self._get_resource_and_metadata(servicetype, context, requri)
+
+            querystr = VimDriverUtils.get_query_part(request)
+            if querystr:
+                req_resource += "?" + querystr
+
+            response_cache_key = None
+            if action == "get" and _response_cache_ttl(servicetype):
+                response_cache_key, cached = self._get_cached_response(
+                    request, vim_id, servicetype, req_resource, context)
+                if cached:
+                    content = ProxyUtils.update_prefix(
+                        metadata_catalog, json.loads(cached))
+                    return self._get_response(
+                        content, status.HTTP_200_OK, tmp_auth_token,
+                        vim_id, vim, requri, cache_status="HIT")
+
+            sess = VimDriverUtils.get_session(vim, auth_state=context.auth_state)
 
             cloud_owner, regionid = extsys.decode_vim_id(vim_id)
             interface = 'public'
@@ -107,35 +334,38 @@ class Services(APIView):
                      if vim.get('openstack_region_id') else vim['cloud_region_id']
             }
 
-
-            querystr = VimDriverUtils.get_query_part(request)
-            if querystr:
-                req_resource += "?" + querystr
-
             self._logger.info("service " + action + " request with uri %s,%s" % (req_resource, service))
-            if(action == "get"):
-                resp = sess.get(req_resource, endpoint_filter=service,
-                                headers={"Content-Type": "application/json",
-                                         "Accept": "application/json"})
-            elif(action == "post"):
-                resp = sess.post(req_resource, data=json.JSONEncoder().encode(request.data),
-                                 endpoint_filter=service,
-                                 headers={"Content-Type": "application/json",
-                                          "Accept": "application/json"})
-            elif(action == "put"):
-                resp = sess.put(req_resource, data=json.JSONEncoder().encode(request.data),
-                                endpoint_filter=service,
-                                headers={"Content-Type": "application/json",
-                                         "Accept": "application/json"})
-            elif(action == "patch"):
-                resp = sess.patch(req_resource, data=json.JSONEncoder().encode(request.data),
-                                  endpoint_filter=service,
-                                headers={"Content-Type": "application/json",
-                                         "Accept": "application/json"})
-            elif (action == "delete"):
-                resp = sess.delete(req_resource, endpoint_filter=service,
-                                headers={"Content-Type": "application/json",
-                                         "Accept": "application/json"})
+            headers = {"Content-Type": "application/json",
+                       "Accept": "application/json"}
+            streaming = _streaming_threshold(servicetype)
+            kwargs = {"endpoint_filter": service}
+            if streaming is not None:
+                kwargs["stream"] = True
+                headers["Accept"] = request.META.get(
+                    "HTTP_ACCEPT", headers["Accept"])
+            if action in ["post", "put", "patch"]:
+                if self._is_streamed_request(request, servicetype):
+                    headers["Content-Type"] = request.content_type
+                    kwargs["data"] = _RequestBodyStream(
+                        request.stream,
+                        int(request.META.get("CONTENT_LENGTH") or 0))
+                else:
+                    kwargs["data"] = json.JSONEncoder().encode(request.data)
+            resp = getattr(sess, action)(
+                req_resource, headers=headers, **kwargs)
+
+            if action != "get" and _response_cache_ttl(servicetype):
+                self._invalidate_cached_responses(
+                    vim_id, servicetype, req_resource)
+
+            if streaming is not None and action != "delete":
+                content_type = resp.headers.get("Content-Type")
+                content_length = int(resp.headers.get("Content-Length") or 0)
+                if not _is_json(content_type) or \
+                        (streaming and content_length > streaming):
+                    self._logger.info("service " + action + " response status: %s, streamed" % (resp.status_code))
+                    return _streaming_response(resp, tmp_auth_token)
+
             content = resp.json() if resp.content else None
             self._logger.info("service " + action + " response status: %s" % (resp.status_code))
             self._logger.debug("service " + action + " response content: %s" % (content))
@@ -144,15 +374,16 @@ class Services(APIView):
                 self._logger.info("RESP with status> %s" % resp.status_code)
                 return Response(headers={'X-Subject-Token': tmp_auth_token}, status=resp.status_code)
             else:
+                if response_cache_key and \
+                        resp.status_code == status.HTTP_200_OK:
+                    # cache the response as returned by the VIM
+                    self._set_cached_response(
+                        response_cache_key, content, servicetype)
                 content = ProxyUtils.update_prefix(metadata_catalog, content)
-                if (action == "get"):
-                    if requri == '/v3/auth/catalog' and content and content.get("catalog"):
-                        content['catalog'] = ProxyUtils.update_catalog_dnsaas(
-                            vim_id, content['catalog'], self.proxy_prefix, vim)
-
-                self._logger.info("RESP with status> %s" % resp.status_code)
-                return Response(headers={'X-Subject-Token': tmp_auth_token},
-                                data=content, status=resp.status_code)
+                return self._get_response(
+                    content, resp.status_code, tmp_auth_token,
+                    vim_id, vim, requri if action == "get" else None,
+                    cache_status="MISS" if response_cache_key else None)
 
         except VimDriverNewtonException as e:
             self._logger.error("Plugin exception> status:%s,error:%s"
@@ -166,6 +397,49 @@ class Services(APIView):
             return Response(data={'error': str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _get_response(self, content, status_code, token, vim_id, vim,
+                      requri, cache_status=None):
+        if requri == '/v3/auth/catalog' and content and content.get("catalog"):
+            content['catalog'] = ProxyUtils.update_catalog_dnsaas(
+                vim_id, content['catalog'], self.proxy_prefix, vim)
+
+        headers = {'X-Subject-Token': token}
+        if cache_status:
+            headers[RESPONSE_CACHE_HEADER] = cache_status
+        self._logger.info("RESP with status> %s" % status_code)
+        return Response(headers=headers, data=content, status=status_code)
+
+    def _get_cached_response(self, request, vim_id, servicetype,
+                             req_resource, context):
+        '''
+        :return: the key to cache the response with, None if it can not be
+        cached, and the cached response content if any
+        '''
+        try:
+            project_id = context.auth_state_json["body"]["token"]["project"]["id"]
+            key = _response_cache_key(
+                vim_id, project_id, servicetype, req_resource)
+            if "no-cache" in request.META.get("HTTP_CACHE_CONTROL", ""):
+                return key, None
+            return key, cache.get(key)
+        except Exception as e:
+            self._logger.warn("response cache not available: %s" % str(e))
+            return None, None
+
+    def _set_cached_response(self, key, content, servicetype):
+        try:
+            cache.set(key, json.dumps(content),
+                      _response_cache_ttl(servicetype))
+        except Exception as e:
+            self._logger.warn("failed to cache the response: %s" % str(e))
+
+    def _invalidate_cached_responses(self, vim_id, servicetype, req_resource):
+        try:
+            _invalidate_responses(vim_id, servicetype, req_resource)
+        except Exception as e:
+            self._logger.warn("failed to invalidate the cached responses"
+                              " of %s: %s" % (req_resource, str(e)))
+
     def head(self, request, vimid="", servicetype="", requri=""):
         self._logger.info("vimid, servicetype, requri> %s,%s,%s"
                      % (vimid, servicetype, requri))
@@ -174,8 +448,9 @@ class Services(APIView):
         token = self._get_token(request)
         try:
             vim = VimDriverUtils.get_vim_info(vimid)
-            auth_state, metadata_catalog = VimDriverUtils.get_token_cache(token)
-            sess = VimDriverUtils.get_session(vim, auth_state=auth_state)
+            context = get_proxy_context(request)
+            sess = VimDriverUtils.get_session(
+                vim, auth_state=context.auth_state if context else None)
 
             req_resource = ''
             if requri and requri != '':
@@ -221,21 +496,24 @@ class Services(APIView):
     def post(self, request, vimid="", servicetype="", requri=""):
         self._logger.info("vimid, servicetype, requri> %s,%s,%s"
                      % (vimid, servicetype, requri))
-        self._logger.debug("META, data> %s , %s" % (request.META, request.data))
+        if not self._is_streamed_request(request, servicetype):
+            self._logger.debug("META, data> %s , %s" % (request.META, request.data))
 
         return self._do_action("post", request, vimid, servicetype, requri)
 
     def put(self, request, vimid="", servicetype="", requri=""):
         self._logger.info("vimid, servicetype, requri> %s,%s,%s"
                      % (vimid, servicetype, requri))
-        self._logger.debug("META, data> %s , %s" % (request.META, request.data))
+        if not self._is_streamed_request(request, servicetype):
+            self._logger.debug("META, data> %s , %s" % (request.META, request.data))
 
         return self._do_action("put", request, vimid, servicetype, requri)
 
     def patch(self, request, vimid="", servicetype="", requri=""):
         self._logger.info("vimid, servicetype, requri> %s,%s,%s"
                      % (vimid, servicetype, requri))
-        self._logger.debug("META, data> %s , %s" % (request.META, request.data))
+        if not self._is_streamed_request(request, servicetype):
+            self._logger.debug("META, data> %s , %s" % (request.META, request.data))
 
         return self._do_action("patch", request, vimid, servicetype, requri)
 
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import logging
 import json
 import uuid
@@ -24,9 +25,11 @@ from rest_framework.views import APIView
 
 from common.exceptions import VimDriverNewtonException
 from common.msapi import extsys
+from common.msapi import teardown
 from common.msapi.helper import MultiCloudThreadHelper
 from common.msapi.helper import MultiCloudAAIHelper
 from common.utils import restcall
+from newton_base import flavor_specs
 from newton_base.util import VimDriverUtils
 from django.conf import settings
 
@@ -119,7 +122,9 @@ class Registry(APIView):
             backlog_item = {
                 "id": vimid,
                 "worker": self.register_helper.unregistryV0,
-                "payload": (vimid,),  # important to add , at the end
+                # report the progress through the status of the item
+                "payload": (vimid, functools.partial(
+                    self.register_thread.report, vimid)),
                 "repeat": 0,
                 "status": (1, "The de-registration is in progress")
             }
@@ -162,6 +167,9 @@ class RegistryHelper(MultiCloudAAIHelper):
         return self.registryV0(vimid)
 
     def registryV0(self, vimid, project_idorname=None):
+        # the cloud region might have been updated in AAI by ESR
+        extsys.flush_vim_by_id(vimid)
+
         # populate proxy identity url
         self._update_proxy_identity_endpoint(vimid)
 
@@ -199,33 +207,20 @@ class RegistryHelper(MultiCloudAAIHelper):
             sess = VimDriverUtils.get_session(
                 viminfo, tenant_name=viminfo.get('tenant', None))
 
-        # step 1. discover all projects and populate into AAI
-        retcode, status = self._discover_tenants(vimid, sess, viminfo)
-        # if 0 != retcode:
-        #     return (
-        #         retcode, status
-        #     )
-
-        # discover all flavors
-        retcode, status = self._discover_flavors(vimid, sess, viminfo)
-        # if 0 != retcode:
-        #     return (
-        #         retcode, status
-        #     )
-
-        # discover all images
-        retcode, status = self._discover_images(vimid, sess, viminfo)
-        # if 0 != retcode:
-        #     return (
-        #         retcode, status
-        #     )
-
-        # discover all az
-        retcode, status = self._discover_availability_zones(vimid, sess, viminfo)
-        # if 0 != retcode:
-        #     return (
-        #         retcode, status
-        #     )
+        # the resources already in AAI, to write only the changes
+        cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
+        snapshot = self._get_region_snapshot(cloud_owner, cloud_region_id)
+
+        # the discovery phases are independent of each other:
+        # step 1. discover all projects and populate into AAI,
+        # discover all flavors, images and az
+        self._run_phases([
+            (self._discover_tenants, (vimid, sess, viminfo, snapshot)),
+            (self._discover_flavors, (vimid, sess, viminfo, snapshot)),
+            (self._discover_images, (vimid, sess, viminfo, snapshot)),
+            (self._discover_availability_zones,
+             (vimid, sess, viminfo, snapshot)),
+        ])
 
         # discover all vg
         #self._discover_volumegroups(vimid, sess, viminfo)
@@ -260,7 +255,11 @@ class RegistryHelper(MultiCloudAAIHelper):
         vimid = extsys.encode_vim_id(cloud_owner, cloud_region_id)
         return self.unregistryV0(vimid)
 
-    def unregistryV0(self, vimid):
+    def unregistryV0(self, vimid, progress=None):
+        '''
+        :param progress: called with the progress of the teardown,
+        as (1, progress) to match the (retcode, result) of the final status
+        '''
         # prepare request resource to vim instance
         # get token:
         viminfo = VimDriverUtils.get_vim_info(vimid)
@@ -294,201 +293,39 @@ class RegistryHelper(MultiCloudAAIHelper):
                 "Cloud Region not found: %s, %s" % (cloud_owner, cloud_region_id)
             )
 
-        # step 1. remove all tenants
-        tenants = cloudregiondata.get("tenants", None)
-        for tenant in tenants.get("tenant", []) if tenants else []:
-            # common prefix
-            aai_cloud_region = \
-                "/cloud-infrastructure/cloud-regions/cloud-region/%s/%s/tenants/tenant/%s" \
-                % (cloud_owner, cloud_region_id, tenant['tenant-id'])
-
-            # remove all vservers
-            try:
-                # get list of vservers
-                vservers = tenant.get('vservers', {}).get('vserver', [])
-                for vserver in vservers:
-                    try:
-                        # iterate vport, except will be raised if no l-interface exist
-                        for vport in vserver['l-interfaces']['l-interface']:
-                            # delete vport
-                            vport_delete_url =\
-                                aai_cloud_region + \
-                                "/vservers/vserver/%s/l-interfaces/l-interface/%s?resource-version=%s" \
-                                % (vserver['vserver-id'], vport['interface-name'],
-                                   vport['resource-version'])
-                            restcall.req_to_aai(vport_delete_url, "DELETE")
-                    except Exception as e:
-                        pass
-
-                    try:
-                        # delete vserver
-                        vserver_delete_url =\
-                            aai_cloud_region +\
-                            "/vservers/vserver/%s?resource-version=%s" \
-                            % (vserver['vserver-id'],
-                               vserver['resource-version'])
-                        restcall.req_to_aai(vserver_delete_url, "DELETE")
-                    except Exception as e:
-                        continue
-
-            except Exception:
-                self._logger.error(traceback.format_exc())
-                pass
-
-            resource_url = ("/cloud-infrastructure/cloud-regions/"
-                            "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                            "%(resource_type)ss/%(resource_type)s/%(resource_id)s/"
-                            "?resource-version=%(resource-version)s"
-                            % {
-                                "cloud_owner": cloud_owner,
-                                "cloud_region_id": cloud_region_id,
-                                "resource_type": "tenant",
-                                "resource_id": tenant["tenant-id"],
-                                "resource-version": tenant["resource-version"]
-                            })
-            # remove tenant
-            retcode, content, status_code = \
-                restcall.req_to_aai(resource_url, "DELETE")
-
-        # remove all flavors
-        flavors = cloudregiondata.get("flavors", None)
-        for flavor in flavors.get("flavor", []) if flavors else []:
-            # iterate hpa-capabilities
-            hpa_capabilities = flavor.get("hpa-capabilities", None)
-            for hpa_capability in hpa_capabilities.get("hpa-capability", [])\
-                    if hpa_capabilities else []:
-                resource_url = ("/cloud-infrastructure/cloud-regions/"
-                                "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                                "%(resource_type)ss/%(resource_type)s/%(resource_id)s/"
-                                "hpa-capabilities/hpa-capability/%(hpa-capability-id)s/"
-                                "?resource-version=%(resource-version)s"
-                                % {
-                                    "cloud_owner": cloud_owner,
-                                    "cloud_region_id": cloud_region_id,
-                                    "resource_type": "flavor",
-                                    "resource_id": flavor["flavor-id"],
-                                    "hpa-capability-id": hpa_capability["hpa-capability-id"],
-                                    "resource-version": hpa_capability["resource-version"]
-                                })
-                # remove hpa-capability
-                retcode, content, status_code = \
-                    restcall.req_to_aai(resource_url, "DELETE")
-
-            # remove flavor
-            resource_url = ("/cloud-infrastructure/cloud-regions/"
-                            "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                            "%(resource_type)ss/%(resource_type)s/%(resource_id)s/"
-                            "?resource-version=%(resource-version)s"
-                            % {
-                                "cloud_owner": cloud_owner,
-                                "cloud_region_id": cloud_region_id,
-                                "resource_type": "flavor",
-                                "resource_id": flavor["flavor-id"],
-                                "resource-version": flavor["resource-version"]
-                            })
-
-            retcode, content, status_code = \
-                restcall.req_to_aai(resource_url, "DELETE")
-
-        # remove all images
-        images = cloudregiondata.get("images", None)
-        for image in images.get("image", []) if images else []:
-            resource_url = ("/cloud-infrastructure/cloud-regions/"
-                            "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                            "%(resource_type)ss/%(resource_type)s/%(resource_id)s/"
-                            "?resource-version=%(resource-version)s"
-                            % {
-                                "cloud_owner": cloud_owner,
-                                "cloud_region_id": cloud_region_id,
-                                "resource_type": "image",
-                                "resource_id": image["image-id"],
-                                "resource-version": image["resource-version"]
-                            })
-            # remove image
-            retcode, content, status_code = \
-                restcall.req_to_aai(resource_url, "DELETE")
-
-        # remove all az
-        azs = cloudregiondata.get("availability-zones", None)
-        for az in azs.get("availability-zone", []) if azs else []:
-            # delete az relationship first
-            resource_url = ("/cloud-infrastructure/cloud-regions/"
-                            "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                            "%(resource_type)ss/%(resource_type)s/%(resource_id)s"
-                            % {
-                                "cloud_owner": cloud_owner,
-                                "cloud_region_id": cloud_region_id,
-                                "resource_type": "availability-zone",
-                                "resource_id": az["availability-zone-name"]
-                            })
-
-            rs = az.get("relationship-list", []).get("relationship", [])
-            for r in rs:
-                retcode, content, status_code = \
-                    restcall.req_to_aai(
-                        resource_url+"/relationship-list/relationship",
-                        "DELETE", content=r)
-
-            # delete az
-            resource_url2 = (resource_url + "?resource-version=%(resource-version)s"
-                             % {"resource-version": az["resource-version"]})
-            retcode, content, status_code = \
-                restcall.req_to_aai(resource_url2, "DELETE")
-
-
-        # remove all vg
-
-        # remove all snapshots
-        snapshots = cloudregiondata.get("snapshots", None)
-        for snapshot in snapshots.get("snapshot", []) if snapshots else []:
-            resource_url = ("/cloud-infrastructure/cloud-regions/"
-                            "cloud-region/%(cloud_owner)s/%(cloud_region_id)s/"
-                            "%(resource_type)ss/%(resource_type)s/%(resource_id)s/"
-                            "?resource-version=%(resource-version)s"
-                            % {
-                                "cloud_owner": cloud_owner,
-                                "cloud_region_id": cloud_region_id,
-                                "resource_type": "snapshot",
-                                "resource_id": snapshot["snapshot-id"],
-                                "resource-version": snapshot["resource-version"]
-                            })
-            # remove snapshot
-            retcode, content, status_code = \
-                restcall.req_to_aai(resource_url, "DELETE")
-
-        # remove all server groups
-
-        # remove all pservers
-
-        # remove cloud region itself
-        resource_url = ("/cloud-infrastructure/cloud-regions/"
-                        "cloud-region/%(cloud_owner)s/%(cloud_region_id)s"
-                        "?resource-version=%(resource-version)s"
-                        % {
-                            "cloud_owner": cloud_owner,
-                            "cloud_region_id": cloud_region_id,
-                            "resource-version": cloudregiondata["resource-version"]
-                        })
-        # remove cloud region
-        retcode, content, status_code = \
-            restcall.req_to_aai(resource_url, "DELETE")
-
-        return retcode, content
-
-    def _discover_tenants(self, vimid="", session=None, viminfo=None):
+        # remove the resources of the cloud region, children first,
+        # then the cloud region itself
+        result = teardown.run(
+            teardown.TeardownPlan(
+                cloud_owner, cloud_region_id, cloudregiondata),
+            self._fan_out,
+            progress and (lambda current: progress((1, current))))
+        if result["failed"] or result["skipped"]:
+            return 1, result
+        return 0, result
+
+    def _discover_tenants(self, vimid="", session=None, viminfo=None,
+                          snapshot=None):
         try:
             # iterate all projects and populate them into AAI
             cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
-            for tenant in self._get_list_resources(
-                    "projects", "identity", session, viminfo, vimid,
-                    "projects"):
-                tenant_info = {
-                    'tenant-id': tenant['id'],
-                    'tenant-name': tenant['name'],
-                }
-                self._update_resoure(
-                    cloud_owner, cloud_region_id, tenant['id'],
-                    tenant_info, "tenant")
+            tenants = self._get_list_resources(
+                "projects", "identity", session, viminfo, vimid,
+                "projects")
+            resources = [
+                (tenant['id'],
+                 {
+                     'tenant-id': tenant['id'],
+                     'tenant-name': tenant['name'],
+                 },
+                 "tenant")
+                for tenant in tenants]
+            self._update_resources(cloud_owner, cloud_region_id, [
+                resource for resource in resources
+                if not self._is_unchanged(snapshot, *resource)], snapshot)
+            self._delete_stale_resources(
+                cloud_owner, cloud_region_id, "tenant",
+                [tenant['id'] for tenant in tenants], snapshot)
             return 0, "succeed"
         except VimDriverNewtonException as e:
             self._logger.error(
@@ -511,9 +348,9 @@ class RegistryHelper(MultiCloudAAIHelper):
                         'tenant-name': tenant['name'],
                     }
 
-                    self._update_resoure(
+                    self._put_resource(
                         cloud_owner, cloud_region_id, tenant['id'],
-                        tenant_info, "tenant")
+                        tenant_info, "tenant", snapshot)
 
                     return 0, "succeed"
 
@@ -537,46 +374,45 @@ class RegistryHelper(MultiCloudAAIHelper):
                 str(e)
             )
 
-    def _discover_flavors(self, vimid="", session=None, viminfo=None):
+    def _discover_flavors(self, vimid="", session=None, viminfo=None,
+                          snapshot=None):
         try:
             cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
-            for flavor in self._get_list_resources(
+            # with the extra_specs if the VIM supports it
+            loader = flavor_specs.FlavorSpecsLoader(
+                session, vimid, {
+                    'service_type': 'compute',
+                    'interface': 'public',
+                    'region_name': viminfo.get('openstack_region_id')
+                    or viminfo['cloud_region_id'],
+                }, viminfo.get('url') or vimid)
+
+            def get_page(url):
+                resp = loader.get_flavors(url)
+                return resp.json() \
+                    if resp.status_code == status.HTTP_200_OK else None
+
+            # populate each page while the next one is retrieved
+            flavor_ids = []
+            for flavors in self._iter_list_pages(
                     "/flavors/detail", "compute", session, viminfo, vimid,
-                    "flavors"):
-                flavor_info = {
-                    'flavor-id': flavor['id'],
-                    'flavor-name': flavor['name'],
-                    'flavor-vcpus': flavor['vcpus'],
-                    'flavor-ram': flavor['ram'],
-                    'flavor-disk': flavor['disk'],
-                    'flavor-ephemeral': flavor['OS-FLV-EXT-DATA:ephemeral'],
-                    'flavor-swap': flavor['swap'],
-                    'flavor-is-public': flavor['os-flavor-access:is_public'],
-                    'flavor-disabled': flavor['OS-FLV-DISABLED:disabled'],
-                }
-
-                if flavor.get('links') and len(flavor['links']) > 0:
-                    flavor_info['flavor-selflink'] =\
-                        flavor['links'][0]['href'] or 'http://0.0.0.0'
-                else:
-                    flavor_info['flavor-selflink'] = 'http://0.0.0.0'
-
-                # add hpa capabilities
-                if (flavor['name'].find('onap.') == 0):
-                    req_resouce = "/flavors/%s/os-extra_specs" % flavor['id']
-                    extraResp = self._get_list_resources(
-                        req_resouce, "compute", session,
-                        viminfo, vimid, "extra_specs")
-
-                    data = {"flavor": flavor, "extra_specs": extraResp, "viminfo": viminfo}
-                    hpa_capabilities = self._get_hpa_capabilities(data)
-                    flavor_info['hpa-capabilities'] = \
-                        {'hpa-capability': hpa_capabilities}
-
-                retcode, content = self._update_resoure(
-                    cloud_owner, cloud_region_id, flavor['id'],
-                    flavor_info, "flavor")
-
+                    "flavors", get_page):
+                # the extra_specs of the hpa flavors, cached per flavor
+                try:
+                    loader.load_extra_specs([
+                        flavor for flavor in flavors
+                        if flavor['name'].find('onap.') == 0])
+                except Exception as e:
+                    # fetched again by _populate_flavor
+                    self._logger.warn("failed to load the extra_specs of"
+                                      " the flavors: %s" % str(e))
+                self._fan_out(
+                    lambda flavor: self._populate_flavor(
+                        vimid, session, viminfo, flavor, snapshot),
+                    flavors)
+                flavor_ids.extend([flavor['id'] for flavor in flavors])
+            self._delete_stale_resources(
+                cloud_owner, cloud_region_id, "flavor", flavor_ids, snapshot)
             return (0, "succeed")
         except VimDriverNewtonException as e:
             self._logger.error(
@@ -597,6 +433,51 @@ class RegistryHelper(MultiCloudAAIHelper):
                 11, str(e)
             )
 
+    def _populate_flavor(self, vimid, session, viminfo, flavor,
+                         snapshot=None):
+        '''
+        populate a flavor with its hpa capabilities into AAI
+        '''
+        cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
+        flavor_info = {
+            'flavor-id': flavor['id'],
+            'flavor-name': flavor['name'],
+            'flavor-vcpus': flavor['vcpus'],
+            'flavor-ram': flavor['ram'],
+            'flavor-disk': flavor['disk'],
+            'flavor-ephemeral': flavor['OS-FLV-EXT-DATA:ephemeral'],
+            'flavor-swap': flavor['swap'],
+            'flavor-is-public': flavor['os-flavor-access:is_public'],
+            'flavor-disabled': flavor['OS-FLV-DISABLED:disabled'],
+        }
+
+        if flavor.get('links') and len(flavor['links']) > 0:
+            flavor_info['flavor-selflink'] =\
+                flavor['links'][0]['href'] or 'http://0.0.0.0'
+        else:
+            flavor_info['flavor-selflink'] = 'http://0.0.0.0'
+
+        # add hpa capabilities
+        if (flavor['name'].find('onap.') == 0):
+            extraResp = flavor.get('extra_specs')
+            if extraResp is None:
+                req_resouce = "/flavors/%s/os-extra_specs" % flavor['id']
+                extraResp = self._get_list_resources(
+                    req_resouce, "compute", session,
+                    viminfo, vimid, "extra_specs")
+
+            data = {"flavor": flavor, "extra_specs": extraResp, "viminfo": viminfo}
+            hpa_capabilities = self._get_hpa_capabilities(data)
+            if snapshot is not None:
+                # only the changed capabilities are replaced
+                self._stable_hpa_capability_ids(
+                    flavor['id'], hpa_capabilities)
+            flavor_info['hpa-capabilities'] = \
+                {'hpa-capability': hpa_capabilities}
+
+        return self._put_flavor(
+            cloud_owner, cloud_region_id, flavor_info, snapshot)
+
     def _get_hpa_capabilities(self, data):
         hpa_caps = []
 
@@ -1037,61 +918,22 @@ class RegistryHelper(MultiCloudAAIHelper):
     #         return retcode
     #     return 1
 
-    def _discover_images(self, vimid="", session=None, viminfo=None):
+    def _discover_images(self, vimid="", session=None, viminfo=None,
+                         snapshot=None):
         try:
             cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
-            for image in self._get_list_resources(
+            # populate each page while the next one is retrieved
+            image_ids = []
+            for images in self._iter_list_pages(
                     "/v2/images", "image", session, viminfo, vimid,
                     "images"):
-                image_info = {
-                    'image-id': image['id'],
-                    'image-name': image['name'],
-                    'image-selflink': image['self'],
-
-                    'image-os-distro': image.get('os_distro') or 'Unknown',
-                    'image-os-version': image.get('os_version') or 'Unknown',
-                    'application': image.get('application'),
-                    'application-vendor': image.get('application_vendor'),
-                    'application-version': image.get('application_version'),
-                    'image-architecture': image.get('architecture'),
-                }
-
-                ret = self._update_resoure(
-                    cloud_owner, cloud_region_id, image['id'], image_info,
-                    "image")
-                if ret != 0:
-                    # failed to update image
-                    self._logger.debug(
-                        "failed to populate image info into AAI: %s,"
-                        " image id: %s, ret:%s"
-                        % (vimid, image_info['image-id'], ret))
-                    continue
-
-                schema = image['schema']
-                if schema:
-                    req_resource = schema
-                    service = {'service_type': "image",
-                               'interface': 'public',
-                               'region_name': viminfo['openstack_region_id']
-                               if viminfo.get('openstack_region_id')
-                               else viminfo['cloud_region_id']
-                               }
-
-                    self._logger.info("making request with URI:%s" %
-                                      req_resource)
-                    resp = session.get(req_resource, endpoint_filter=service)
-                    self._logger.info("request returns with status %s" %
-                                      resp.status_code)
-                    if resp.status_code == status.HTTP_200_OK:
-                        self._logger.debug("with content:%s" %
-                                           resp.json())
-                        pass
-                    content = resp.json()
-
-                    # if resp.status_code == status.HTTP_200_OK:
-                        # parse the schema? TBD
-                        # self.update_image(cloud_owner, cloud_region_id, image_info)
-                        #metadata_info = {}
+                self._fan_out(
+                    lambda image: self._populate_image(
+                        vimid, session, viminfo, image, snapshot),
+                    images)
+                image_ids.extend([image['id'] for image in images])
+            self._delete_stale_resources(
+                cloud_owner, cloud_region_id, "image", image_ids, snapshot)
             return (0, "succeed")
         except VimDriverNewtonException as e:
             self._logger.error("VimDriverNewtonException:"
@@ -1112,74 +954,55 @@ class RegistryHelper(MultiCloudAAIHelper):
                 11, str(e)
             )
 
+    def _populate_image(self, vimid, session, viminfo, image,
+                        snapshot=None):
+        '''
+        populate an image into AAI
+        '''
+        cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
+        image_info = {
+            'image-id': image['id'],
+            'image-name': image['name'],
+            'image-selflink': image['self'],
+
+            'image-os-distro': image.get('os_distro') or 'Unknown',
+            'image-os-version': image.get('os_version') or 'Unknown',
+            'application': image.get('application'),
+            'application-vendor': image.get('application_vendor'),
+            'application-version': image.get('application_version'),
+            'image-architecture': image.get('architecture'),
+        }
+
+        ret, content = self._put_resource(
+            cloud_owner, cloud_region_id, image['id'], image_info,
+            "image", snapshot)
+        if ret != 0:
+            # failed to update image
+            self._logger.debug(
+                "failed to populate image info into AAI: %s,"
+                " image id: %s, ret:%s, %s"
+                % (vimid, image_info['image-id'], ret, content))
+        # the image schema (image['schema']) is not populated into AAI,
+        # hence not retrieved
+        return ret
+
     def _discover_availability_zones(self, vimid="", session=None,
-                                     viminfo=None):
+                                     viminfo=None, snapshot=None):
         try:
-            az_pserver_info = {}
             cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
-            for az in self._get_list_resources(
-                    "/os-availability-zone/detail", "compute", session,
-                    viminfo, vimid,
-                    "availabilityZoneInfo"):
-                az_info = {
-                    'availability-zone-name': az['zoneName'],
-                    'operational-status': az['zoneState']['available']
-                    if az.get('zoneState') else '',
-                    'hypervisor-type': '',
-                }
-                # filter out the default az: "internal" and "nova"
-                azName = az.get('zoneName', None)
-                # comment it for test the registration process only
-                #  if azName == 'nova':
-                #    continue
-                if azName == 'internal':
-                    continue
-
-                # get list of host names
-                pservers_info = [k for (k, v) in list(az['hosts'].items())]
-                # set the association between az and pservers
-                az_pserver_info[azName] = pservers_info
-
-                az_info['hypervisor-type'] = 'QEMU' # default for OpenStack
-
-                ret, content = self._update_resoure(
-                    cloud_owner, cloud_region_id, az['zoneName'], az_info,
-                    "availability-zone")
-                if ret != 0:
-                    # failed to update image
-                    self._logger.debug(
-                        "failed to populate az info into AAI: "
-                        "%s, az name: %s, ret:%s"
-                        % (vimid, az_info['availability-zone-name'], ret))
-                    # return (
-                    #     ret,
-                    #     "fail to popluate az info into AAI:%s" % content
-                    # )
-                    continue
-
-                # populate pservers:
-                for hostname in pservers_info:
-                    if hostname == "":
-                        continue
-
-                    pservername = vimid+"_"+hostname
-                    selflink = ""
-                    # if self.proxy_prefix[3:] == "/v1":
-                    #     selflink = "%s/%s/%s/compute/os-hypervisors/detail?hypervisor_hostname_pattern=%s"%\
-                    #            (self.proxy_prefix, cloud_owner, cloud_region_id , hostname)
-                    # else:
-                    #     selflink = "%s/%s/compute/os-hypervisors/detail?hypervisor_hostname_pattern=%s" % \
-                    #                (self.proxy_prefix, vimid, hostname)
-
-                    pinfo = {
-                        "hostname": pservername,
-                        "server-selflink": selflink,
-                        "pserver-id": hostname
-                    }
-                    self._update_pserver(cloud_owner, cloud_region_id, pinfo)
-                    self._update_pserver_relation_az(cloud_owner, cloud_region_id, pinfo, azName)
-                    self._update_pserver_relation_cloudregion(cloud_owner, cloud_region_id, pinfo)
-
+            azs = self._get_list_resources(
+                "/os-availability-zone/detail", "compute", session,
+                viminfo, vimid,
+                "availabilityZoneInfo")
+            # set the association between az and pservers
+            az_pserver_info = dict([
+                r for r in self._fan_out(
+                    lambda az: self._populate_availability_zone(
+                        vimid, session, viminfo, az, snapshot),
+                    azs) if r])
+            self._delete_stale_resources(
+                cloud_owner, cloud_region_id, "availability-zone",
+                [az['zoneName'] for az in azs], snapshot)
             return (0, az_pserver_info)
         except VimDriverNewtonException as e:
             self._logger.error(
@@ -1201,6 +1024,79 @@ class RegistryHelper(MultiCloudAAIHelper):
                 11, str(e)
             )
 
+    def _populate_availability_zone(self, vimid, session, viminfo, az,
+                                    snapshot=None):
+        '''
+        populate an az and its pservers into AAI
+        :return: (az name, list of host names), None if not populated
+        '''
+        cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
+        az_info = {
+            'availability-zone-name': az['zoneName'],
+            'operational-status': az['zoneState']['available']
+            if az.get('zoneState') else '',
+            'hypervisor-type': '',
+        }
+        # filter out the default az: "internal" and "nova"
+        azName = az.get('zoneName', None)
+        # comment it for test the registration process only
+        #  if azName == 'nova':
+        #    continue
+        if azName == 'internal':
+            return None
+
+        # get list of host names
+        pservers_info = [k for (k, v) in list(az['hosts'].items())]
+        az_info['hypervisor-type'] = 'QEMU' # default for OpenStack
+
+        ret, content = self._put_resource(
+            cloud_owner, cloud_region_id, az['zoneName'], az_info,
+            "availability-zone", snapshot)
+        if ret != 0:
+            # failed to update image
+            self._logger.debug(
+                "failed to populate az info into AAI: "
+                "%s, az name: %s, ret:%s"
+                % (vimid, az_info['availability-zone-name'], ret))
+            # return (
+            #     ret,
+            #     "fail to popluate az info into AAI:%s" % content
+            # )
+            return None
+
+        # the pservers are already related to the unchanged az
+        if content == "unchanged" and set(
+                [vimid + "_" + h for h in pservers_info if h]) <= \
+                self._get_related(
+                    snapshot.get("availability-zone", azName),
+                    "pserver", "pserver.hostname"):
+            return azName, pservers_info
+
+        # populate pservers:
+        for hostname in pservers_info:
+            if hostname == "":
+                continue
+
+            pservername = vimid+"_"+hostname
+            selflink = ""
+            # if self.proxy_prefix[3:] == "/v1":
+            #     selflink = "%s/%s/%s/compute/os-hypervisors/detail?hypervisor_hostname_pattern=%s"%\
+            #            (self.proxy_prefix, cloud_owner, cloud_region_id , hostname)
+            # else:
+            #     selflink = "%s/%s/compute/os-hypervisors/detail?hypervisor_hostname_pattern=%s" % \
+            #                (self.proxy_prefix, vimid, hostname)
+
+            pinfo = {
+                "hostname": pservername,
+                "server-selflink": selflink,
+                "pserver-id": hostname
+            }
+            self._update_pserver(cloud_owner, cloud_region_id, pinfo)
+            self._update_pserver_relation_az(cloud_owner, cloud_region_id, pinfo, azName)
+            self._update_pserver_relation_cloudregion(cloud_owner, cloud_region_id, pinfo)
+
+        return azName, pservers_info
+
     # def _discover_volumegroups(self, vimid="", session=None, viminfo=None):
     #     cloud_owner, cloud_region_id = extsys.decode_vim_id(vimid)
     #     for cg in self._get_list_resources(
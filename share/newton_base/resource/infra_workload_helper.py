@@ -19,6 +19,7 @@ from django.conf import settings
 from common.msapi import extsys
 from common.msapi.helper import Helper as helper
 
+from common.utils import aai_bulk
 from common.utils import restcall
 from newton_base.registration import registration as newton_registration
 
@@ -166,8 +167,8 @@ class InfraWorkloadHelper(object):
             logger.error(errmsg)
             return os_status, "UPDATE_FAILED", content
 
-        # find and update resources
-        # transactions = []
+        # find and update resources, the AAI writes are sent in bulk
+        aai_writer = aai_bulk.AAIBulkWriter()
         for resource in resources:
             if resource.get('resource_status', None) != "CREATE_COMPLETE":
                 # this resource is not ready yet, just return
@@ -217,23 +218,7 @@ class InfraWorkloadHelper(object):
                         "uri": aai_cloud_region + "/vservers/vserver/%s" % (vserver_detail['id'])
                     }
 
-                    try:
-                        # then update the resource
-                        retcode, content, status_code = \
-                            restcall.req_to_aai(aai_resource['uri'],
-                                                "PUT", content=aai_resource['body'])
-
-                        if retcode == 0 and content:
-                            content = json.JSONDecoder().decode(content)
-                            self._logger.debug("AAI update %s response: %s" %
-                                               (aai_resource['uri'], content))
-                    except Exception as e:
-                        self._logger.error(str(e))
-                        return status.HTTP_500_INTERNAL_SERVER_ERROR, "UPDATE_FAILED", str(e)
-
-                    # aai_resource_transactions = {"put": [aai_resource]}
-                    # transactions.append(aai_resource_transactions)
-                    # self._logger.debug("aai_resource :%s" % aai_resource_transactions)
+                    aai_writer.put(aai_resource['uri'], aai_resource['body'])
 
         for resource in resources:
             if resource.get('resource_status', None) != "CREATE_COMPLETE":
@@ -273,26 +258,19 @@ class InfraWorkloadHelper(object):
                             aai_cloud_region + "/vservers/vserver/%s/l-interfaces/l-interface/%s"
                                                % (vport_detail['device_id'], vport_detail['name'])
                     }
-                    try:
-                        # then update the resource
-                        retcode, content, status_code = \
-                            restcall.req_to_aai(aai_resource['uri'], "PUT",
-                                                content=aai_resource['body'])
-
-                        if retcode == 0 and content:
-                            content = json.JSONDecoder().decode(content)
-                            self._logger.debug("AAI update %s response: %s" %
-                                               (aai_resource['uri'], content))
-                    except Exception as e:
-                        self._logger.error(str(e))
-                        return status.HTTP_500_INTERNAL_SERVER_ERROR, "UPDATE_FAILED", str(e)
-
-                    # aai_resource_transactions = {"put": [aai_resource]}
-                    # transactions.append(aai_resource_transactions)
-                    # self._logger.debug("aai_resource :%s" % aai_resource_transactions)
-
-        # aai_transactions = {"transactions": transactions}
-        # self._logger.debug("aai_transactions :%s" % aai_transactions)
+                    aai_writer.put(aai_resource['uri'], aai_resource['body'])
+
+        try:
+            # vservers were queued before their l-interfaces,
+            # the writer keeps that order across batches
+            aai_writer.flush()
+        except Exception as e:
+            self._logger.error(str(e))
+            return status.HTTP_500_INTERNAL_SERVER_ERROR, "UPDATE_FAILED", str(e)
+
+        for op, retcode, content, status_code in aai_writer.results:
+            self._logger.debug("AAI update %s response: %s, %s" %
+                               (op['uri'], status_code, content))
         return 0, "UPDATE_COMPLETE", "succeed"
 
     def workload_delete(self, vimid, stack_id, otherinfo=None, project_idorname=None):
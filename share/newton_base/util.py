@@ -21,6 +21,8 @@ from keystoneauth1.identity import v3 as keystone_v3
 from keystoneauth1 import session
 
 from common.msapi import extsys
+from common.utils.local_cache import LocalLRUCache
+from common.utils import resilience
 
 # profiler decoration
 import cProfile
@@ -29,6 +31,14 @@ import os
 
 logger = logging.getLogger(__name__)
 
+# authenticated sessions by (vim, project, domain): (credentials, session)
+# sessions idle for longer than the ttl are dropped, a session keeps its
+# requests connection pool and its token, which keystoneauth renews
+# KEYSTONE_TOKEN_REFRESH_MARGIN seconds before it expires
+_session_pool = LocalLRUCache(
+    max_size=getattr(settings, "KEYSTONE_SESSION_POOL_SIZE", 64),
+    ttl=getattr(settings, "KEYSTONE_SESSION_IDLE_TIMEOUT", 600))
+
 
 class VimDriverUtils(object):
     @staticmethod
@@ -39,7 +49,7 @@ class VimDriverUtils(object):
         :param vimid: VIM Identifier
         :return: VIM information
         """
-        # TODO: get vim info from local cache firstly later from ESR
+        # cached by extsys, invalidated by the AAI writes
         return extsys.get_vim_by_id(vimid)
 
     @staticmethod
@@ -56,10 +66,50 @@ class VimDriverUtils(object):
 
     @staticmethod
     def get_session(
-            vim, tenant_id=None, tenant_name=None, auth_state=None):
+            vim, tenant_id=None, tenant_name=None, auth_state=None,
+            pooled=True):
         """
         get session object and optionally preload auth_state
+
+        Without auth_state the authenticated session is pooled and
+        shared by the requests to the same project, unless pooled is
+        False, e.g. to issue a token of its own to a client.
         """
+        if auth_state or not pooled:
+            return VimDriverUtils._new_session(
+                vim, tenant_id, tenant_name, auth_state)
+
+        key = (vim.get("vimId") or vim["url"],
+               ("id", tenant_id) if tenant_id
+               else ("name", tenant_name or vim['tenant']),
+               vim["domain"])
+        credentials = (vim["url"], vim["userName"], vim["password"],
+                       vim['insecure'])
+        pooled = _session_pool.get(key)
+        if pooled and pooled[0] == credentials:
+            sess = pooled[1]
+        else:
+            # new or the credentials have been updated in AAI
+            sess = VimDriverUtils._new_session(
+                vim, tenant_id, tenant_name, None)
+            sess.auth.MIN_TOKEN_LIFE_SECONDS = getattr(
+                settings, "KEYSTONE_TOKEN_REFRESH_MARGIN", 120)
+            sess.multicloud_pool_key = key
+        # refresh the idle timeout
+        _session_pool.set(key, (credentials, sess))
+        return sess
+
+    @staticmethod
+    def discard_session(session_obj):
+        """
+        drop a session from the pool, e.g. when its authentication failed
+        """
+        key = getattr(session_obj, "multicloud_pool_key", None)
+        if key:
+            _session_pool.delete(key)
+
+    @staticmethod
+    def _new_session(vim, tenant_id, tenant_name, auth_state):
         auth = None
 
         params = {
@@ -95,7 +145,10 @@ class VimDriverUtils(object):
         if auth_state:
            auth.set_auth_state(auth_state)
 
-        return session.Session(auth=auth, verify=(vim['insecure']==False))
+        # the VIM calls are retried and circuit broken as the other
+        # outbound calls
+        return session.Session(auth=auth, verify=(vim['insecure']==False),
+                               session=resilience.ResilientSession())
 
     @staticmethod
     def get_auth_state(session_obj):
@@ -108,7 +161,11 @@ class VimDriverUtils(object):
         auth = session_obj._auth_required(None, 'fetch a token')
         if auth:
             #trigger the authenticate request
-            session_obj.get_auth_headers(auth)
+            try:
+                session_obj.get_auth_headers(auth)
+            except Exception:
+                VimDriverUtils.discard_session(session_obj)
+                raise
 
             # norm_expires = utils.normalize_time(auth.expires)
             return auth.get_auth_state()
@@ -120,7 +177,9 @@ class VimDriverUtils(object):
         :param token:
         :return:
         """
-        return cache.get(token), cache.get("meta_%s" % token)
+        meta_key = "meta_%s" % token
+        cached = cache.get_many([token, meta_key])
+        return cached.get(token), cached.get(meta_key)
 
     @staticmethod
     def update_token_cache(token, auth_state, metadata):
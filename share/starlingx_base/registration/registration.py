@@ -59,13 +59,9 @@ class APIv0Registry(newton_registration.Registry):
             specified_project_idorname = request.META.get("Project", None)
 
             # vim registration will trigger the start the audit of AZ capacity
-            worker_self = InfraResourceAuditor(
-                settings.MULTICLOUD_API_V1_PREFIX,
-                settings.AAI_BASE_URL
-            )
             backlog_item = {
                 "id": vimid,
-                "worker": worker_self.azcap_audit,
+                "worker_name": "azcap_audit",
                 "payload": (vimid, specified_project_idorname),
                 "repeat": 10*1000000,  # repeat every 10 seconds
             }
@@ -112,13 +108,9 @@ class APIv1Registry(newton_registration.Registry):
             cloud_extra_info = viminfo.get("cloud_extra_info_json",{})
             if cloud_extra_info.get("capacity_auditor_enabled", False):
                 # vim registration will trigger the start the audit of AZ capacity
-                worker_self = InfraResourceAuditor(
-                    settings.MULTICLOUD_API_V1_PREFIX,
-                    settings.AAI_BASE_URL
-                )
                 backlog_item = {
                     "id": vimid,
-                    "worker": worker_self.azcap_audit,
+                    "worker_name": "azcap_audit",
                     "payload": (vimid, specified_project_idorname),
                     "repeat": 5 * 1000000,  # repeat every 5 seconds
                 }
@@ -160,6 +152,9 @@ class RegistryHelper(newton_registration.RegistryHelper):
         '''
         extend base method
         '''
+        # the cloud region might have been updated in AAI by ESR
+        extsys.flush_vim_by_id(vimid)
+
         viminfo = VimDriverUtils.get_vim_info(vimid)
 
         if not viminfo:
@@ -291,11 +286,11 @@ class RegistryHelper(newton_registration.RegistryHelper):
             self._logger.debug(errmsg)
             return 11, errmsg
 
-    def unregistryV0(self, vimid=""):
+    def unregistryV0(self, vimid="", progress=None):
         '''extend base method'''
 
         try:
-            return super(RegistryHelper, self).unregistryV0(vimid)
+            return super(RegistryHelper, self).unregistryV0(vimid, progress)
         except Exception as e:
             errmsg = "unregistryV0 fails %s" % str(e)
             self._logger.debug(errmsg)
@@ -733,3 +728,15 @@ class InfraResourceAuditor(newton_registration.RegistryHelper):
         except Exception as e:
             self._logger.error("azcap_audit raise exception: %s" % e)
             pass
+
+
+def _azcap_audit(vimid, project_idorname=None):
+    worker_self = InfraResourceAuditor(
+        settings.MULTICLOUD_API_V1_PREFIX,
+        settings.AAI_BASE_URL
+    )
+    return worker_self.azcap_audit(vimid, project_idorname)
+
+
+# the audits are shared by the worker processes
+gAZCapAuditThread.register_worker("azcap_audit", _azcap_audit)
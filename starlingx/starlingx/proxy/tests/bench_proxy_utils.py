@@ -0,0 +1,108 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+micro-benchmark of ProxyUtils.update_prefix over Nova/Neutron list payloads,
+compared with the former dumps/regex per service/loads implementation.
+From the starlingx directory:
+    PYTHONPATH=../share python -m starlingx.proxy.tests.bench_proxy_utils
+'''
+
+import json
+import os
+import re
+import timeit
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "starlingx.settings")
+
+from newton_base.proxy.proxy_utils import ProxyUtils  # noqa: E402
+from starlingx.proxy.tests.test_proxy_utils import METADATA_CATALOG  # noqa
+
+COMPUTE = "http://128.224.180.14:8774/v2.1/fcca3cc49d5e42caae15459e27103efc"
+NETWORK = "http://128.224.180.14:9696/v2.0"
+
+
+def legacy_update_prefix(metadata_catalog, content):
+    content_str = json.dumps(content)
+    for (servicetype, service_metadata) in list(metadata_catalog.items()):
+        real_prefix = service_metadata.get('prefix', None)
+        proxy_prefix = service_metadata.get('proxy_prefix', None)
+        if real_prefix and proxy_prefix:
+            tmp_pattern = re.compile(real_prefix + r'([^:])')
+            content_str = tmp_pattern.sub(proxy_prefix + r'\1', content_str)
+    return json.loads(content_str)
+
+
+def nova_servers(count):
+    return {"servers": [{
+        "id": "server-%s" % i,
+        "name": "vm-%s" % i,
+        "status": "ACTIVE",
+        "tenant_id": "fcca3cc49d5e42caae15459e27103efc",
+        "metadata": {"vnf": "vfw", "index": str(i)},
+        "addresses": {"private": [{
+            "addr": "10.0.0.%s" % (i % 250), "version": 4,
+            "OS-EXT-IPS:type": "fixed"}]},
+        "flavor": {"id": "1", "links": [{
+            "href": COMPUTE + "/flavors/1", "rel": "bookmark"}]},
+        "image": {"id": "image-1", "links": [{
+            "href": COMPUTE + "/images/image-1", "rel": "bookmark"}]},
+        "links": [
+            {"href": COMPUTE + "/servers/server-%s" % i, "rel": "self"},
+            {"href": COMPUTE + "/servers/server-%s" % i, "rel": "bookmark"},
+        ],
+        "security_groups": [{"name": "default"}],
+        "OS-EXT-AZ:availability_zone": "nova",
+        "os-extended-volumes:volumes_attached": [],
+    } for i in range(count)]}
+
+
+def neutron_ports(count):
+    return {"ports": [{
+        "id": "port-%s" % i,
+        "name": "",
+        "network_id": "net-1",
+        "mac_address": "fa:16:3e:00:%02x:%02x" % (i // 256 % 256, i % 256),
+        "admin_state_up": True,
+        "status": "ACTIVE",
+        "device_owner": "compute:nova",
+        "fixed_ips": [{"subnet_id": "subnet-1",
+                       "ip_address": "10.0.%s.%s" % (i // 250, i % 250)}],
+        "security_groups": ["sg-1"],
+        "binding:vif_details": {"port_filter": True, "ovs_hybrid_plug": True},
+        "tags": [],
+    } for i in range(count)], "ports_links": [
+        {"href": NETWORK + "/ports?marker=port-%s" % (count - 1),
+         "rel": "next"}]}
+
+
+def main():
+    for name, payload in [("nova servers x1000", nova_servers(1000)),
+                          ("neutron ports x2000", neutron_ports(2000))]:
+        assert legacy_update_prefix(METADATA_CATALOG, payload) == \
+            ProxyUtils.update_prefix(
+                METADATA_CATALOG, json.loads(json.dumps(payload)))
+        for impl_name, impl in [("legacy", legacy_update_prefix),
+                                ("update_prefix", ProxyUtils.update_prefix)]:
+            # update_prefix works in place, give it a fresh payload each time
+            copies = iter([json.loads(json.dumps(payload))
+                           for _ in range(50)])
+            best = min(timeit.repeat(
+                lambda: impl(METADATA_CATALOG, next(copies)),
+                number=10, repeat=5))
+            print("%-20s %-14s %8.2f ms" % (name, impl_name, best * 100))
+
+
+if __name__ == "__main__":
+    main()
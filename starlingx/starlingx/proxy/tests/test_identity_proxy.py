@@ -12,12 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import datetime
 import json
 
 import mock
 import unittest
 
+from django.core.cache import cache
 from django.test import Client
+from django.test.utils import override_settings
 from rest_framework import status
 
 from newton_base.util import VimDriverUtils
@@ -737,3 +741,41 @@ class TestIdentityService(unittest.TestCase):
                          response['X-Subject-Token'])
 
         self.assertIsNotNone(context['token']['catalog'])
+
+    @mock.patch.object(VimDriverUtils, 'get_vim_info')
+    @mock.patch.object(VimDriverUtils, 'get_session')
+    @mock.patch.object(VimDriverUtils, 'get_auth_state')
+    def test_token_issuance_cache(self, mock_get_auth_state,
+                                  mock_get_session, mock_get_vim_info):
+        auth_state = copy.deepcopy(mock_auth_state)
+        expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        auth_state["body"]["token"]["expires_at"] = \
+            expires.strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+        mock_get_vim_info.return_value = mock_viminfo
+        mock_get_session.return_value = mock.Mock(name='mock_session')
+        mock_get_auth_state.return_value = json.dumps(auth_state)
+
+        url = "/api/multicloud-starlingx/v0/starlingx_RegionOne" \
+              "/identity/v3/auth/tokens"
+        data = {"auth": {"scope": {"project": {"name": "admin"}}}}
+        with override_settings(
+                TOKEN_ISSUANCE_CACHE=True,
+                CACHES={'default': {'BACKEND':
+                    'django.core.cache.backends.locmem.LocMemCache'}}):
+            cache.clear()
+            for _ in range(2):
+                response = self.client.post(
+                    url, data=json.dumps(data),
+                    content_type='application/json')
+                self.assertEqual(
+                    status.HTTP_201_CREATED, response.status_code)
+                self.assertEqual(mock_token_id, response['X-Subject-Token'])
+                self.assertIsNotNone(response.json()['token']['catalog'])
+            self.assertEqual(1, mock_get_auth_state.call_count)
+
+            # another scope is issued its own token
+            data["auth"]["scope"]["project"]["name"] = "demo"
+            self.client.post(url, data=json.dumps(data),
+                             content_type='application/json')
+            self.assertEqual(2, mock_get_auth_state.call_count)
@@ -0,0 +1,79 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from newton_base.proxy.proxy_utils import ProxyUtils
+
+PROXY_PREFIX = "http://msb:80/api/multicloud-starlingx/v0/starlingx_RegionOne"
+
+METADATA_CATALOG = {
+    "compute": {
+        "prefix": "http://128.224.180.14:8774",
+        "proxy_prefix": PROXY_PREFIX + "/compute",
+        "suffix": "v2.1/fcca3cc49d5e42caae15459e27103efc",
+    },
+    "network": {
+        "prefix": "http://128.224.180.14:9696",
+        "proxy_prefix": PROXY_PREFIX + "/network",
+        "suffix": "",
+    },
+    "image": {
+        "prefix": "http://128.224.180.14",
+        "proxy_prefix": PROXY_PREFIX + "/image",
+        "suffix": "image",
+    },
+}
+
+
+class TestUpdatePrefix(unittest.TestCase):
+
+    def test_rewrite_endpoints(self):
+        content = {
+            "servers": [{
+                "id": "s1",
+                "name": "http://128.224.180.14:8774 in a name",
+                "links": [{
+                    "href": "http://128.224.180.14:8774/v2.1/servers/s1",
+                    "rel": "self"}],
+                "image": {"links": [
+                    {"href": "http://128.224.180.14/image/v2/images/i1"}]},
+                "flavor": {"vcpus": 1, "ram": 512.0, "extra": None},
+                "networks": ["http://128.224.180.14:9696"],
+            }],
+            "servers_links": [],
+        }
+        result = ProxyUtils.update_prefix(METADATA_CATALOG, content)
+        server = result["servers"][0]
+        self.assertEqual(
+            PROXY_PREFIX + "/compute/v2.1/servers/s1",
+            server["links"][0]["href"])
+        self.assertEqual(PROXY_PREFIX + "/compute in a name", server["name"])
+        self.assertEqual(
+            PROXY_PREFIX + "/image/image/v2/images/i1",
+            server["image"]["links"][0]["href"])
+        self.assertEqual([PROXY_PREFIX + "/network"], server["networks"])
+        self.assertEqual(
+            {"vcpus": 1, "ram": 512.0, "extra": None}, server["flavor"])
+
+    def test_prefix_without_port(self):
+        # the prefix without port does not match an url with another port
+        content = {"href": "http://128.224.180.14:5000/v3"}
+        self.assertEqual(
+            content, ProxyUtils.update_prefix(METADATA_CATALOG, content))
+
+    def test_nothing_to_rewrite(self):
+        self.assertIsNone(ProxyUtils.update_prefix(METADATA_CATALOG, None))
+        content = {"href": "http://128.224.180.14:8774/"}
+        self.assertEqual(content, ProxyUtils.update_prefix({}, content))
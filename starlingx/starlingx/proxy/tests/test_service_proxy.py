@@ -15,11 +15,14 @@
 import copy
 import json
 
+from django.core.cache import cache
 from django.test import Client
+from django.test.utils import override_settings
 import mock
 from rest_framework import status
 import unittest
 
+from newton_base.proxy import services
 from newton_base.util import VimDriverUtils
 
 MOCK_VIM_INFO = {
@@ -850,3 +853,188 @@ class TestServiceProxy(unittest.TestCase):
 
         self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
         self.assertEqual(MOCK_TOKEN_ID, response['X-Subject-Token'])
+
+    @mock.patch.object(VimDriverUtils, 'get_vim_info')
+    @mock.patch.object(VimDriverUtils, 'get_session')
+    @mock.patch.object(VimDriverUtils, 'get_token_cache')
+    def test_streaming_image_data(
+            self, mock_get_token_cache, mock_get_session, mock_get_vim_info):
+        mock_download_response_obj = mock.Mock()
+        mock_download_response_obj.status_code = 200
+        mock_download_response_obj.headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Length": "6", "Content-MD5": "md5",
+            "Content-Encoding": "gzip"}
+        # the body as received, still gzipped
+        mock_download_response_obj.raw.stream.return_value = \
+            iter([b"abc", b"def"])
+
+        mock_upload_response_obj = mock.Mock(spec=MockResponse)
+        mock_upload_response_obj.status_code = 204
+        mock_upload_response_obj.content = ''
+        mock_upload_response_obj.headers = {}
+
+        uploaded = []
+
+        def fake_put(req_resource, headers=None, **kwargs):
+            uploaded.append(b"".join(kwargs["data"]))
+            self.assertEqual(9, len(kwargs["data"]))
+            self.assertEqual(
+                "application/octet-stream", headers["Content-Type"])
+            return mock_upload_response_obj
+
+        mock_session = mock.Mock(name='mock_session', spec=["get", "put"])
+        mock_session.get.return_value = mock_download_response_obj
+        mock_session.put.side_effect = fake_put
+
+        mock_get_vim_info.return_value = MOCK_VIM_INFO
+        mock_get_session.return_value = mock_session
+        mock_get_token_cache.return_value = (
+            json.dumps(MOCK_AUTH_STATE),
+            json.dumps(MOCK_INTERNAL_METADATA_CATALOG))
+
+        url = "/api/multicloud-starlingx/v0/starlingx_RegionOne/image" \
+              "/v2/images/image-1/file"
+        with override_settings(PROXY_STREAMING={"image": 0}):
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertTrue(response.streaming)
+            self.assertEqual(b"abcdef", b"".join(response.streaming_content))
+            self.assertEqual("md5", response["Content-MD5"])
+            self.assertEqual("6", response["Content-Length"])
+            self.assertEqual("gzip", response["Content-Encoding"])
+            mock_download_response_obj.raw.stream.assert_called_once_with(
+                services.STREAM_CHUNK_SIZE, decode_content=False)
+            self.assertEqual(MOCK_TOKEN_ID, response['X-Subject-Token'])
+            self.assertTrue(mock_session.get.call_args[1]["stream"])
+            mock_download_response_obj.close.assert_called_once_with()
+
+            # the client went away before the body was sent
+            mock_download_response_obj.close.reset_mock()
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            response.close()
+            mock_download_response_obj.close.assert_called_once_with()
+
+            response = self.client.put(
+                url, data=b"imagedata",
+                content_type="application/octet-stream",
+                HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+            self.assertEqual([b"imagedata"], uploaded)
+
+    @mock.patch.object(VimDriverUtils, 'get_vim_info')
+    @mock.patch.object(VimDriverUtils, 'get_session')
+    @mock.patch.object(VimDriverUtils, 'get_token_cache')
+    def test_proxy_context_per_token(
+            self, mock_get_token_cache, mock_get_session, mock_get_vim_info):
+        mock_get_servers_response_obj = mock.Mock(spec=MockResponse)
+        mock_get_servers_response_obj.status_code = 200
+        mock_get_servers_response_obj.content = MOCK_GET_SERVERS_RESPONSE
+        mock_get_servers_response_obj.json.return_value = \
+            MOCK_GET_SERVERS_RESPONSE
+        mock_session = mock.Mock(name='mock_session', spec=["get"])
+        mock_session.get.return_value = mock_get_servers_response_obj
+
+        mock_get_vim_info.return_value = MOCK_VIM_INFO
+        mock_get_session.return_value = mock_session
+        mock_get_token_cache.return_value = (
+            json.dumps(MOCK_AUTH_STATE),
+            json.dumps(MOCK_INTERNAL_METADATA_CATALOG))
+
+        url = "/api/multicloud-starlingx/v0/starlingx_RegionOne/compute" \
+              "/v2.1/fcca3cc49d5e42caae15459e27103efc/servers"
+        for _ in range(2):
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+        # the token state is fetched once per request
+        self.assertEqual(2, mock_get_token_cache.call_count)
+        context = services._proxy_contexts.get(MOCK_TOKEN_ID)
+        self.assertIn("compute", context.metadata_catalog)
+
+        # the token expired
+        mock_get_token_cache.return_value = (None, None)
+        response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    @mock.patch.object(VimDriverUtils, 'get_vim_info')
+    @mock.patch.object(VimDriverUtils, 'get_session')
+    @mock.patch.object(VimDriverUtils, 'get_token_cache')
+    def test_response_cache(
+            self, mock_get_token_cache, mock_get_session, mock_get_vim_info):
+        mock_get_servers_response_obj = mock.Mock(spec=MockResponse)
+        mock_get_servers_response_obj.status_code = 200
+        mock_get_servers_response_obj.content = MOCK_GET_SERVERS_RESPONSE
+        mock_get_servers_response_obj.json.return_value = \
+            MOCK_GET_SERVERS_RESPONSE
+        mock_post_server_response_obj = mock.Mock(spec=MockResponse)
+        mock_post_server_response_obj.status_code = 202
+        mock_post_server_response_obj.content = MOCK_POST_SERVER_RESPONSE
+        mock_post_server_response_obj.json.return_value = \
+            MOCK_POST_SERVER_RESPONSE
+        mock_session = mock.Mock(name='mock_session', spec=["get", "post"])
+        mock_session.get.side_effect = \
+            lambda *args, **kwargs: copy.deepcopy(mock_get_servers_response_obj)
+        mock_session.post.return_value = mock_post_server_response_obj
+
+        mock_get_vim_info.return_value = MOCK_VIM_INFO
+        mock_get_session.return_value = mock_session
+        mock_get_token_cache.return_value = (
+            json.dumps(MOCK_AUTH_STATE),
+            json.dumps(MOCK_INTERNAL_METADATA_CATALOG))
+
+        url = "/api/multicloud-starlingx/v0/starlingx_RegionOne/compute" \
+              "/v2.1/fcca3cc49d5e42caae15459e27103efc/servers"
+        with override_settings(
+                PROXY_RESPONSE_CACHE={"compute": 60},
+                CACHES={'default': {'BACKEND':
+                    'django.core.cache.backends.locmem.LocMemCache'}}):
+            cache.clear()
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual("MISS", response["X-Multicloud-Cache"])
+            first = response.json()
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual("HIT", response["X-Multicloud-Cache"])
+            self.assertEqual(first, response.json())
+            self.assertEqual(1, mock_session.get.call_count)
+
+            # another query is another entry
+            response = self.client.get(
+                url + "?limit=1", HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual("MISS", response["X-Multicloud-Cache"])
+
+            # a write to the collection invalidates the cached responses
+            self.client.post(url, MOCK_POST_SERVER_REQUEST,
+                             HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            response = self.client.get(url, HTTP_X_AUTH_TOKEN=MOCK_TOKEN_ID)
+            self.assertEqual("MISS", response["X-Multicloud-Cache"])
+            self.assertEqual(3, mock_session.get.call_count)
+
+    def test_response_cache_invalidated_by_collection(self):
+        project = "fcca3cc49d5e42caae15459e27103efc"
+        with override_settings(CACHES={'default': {'BACKEND':
+                'django.core.cache.backends.locmem.LocMemCache'}}):
+            cache.clear()
+            keys = dict([(path, services._response_cache_key(
+                "starlingx_RegionOne", project, servicetype, path))
+                for servicetype, path in [
+                    ("network", "/v2.0/networks"),
+                    ("network", "/v2.0/ports?device_id=1"),
+                    ("compute", "/v2.1/%s/flavors/detail" % project),
+                    ("compute", "/v2.1/%s/servers" % project)]])
+
+            services._invalidate_responses(
+                "starlingx_RegionOne", "network", "/v2.0/ports")
+            services._invalidate_responses(
+                "starlingx_RegionOne", "compute",
+                "/v2.1/%s/servers/1/action" % project)
+
+            # the writes to ports and servers keep the other collections
+            for servicetype, path, changed in [
+                    ("network", "/v2.0/networks", False),
+                    ("network", "/v2.0/ports?device_id=1", True),
+                    ("compute", "/v2.1/%s/flavors/detail" % project, False),
+                    ("compute", "/v2.1/%s/servers" % project, True)]:
+                key = services._response_cache_key(
+                    "starlingx_RegionOne", project, servicetype, path)
+                self.assertEqual(changed, key != keys[path], path)
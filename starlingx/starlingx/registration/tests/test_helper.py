@@ -0,0 +1,143 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import threading
+import time
+import unittest
+
+from django.test.utils import override_settings
+
+from common.msapi import helper
+
+
+class TestAAIHelper(unittest.TestCase):
+
+    def test_update_resources(self):
+        aai_helper = helper.MultiCloudAAIHelper("multicloud", "aai")
+        def fake_update(cloud_owner, cloud_region_id, resource_id,
+                        resource_info, resource_type, snapshot=None):
+            if resource_id == "f2":
+                raise IOError("boom")
+            return 0, "ok"
+
+        with mock.patch.object(aai_helper, "_update_resoure",
+                               side_effect=fake_update):
+            results = aai_helper._update_resources(
+                "owner", "region", [("f1", {}, "flavor"), ("f2", {}, "flavor")])
+
+        self.assertEqual((0, "ok"), results[0])
+        self.assertEqual(11, results[1][0])
+
+
+class TestRegistryConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.aai_helper = helper.MultiCloudAAIHelper("multicloud", "aai")
+
+    def tearDown(self):
+        if helper._registry_executor:
+            helper._registry_executor.shutdown()
+        helper._registry_executor = None
+        helper._vim_slots = None
+
+    def test_fan_out_bounded(self):
+        inflight = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def slow_update(item):
+            with lock:
+                inflight["now"] += 1
+                inflight["max"] = max(inflight["max"], inflight["now"])
+            time.sleep(0.01)
+            with lock:
+                inflight["now"] -= 1
+            return item
+
+        helper._registry_executor = None
+        with override_settings(REGISTRY_AAI_CONCURRENCY=3):
+            results = self.aai_helper._fan_out(slow_update, range(12))
+
+        self.assertEqual(list(range(12)), results)
+        self.assertEqual(3, inflight["max"])
+
+    def test_fan_out_raises_once_done(self):
+        done = []
+
+        def update(item):
+            if item == 1:
+                raise IOError("boom")
+            done.append(item)
+
+        with self.assertRaises(IOError):
+            self.aai_helper._fan_out(update, range(4))
+        self.assertEqual([0, 2, 3], sorted(done))
+
+    def test_run_phases_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def phase(name):
+            # both phases must be running to pass the barrier
+            barrier.wait()
+            return 0, name
+
+        def failing_phase():
+            raise IOError("boom")
+
+        results = self.aai_helper._run_phases([
+            (phase, ("tenants",)), (phase, ("flavors",)),
+            (failing_phase, ())])
+
+        self.assertEqual((0, "tenants"), results[0])
+        self.assertEqual((0, "flavors"), results[1])
+        self.assertEqual(11, results[2][0])
+
+    def test_list_pages(self):
+        pages = {
+            "/v2/images": {"images": [{"id": "1"}, {"id": "2"}],
+                           "next": "/v2/images?marker=2"},
+            "/v2/images?marker=2": {"images": [{"id": "3"}],
+                                    "next": "/v2/images?marker=3"},
+            "/v2/images?marker=3": {"images": []},
+        }
+        prefetched = threading.Event()
+
+        def get_page(url):
+            if url != "/v2/images":
+                prefetched.set()
+            return pages[url]
+
+        iterator = self.aai_helper._iter_list_resources(
+            "/v2/images", "image", None, {"cloud_region_id": "RegionOne"},
+            "starlingx_RegionOne", "images", get_page)
+        self.assertEqual("1", next(iterator)["id"])
+        # the next page is prefetched
+        self.assertTrue(prefetched.wait(5))
+        self.assertEqual(["2", "3"], [image["id"] for image in iterator])
+
+    def test_list_pages_nova_links(self):
+        session = mock.Mock()
+        session.get.side_effect = [
+            mock.Mock(status_code=200, **{"json.return_value": {
+                "flavors": [{"id": "1"}],
+                "flavors_links": [{"rel": "next",
+                                   "href": "http://nova/flavors?marker=1"}]}}),
+            mock.Mock(status_code=500),
+        ]
+        self.assertIsNone(self.aai_helper._get_list_resources(
+            "/flavors/detail", "compute", session,
+            {"cloud_region_id": "RegionOne"}, "starlingx_RegionOne",
+            "flavors"))
+        self.assertEqual("http://nova/flavors?marker=1",
+                         session.get.call_args[0][0])
@@ -0,0 +1,209 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mock
+import unittest
+
+from django.test.utils import override_settings
+
+from common.msapi import helper
+from common.utils import aai_bulk
+from common.utils import restcall
+from newton_base.registration import registration
+
+VIMID = "starlingx_RegionOne"
+REGION_URL = ("/cloud-infrastructure/cloud-regions/cloud-region/"
+              "starlingx/RegionOne")
+
+CAPABILITY = {
+    "hpa-feature": "basicCapabilities",
+    "hpa-version": "v1",
+    "architecture": "generic",
+    "hpa-feature-attributes": [
+        {"hpa-attribute-key": "numVirtualCpu",
+         "hpa-attribute-value": '{"value": "2"}'},
+        {"hpa-attribute-key": "virtualMemSize",
+         "hpa-attribute-value": '{"value": "2048", "unit": "MB"}'},
+    ]
+}
+
+MOCK_CLOUD_REGION = {
+    "cloud-owner": "starlingx",
+    "cloud-region-id": "RegionOne",
+    "tenants": {"tenant": [
+        {"tenant-id": "1", "tenant-name": "admin",
+         "resource-version": "t1"},
+        {"tenant-id": "2", "tenant-name": "removed",
+         "resource-version": "t2"},
+        {"tenant-id": "3", "tenant-name": "in use",
+         "resource-version": "t3",
+         "vservers": {"vserver": [{"vserver-id": "vm1"}]}},
+    ]},
+    "flavors": {"flavor": [
+        {"flavor-id": "f1", "flavor-name": "onap.small",
+         "flavor-vcpus": 2, "resource-version": "f1",
+         "hpa-capabilities": {"hpa-capability": [
+             dict(CAPABILITY, **{"hpa-capability-id": "old",
+                                 "resource-version": "c1"})]}},
+    ]},
+    "availability-zones": {"availability-zone": [
+        {"availability-zone-name": "nova", "resource-version": "az1",
+         "relationship-list": {"relationship": [
+             {"related-to": "pserver", "related-link": "/pservers/h1"}]}},
+    ]},
+}
+
+
+class TestIncrementalRegistration(unittest.TestCase):
+
+    def setUp(self):
+        self.helper = registration.RegistryHelper("multicloud", "aai")
+        self.snapshot = helper.AAIRegionSnapshot(
+            json.loads(json.dumps(MOCK_CLOUD_REGION)))
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_get_region_snapshot(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = [
+            0, json.dumps(MOCK_CLOUD_REGION), "200"]
+        snapshot = self.helper._get_region_snapshot("starlingx", "RegionOne")
+        mock_req_to_aai.assert_called_once_with(
+            REGION_URL + "?depth=all", "GET", nocache=True)
+        self.assertEqual(3, len(snapshot.resources("tenant")))
+        self.assertEqual("admin",
+                         snapshot.get("tenant", "1")["tenant-name"])
+
+        with override_settings(REGISTRY_INCREMENTAL=False):
+            self.assertIsNone(
+                self.helper._get_region_snapshot("starlingx", "RegionOne"))
+        # fall back to the full registration
+        mock_req_to_aai.return_value = [1, "", "500"]
+        self.assertIsNone(
+            self.helper._get_region_snapshot("starlingx", "RegionOne"))
+
+    def test_stable_hpa_capability_ids(self):
+        capability = dict(CAPABILITY)
+        reordered = dict(CAPABILITY, **{"hpa-feature-attributes": list(
+            reversed(CAPABILITY["hpa-feature-attributes"]))})
+        changed = dict(CAPABILITY, **{"hpa-version": "v2"})
+        self.helper._stable_hpa_capability_ids(
+            "f1", [capability, reordered, changed])
+
+        self.assertEqual(capability["hpa-capability-id"],
+                         reordered["hpa-capability-id"])
+        self.assertNotEqual(capability["hpa-capability-id"],
+                            changed["hpa-capability-id"])
+        self.assertNotEqual(
+            capability["hpa-capability-id"],
+            self.helper._stable_hpa_capability_ids(
+                "f2", [dict(CAPABILITY)])[0]["hpa-capability-id"])
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_discover_tenants(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = [0, "", "200"]
+        tenants = [{"id": "1", "name": "admin"}, {"id": "4", "name": "new"}]
+        with mock.patch.object(self.helper, "_get_list_resources",
+                               return_value=tenants):
+            self.helper._discover_tenants(
+                VIMID, mock.Mock(), {}, self.snapshot)
+
+        calls = [(c[0][1], c[0][0]) for c in mock_req_to_aai.call_args_list]
+        # the unchanged tenant is not written, the tenant with vservers
+        # is not removed
+        self.assertNotIn(("PUT", REGION_URL + "/tenants/tenant/1"), calls)
+        self.assertIn(("PUT", REGION_URL + "/tenants/tenant/4"), calls)
+        self.assertIn(("DELETE", REGION_URL +
+                       "/tenants/tenant/2?resource-version=t2"), calls)
+        self.assertEqual(
+            1, len([c for c in calls if c[0] == "DELETE"]))
+
+    @mock.patch.object(restcall, "req_to_aai")
+    @mock.patch.object(aai_bulk, "AAIBulkWriter")
+    def test_delete_stale_availability_zone(self, mock_writer_class,
+                                            mock_req_to_aai):
+        mock_writer = mock_writer_class.return_value
+        mock_writer.failures.return_value = []
+        self.assertEqual(1, self.helper._delete_stale_resources(
+            "starlingx", "RegionOne", "availability-zone", [],
+            self.snapshot))
+
+        # the relationships are removed ahead of the az, by the same writer
+        az_url = REGION_URL + "/availability-zones/availability-zone/nova"
+        self.assertEqual([
+            mock.call(az_url + "/relationship-list/relationship",
+                      {"related-to": "pserver",
+                       "related-link": "/pservers/h1"}),
+            mock.call(az_url + "?resource-version=az1"),
+        ], mock_writer.delete.call_args_list)
+        mock_req_to_aai.assert_not_called()
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_put_flavor(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = [0, "", "200"]
+        capabilities = self.helper._stable_hpa_capability_ids(
+            "f1", [dict(CAPABILITY), dict(CAPABILITY, **{
+                "hpa-feature": "cpuPinning"})])
+        flavor_info = {
+            "flavor-id": "f1", "flavor-name": "onap.small",
+            "flavor-vcpus": 2,
+            "hpa-capabilities": {"hpa-capability": capabilities},
+        }
+        self.helper._put_flavor(
+            "starlingx", "RegionOne", flavor_info, self.snapshot)
+
+        flavor_url = REGION_URL + "/flavors/flavor/f1"
+        calls = [(c[0][1], c[0][0]) for c in mock_req_to_aai.call_args_list]
+        # the flavor itself is unchanged, the capability with the
+        # old id is replaced
+        self.assertEqual(sorted([
+            ("DELETE", flavor_url + "/hpa-capabilities/hpa-capability/"
+             "old?resource-version=c1"),
+            ("PUT", flavor_url + "/hpa-capabilities/hpa-capability/%s"
+             % capabilities[0]["hpa-capability-id"]),
+            ("PUT", flavor_url + "/hpa-capabilities/hpa-capability/%s"
+             % capabilities[1]["hpa-capability-id"]),
+        ]), sorted(calls))
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_update_resource_from_snapshot(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = [0, "", "200"]
+        self.helper._update_resoure(
+            "starlingx", "RegionOne", "1",
+            {"tenant-id": "1", "tenant-name": "renamed"}, "tenant",
+            self.snapshot)
+
+        # no GET before the PUT
+        mock_req_to_aai.assert_called_once_with(
+            REGION_URL + "/tenants/tenant/1", "PUT", content={
+                "tenant-id": "1", "tenant-name": "renamed",
+                "resource-version": "t1"})
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_update_resource_stale_snapshot(self, mock_req_to_aai):
+        mock_req_to_aai.side_effect = [
+            [1, "precondition failed", "412"],
+            [0, json.dumps({"tenant-id": "1", "tenant-name": "admin",
+                            "resource-version": "t9"}), "200"],
+            [0, "", "200"],
+        ]
+        retcode, _ = self.helper._update_resoure(
+            "starlingx", "RegionOne", "1",
+            {"tenant-id": "1", "tenant-name": "renamed"}, "tenant",
+            self.snapshot)
+
+        self.assertEqual(0, retcode)
+        mock_req_to_aai.assert_called_with(
+            REGION_URL + "/tenants/tenant/1", "PUT", content={
+                "tenant-id": "1", "tenant-name": "renamed",
+                "resource-version": "t9"})
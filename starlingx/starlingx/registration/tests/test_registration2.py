@@ -14,11 +14,17 @@
 
 # import mock
 
+import json
 import unittest
 from unittest import mock
+from keystoneauth1.exceptions import HttpError
+from django.core.cache import cache
 from django.test import Client
+from django.test.utils import override_settings
 from rest_framework import status
+from common.msapi import teardown
 from common.utils import restcall
+from newton_base.util import VimDriverUtils
 from starlingx_base.registration import registration
 from newton_base.tests import test_base
 
@@ -71,6 +77,19 @@ MOCK_GET_FLAVOR_EXTRASPECS_RESPONSE_w_hpa_numa = {
     "hw:numa_nodes": 2
 }
 
+MOCK_GET_IMAGE_RESPONSE = {
+    "images": [
+        {
+            "id": "1", "name": "cirros", "self": "/v2/images/1",
+            "os_distro": "cirros", "schema": "/v2/schemas/image"
+        },
+        {
+            "id": "2", "name": "ubuntu", "self": "/v2/images/2",
+            "schema": "/v2/schemas/image"
+        },
+    ]
+}
+
 
 class TestRegistration2(unittest.TestCase):
     def setUp(self):
@@ -114,3 +133,111 @@ class TestRegistration2(unittest.TestCase):
         )
 
         self.assertEqual(retcode, 11)
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_discover_flavors_extra_specs_cached(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = (0, {}, status.HTTP_200_OK)
+
+        def get(url, **kwargs):
+            if url.endswith("/os-extra_specs"):
+                return test_base.get_mock_response(
+                    {"extra_specs": MOCK_GET_FLAVOR_EXTRASPECS_RESPONSE_w_hpa_numa})
+            # the VIM does not embed the extra_specs
+            return test_base.get_mock_response(
+                MOCK_GET_FLAVOR_RESPONSE_w_hpa_numa)
+        mock_session = mock.Mock(spec=["get"])
+        mock_session.get.side_effect = get
+
+        with override_settings(CACHES={'default': {'BACKEND':
+                'django.core.cache.backends.locmem.LocMemCache'}}):
+            cache.clear()
+            # registration and resync
+            for _ in range(2):
+                retcode, content = \
+                    self.view.register_helper._discover_flavors(
+                        vimid="starlingx_RegionOne",
+                        session=mock_session, viminfo=MOCK_VIM_INFO)
+                self.assertEqual(0, retcode)
+
+        extra_specs_urls = [
+            c[0][0] for c in mock_session.get.call_args_list
+            if c[0][0].endswith("/os-extra_specs")]
+        self.assertEqual(["/flavors/1/os-extra_specs"], extra_specs_urls)
+
+    @mock.patch.object(VimDriverUtils, "get_auth_state")
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_discover_tenants_forbidden(self, mock_req_to_aai,
+                                        mock_get_auth_state):
+        mock_req_to_aai.return_value = (0, {}, status.HTTP_200_OK)
+        mock_get_auth_state.return_value = json.dumps({"body": {"token": {
+            "project": {"id": "t1", "name": "admin"}}}})
+        mock_session = test_base.get_mock_session(
+            ["get"], {
+                "side_effect": [HttpError(http_status=403)]
+            })
+
+        # the project of the token is populated instead
+        self.assertEqual(
+            (0, "succeed"), self.view.register_helper._discover_tenants(
+                vimid="starlingx_RegionOne",
+                session=mock_session, viminfo=MOCK_VIM_INFO))
+        puts = [c[0][0] for c in mock_req_to_aai.call_args_list
+                if c[0][1] == "PUT"]
+        self.assertEqual(1, len(puts))
+        self.assertTrue(puts[0].endswith("/tenants/tenant/t1"))
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_discover_images(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = (0, {}, status.HTTP_200_OK)
+        mock_session = test_base.get_mock_session(
+            ["get"], {
+                "side_effect": [
+                    test_base.get_mock_response(MOCK_GET_IMAGE_RESPONSE)
+                ]
+            })
+
+        retcode, content = self.view.register_helper._discover_images(
+            vimid="starlingx_RegionOne",
+            session=mock_session, viminfo=MOCK_VIM_INFO
+        )
+
+        self.assertEqual(retcode, 0)
+        # the list only, the image schema is not retrieved
+        self.assertEqual(1, mock_session.get.call_count)
+        puts = [c[0][0] for c in mock_req_to_aai.call_args_list
+                if c[0][1] == "PUT"]
+        self.assertEqual(2, len(puts))
+        self.assertTrue(puts[0].endswith("/images/image/1"))
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_populate_image(self, mock_req_to_aai):
+        image = MOCK_GET_IMAGE_RESPONSE["images"][0]
+        mock_req_to_aai.return_value = (0, {}, status.HTTP_200_OK)
+        self.assertEqual(0, self.view.register_helper._populate_image(
+            "starlingx_RegionOne", mock.Mock(), MOCK_VIM_INFO, image))
+
+        mock_req_to_aai.return_value = (1, "error", status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(1, self.view.register_helper._populate_image(
+            "starlingx_RegionOne", mock.Mock(), MOCK_VIM_INFO, image))
+
+    @mock.patch.object(teardown, "run")
+    @mock.patch.object(restcall, "req_to_aai")
+    @mock.patch.object(VimDriverUtils, "get_vim_info")
+    def test_unregistry_progress(self, mock_get_vim_info, mock_req_to_aai,
+                                 mock_run):
+        mock_get_vim_info.return_value = MOCK_VIM_INFO
+        mock_req_to_aai.return_value = (0, '{"resource-version": "1"}',
+                                        status.HTTP_200_OK)
+        partial = {"deleted": {"flavor": 1}, "failed": {}, "skipped": {}}
+        done = {"deleted": {"flavor": 2}, "failed": {}, "skipped": {}}
+
+        def fake_run(plan, fan_out, progress=None):
+            progress(partial)
+            return done
+        mock_run.side_effect = fake_run
+        progress = mock.Mock()
+
+        self.assertEqual((0, done), self.view.register_helper.unregistryV0(
+            "starlingx_RegionOne", progress))
+        # reported in the shape of the final status
+        progress.assert_called_once_with((1, partial))
@@ -0,0 +1,105 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import unittest
+
+from common.msapi import teardown
+from common.utils import aai_bulk
+from common.utils import restcall
+
+REGION_URL = ("/cloud-infrastructure/cloud-regions/cloud-region/"
+              "starlingx/RegionOne")
+
+MOCK_CLOUD_REGION = {
+    "cloud-owner": "starlingx",
+    "cloud-region-id": "RegionOne",
+    "resource-version": "r1",
+    "tenants": {"tenant": [
+        {"tenant-id": "t1", "resource-version": "t1",
+         "vservers": {"vserver": [
+             {"vserver-id": "vm1", "resource-version": "vm1",
+              "l-interfaces": {"l-interface": [
+                  {"interface-name": "eth0", "resource-version": "p1"}]}},
+         ]}},
+    ]},
+    "flavors": {"flavor": [
+        {"flavor-id": "f1", "resource-version": "f1",
+         "hpa-capabilities": {"hpa-capability": [
+             {"hpa-capability-id": "c1", "resource-version": "c1"}]}},
+    ]},
+    "images": {"image": [
+        {"image-id": "i1", "resource-version": "i1"},
+    ]},
+}
+
+
+def serial_fan_out(func, items):
+    return [func(item) for item in items]
+
+
+class TestTeardown(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = teardown.TeardownPlan(
+            "starlingx", "RegionOne", MOCK_CLOUD_REGION)
+
+    def test_plan_children_first(self):
+        self.assertEqual(
+            [["l-interface", "hpa-capability"], ["vserver"],
+             ["tenant", "flavor", "image"], ["cloud-region"]],
+            [[op["type"] for op in level] for level in self.plan.levels])
+        self.assertEqual(
+            REGION_URL + "/tenants/tenant/t1/vservers/vserver/vm1"
+            "?resource-version=vm1", self.plan.levels[1][0]["uri"])
+        self.assertEqual(
+            REGION_URL + "?resource-version=r1",
+            self.plan.levels[3][0]["uri"])
+
+    @mock.patch.object(aai_bulk, "_bulk_unsupported", True)
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_run(self, mock_req_to_aai):
+        mock_req_to_aai.return_value = [0, "", "204"]
+        progress = mock.Mock()
+        result = teardown.run(self.plan, serial_fan_out, progress)
+
+        self.assertEqual({}, result["failed"])
+        self.assertEqual(self.plan.totals(), result["deleted"])
+        self.assertEqual(4, progress.call_count)
+        self.assertEqual(
+            ("DELETE", REGION_URL + "?resource-version=r1"),
+            (mock_req_to_aai.call_args[0][1], mock_req_to_aai.call_args[0][0]))
+
+    @mock.patch.object(aai_bulk, "_bulk_unsupported", True)
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_run_keeps_parents_of_failed(self, mock_req_to_aai):
+        def fake_req_to_aai(resource, method, **kwargs):
+            if "/vservers/vserver/vm1?" in resource:
+                return [1, "in use", "412"]
+            if "/images/image/i1" in resource:
+                # removed by a previous run
+                return [1, "not found", "404"]
+            return [0, "", "204"]
+        mock_req_to_aai.side_effect = fake_req_to_aai
+
+        result = teardown.run(self.plan, serial_fan_out)
+
+        self.assertEqual({"vserver": 1}, result["failed"])
+        self.assertEqual({"tenant": 1, "cloud-region": 1}, result["skipped"])
+        self.assertEqual(1, result["deleted"]["image"])
+        deleted = [c[0][0] for c in mock_req_to_aai.call_args_list]
+        self.assertNotIn(
+            REGION_URL + "/tenants/tenant/t1?resource-version=t1", deleted)
+        self.assertIn(
+            REGION_URL + "/flavors/flavor/f1?resource-version=f1", deleted)
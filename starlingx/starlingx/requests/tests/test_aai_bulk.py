@@ -0,0 +1,96 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mock
+import unittest
+
+from common.utils import aai_bulk
+from common.utils import restcall
+
+VSERVER_URI = "/cloud-infrastructure/cloud-regions/cloud-region/" \
+              "owner/region/tenants/tenant/t1/vservers/vserver/%s"
+
+
+class TestAAIBulkWriter(unittest.TestCase):
+
+    def setUp(self):
+        aai_bulk._bulk_unsupported = False
+
+    def tearDown(self):
+        aai_bulk._bulk_unsupported = False
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_batches_in_order(self, mock_req_to_aai):
+        def fake_bulk(resource, method, content='', appid=None):
+            ops = content["operations"]
+            return 0, json.dumps({"operation-responses": [
+                {"action": op["action"], "uri": op["uri"],
+                 "response-status-code": 201} for op in ops]}), "201"
+        mock_req_to_aai.side_effect = fake_bulk
+
+        writer = aai_bulk.AAIBulkWriter(batch_size=4)
+        for i in range(10):
+            writer.put(VSERVER_URI % i, {"vserver-id": str(i)})
+        writer.flush()
+
+        self.assertEqual(3, mock_req_to_aai.call_count)
+        self.assertEqual(3, writer.round_trips)
+        self.assertEqual(
+            [VSERVER_URI % i for i in range(10)],
+            [r[0]["uri"] for r in writer.results])
+        self.assertEqual([], writer.failures())
+        self.assertEqual(
+            aai_bulk.AAI_BULK_SINGLE_TRANSACTION,
+            mock_req_to_aai.call_args_list[0][0][0])
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_fallback_on_failed_transaction(self, mock_req_to_aai):
+        def fake_req(resource, method, content='', appid=None):
+            if resource == aai_bulk.AAI_BULK_SINGLE_TRANSACTION:
+                return 1, "conflict", "412"
+            if "/vserver/1?" in resource:
+                return 1, "not found", "404"
+            return 0, "", "200"
+        mock_req_to_aai.side_effect = fake_req
+
+        with aai_bulk.AAIBulkWriter(batch_size=10) as writer:
+            for i in range(3):
+                writer.delete(VSERVER_URI % i + "?resource-version=1")
+
+        # 1 failed transaction + 3 individual calls
+        self.assertEqual(4, mock_req_to_aai.call_count)
+        self.assertEqual(
+            "DELETE", mock_req_to_aai.call_args_list[1][0][1])
+        failures = writer.failures()
+        self.assertEqual(1, len(failures))
+        self.assertEqual("404", failures[0][3])
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_bulk_api_not_available(self, mock_req_to_aai):
+        def fake_req(resource, method, content='', appid=None):
+            if resource == aai_bulk.AAI_BULK_SINGLE_TRANSACTION:
+                return 1, "", "404"
+            return 0, "", "200"
+        mock_req_to_aai.side_effect = fake_req
+
+        writer = aai_bulk.AAIBulkWriter(batch_size=2)
+        for i in range(4):
+            writer.put(VSERVER_URI % i, {})
+        writer.flush()
+
+        # the second batch goes for individual calls directly
+        self.assertEqual(5, mock_req_to_aai.call_count)
+        self.assertTrue(aai_bulk._bulk_unsupported)
+        self.assertEqual(4, len(writer.results))
@@ -0,0 +1,162 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from common.utils import aai_cache
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CLOUD_REGION_URL = \
+    "/cloud-infrastructure/cloud-regions/cloud-region/owner/region"
+FLAVOR_URL = CLOUD_REGION_URL + "/flavors/flavor/f1"
+
+
+class TestAAICache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(CACHES=LOCMEM_CACHES)
+        self.cache_settings.enable()
+        cache.clear()
+        aai_cache._local_tier.clear()
+
+    def tearDown(self):
+        self.cache_settings.disable()
+
+    def test_set_and_get(self):
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+        self.assertEqual(
+            [0, "flavor", "200"], aai_cache.get_cache_by_url(FLAVOR_URL))
+        # no global key list any more
+        self.assertIsNone(cache.get("AAIKeys"))
+
+    def test_flush_subtree(self):
+        aai_cache.set_cache_by_url(CLOUD_REGION_URL, [0, "region", "200"])
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+        other_region_url = CLOUD_REGION_URL + "2"
+        aai_cache.set_cache_by_url(other_region_url, [0, "region2", "200"])
+
+        aai_cache.flush_cache_by_url(CLOUD_REGION_URL + "?resource-version=1")
+
+        self.assertIsNone(aai_cache.get_cache_by_url(CLOUD_REGION_URL))
+        self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+        # sibling sharing the same string prefix is not affected
+        self.assertEqual(
+            [0, "region2", "200"],
+            aai_cache.get_cache_by_url(other_region_url))
+
+    def test_flush_child_invalidates_parent_depth_query(self):
+        rules = [{"pattern": r"cloud-infrastructure/cloud-regions",
+                  "query": ["depth"]}]
+        deep_url = CLOUD_REGION_URL + "?depth=all"
+        with override_settings(AAI_CACHE_RULES=rules):
+            aai_cache.set_cache_by_url(CLOUD_REGION_URL, [0, "region", "200"])
+            aai_cache.set_cache_by_url(deep_url, [0, "deep", "200"])
+            aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+
+            aai_cache.flush_cache_by_url(FLAVOR_URL)
+
+            self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+            # the depth query holds the flavor, the region alone does not
+            self.assertIsNone(aai_cache.get_cache_by_url(deep_url))
+            self.assertEqual(
+                [0, "region", "200"],
+                aai_cache.get_cache_by_url(CLOUD_REGION_URL))
+
+    def test_stale_key_not_stored_after_flush(self):
+        # key composed before the resource was retrieved from AAI
+        cache_key = aai_cache.cache_key_by_url(FLAVOR_URL)
+        aai_cache.flush_cache_by_url(FLAVOR_URL)
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "old", "200"], cache_key)
+
+        self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+
+    def test_not_cacheable(self):
+        self.assertIsNone(
+            aai_cache.cache_key_by_url(CLOUD_REGION_URL + "?depth=all"))
+        self.assertIsNone(
+            aai_cache.cache_key_by_url("/cloud-infrastructure/pservers"))
+
+    def test_local_tier_hit(self):
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+        cache_key = aai_cache.cache_key_by_url(FLAVOR_URL)
+        # the entry is served from the process without fetching it again
+        cache.delete(cache_key)
+        value = aai_cache.get_cache_by_url(FLAVOR_URL)
+        self.assertEqual([0, "flavor", "200"], value)
+        # callers get a copy
+        value[1] = "altered"
+        self.assertEqual(
+            [0, "flavor", "200"], aai_cache.get_cache_by_url(FLAVOR_URL))
+
+    def test_local_tier_filled_from_memcached(self):
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+        aai_cache._local_tier.clear()
+        self.assertEqual(
+            [0, "flavor", "200"], aai_cache.get_cache_by_url(FLAVOR_URL))
+        self.assertEqual(1, len(aai_cache._local_tier))
+
+    def test_local_tier_invalidated_by_other_worker(self):
+        aai_cache.set_cache_by_url(FLAVOR_URL, [0, "flavor", "200"])
+        # another worker bumps the generation in the shared cache
+        genkey = aai_cache._generation_key(CLOUD_REGION_URL)
+        cache.incr(genkey)
+        self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+
+    def test_default_rules(self):
+        self.assertTrue(aai_cache.filter_cache_by_url(FLAVOR_URL))
+        self.assertFalse(
+            aai_cache.filter_cache_by_url(FLAVOR_URL + "?depth=all"))
+        # a 404 is not cached by default
+        aai_cache.set_cache_by_url(FLAVOR_URL, [1, "not found", "404"])
+        self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+
+    def test_rules_from_settings(self):
+        rules = [
+            {"pattern": r"/pservers/", "ttl": 0},
+            {"pattern": r"^/cloud-infrastructure/", "ttl": 60,
+             "query": ["depth"], "negative_ttl": 30},
+        ]
+        with override_settings(AAI_CACHE_RULES=rules):
+            self.assertIsNone(aai_cache.cache_key_by_url(
+                "/cloud-infrastructure/pservers/pserver/p1"))
+            self.assertIsNone(aai_cache.cache_key_by_url(
+                FLAVOR_URL + "?depth=all&nodes-only"))
+
+            # query parameters are normalized
+            self.assertEqual(
+                aai_cache.cache_key_by_url(FLAVOR_URL + "?depth=all&"),
+                aai_cache.cache_key_by_url(FLAVOR_URL + "?depth=all"))
+            aai_cache.set_cache_by_url(
+                FLAVOR_URL + "?depth=all", [0, "flavor", "200"])
+            self.assertEqual(
+                [0, "flavor", "200"],
+                aai_cache.get_cache_by_url(FLAVOR_URL + "?depth=all"))
+
+            # negative caching, flushed as any other entry
+            aai_cache.set_cache_by_url(FLAVOR_URL, [1, "not found", "404"])
+            self.assertEqual(
+                [1, "not found", "404"],
+                aai_cache.get_cache_by_url(FLAVOR_URL))
+            aai_cache.flush_cache_by_url(FLAVOR_URL)
+            self.assertIsNone(aai_cache.get_cache_by_url(FLAVOR_URL))
+            self.assertIsNone(aai_cache.get_cache_by_url(
+                FLAVOR_URL + "?depth=all"))
@@ -0,0 +1,152 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import threading
+import unittest
+
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.test.utils import override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from common.utils import bulkhead
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+VIMID = "starlingx_RegionOne"
+
+
+class StreamingView(bulkhead.VimBulkheadMixin, APIView):
+    def get(self, request, vimid=""):
+        return StreamingHttpResponse(iter([b"chunk"]))
+
+
+class TestBulkhead(unittest.TestCase):
+
+    def setUp(self):
+        self.bulkhead_settings = override_settings(
+            CACHES=LOCMEM_CACHES, PROXY_VIM_MAX_INFLIGHT=1,
+            PROXY_VIM_QUEUE_TIMEOUT=0.1)
+        self.bulkhead_settings.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.bulkhead_settings.disable()
+
+    def test_admit_and_release(self):
+        lease = bulkhead.admit(VIMID)
+        self.assertEqual(1, bulkhead.get_gauges(VIMID)["inflight"])
+        with self.assertRaises(bulkhead.VimSaturated) as ctx:
+            bulkhead.admit(VIMID)
+        self.assertEqual(1, ctx.exception.wait)
+        self.assertEqual(0, bulkhead.get_gauges(VIMID)["queued"])
+
+        # other VIMs are not affected
+        bulkhead.admit("starlingx_RegionTwo").release()
+
+        lease.release()
+        self.assertEqual(0, bulkhead.get_gauges(VIMID)["inflight"])
+        bulkhead.admit(VIMID).release()
+
+    def test_release_after_counter_expired(self):
+        lease = bulkhead.admit(VIMID)
+        # the counter expired, then was created by another request
+        cache.delete(lease.inflight_key)
+        other = bulkhead.admit(VIMID)
+        lease.release()
+        other.release()
+        # not below 0, which would let in more requests than the slots
+        self.assertEqual(0, cache.get(bulkhead._key(VIMID, "inflight")))
+        bulkhead.admit(VIMID)
+        self.assertRaises(bulkhead.VimSaturated, bulkhead.admit, VIMID)
+
+    def test_disabled(self):
+        with override_settings(PROXY_VIM_MAX_INFLIGHT=0):
+            bulkhead.admit(VIMID)
+            bulkhead.admit(VIMID)
+            self.assertEqual(0, bulkhead.get_gauges(VIMID)["inflight"])
+
+    def test_saturated_vim_rejected(self):
+        lease = bulkhead.admit(VIMID)
+        try:
+            response = APIClient().get(
+                "/api/multicloud-starlingx/v0/%s/identity/v3" % VIMID)
+        finally:
+            lease.release()
+        self.assertEqual(
+            status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+        self.assertEqual("1", response["Retry-After"])
+
+    def test_counter_expired_while_cache_reachable(self):
+        # a counter expired after the add is not a cache outage
+        with mock.patch.object(cache, "incr", side_effect=ValueError):
+            self.assertFalse(bulkhead._try_slot(
+                bulkhead._key(VIMID, "inflight"), 1, 10))
+
+    def test_cache_not_reachable(self):
+        with mock.patch.object(bulkhead, "cache") as mock_cache:
+            mock_cache.add.return_value = False
+            mock_cache.incr.side_effect = ValueError
+            mock_cache.get.return_value = None
+            self.assertIsNone(bulkhead._try_slot(
+                bulkhead._key(VIMID, "inflight"), 1, 10))
+            self.assertIsNone(bulkhead.admit(VIMID).inflight_key)
+
+    def test_slot_kept_when_dequeue_fails(self):
+        lease = bulkhead.admit(VIMID)
+        threading.Timer(0.02, lease.release).start()
+        queued_key = bulkhead._key(VIMID, "queued")
+        decr = cache.decr
+
+        def fake_decr(key, *args, **kwargs):
+            if key == queued_key:
+                raise ValueError(key)
+            return decr(key, *args, **kwargs)
+        with override_settings(PROXY_VIM_QUEUE_TIMEOUT=2), \
+                mock.patch.object(cache, "decr", side_effect=fake_decr):
+            queued_lease = bulkhead.admit(VIMID)
+        self.assertTrue(queued_lease.inflight_key)
+        self.assertEqual(1, bulkhead.get_gauges(VIMID)["inflight"])
+        queued_lease.release()
+
+    def test_gauges_endpoint(self):
+        lease = bulkhead.admit(VIMID)
+        try:
+            response = APIClient().get(
+                "/api/multicloud-starlingx/v0/%s/bulkhead" % VIMID)
+            responseV1 = APIClient().get(
+                "/api/multicloud-starlingx/v1/starlingx/RegionOne/bulkhead/")
+        finally:
+            lease.release()
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, response.data["inflight"])
+        self.assertEqual(0, response.data["queued"])
+        self.assertEqual(response.data, responseV1.data)
+
+    def test_streamed_response_holds_slot(self):
+        response = StreamingView.as_view()(
+            APIRequestFactory().get("/"), vimid=VIMID)
+        # held while the body is sent
+        self.assertEqual(1, bulkhead.get_gauges(VIMID)["inflight"])
+        self.assertEqual(b"chunk", b"".join(response.streaming_content))
+        response.close()
+        self.assertEqual(0, bulkhead.get_gauges(VIMID)["inflight"])
@@ -0,0 +1,113 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mock
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from common.exceptions import VimDriverNewtonException
+from common.msapi import extsys
+from common.utils import aai_cache
+from common.utils import restcall
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+VIMID = "owner_region"
+
+CLOUD_REGION = {
+    "cloud-owner": "owner",
+    "cloud-region-id": "region",
+    "cloud-type": "openstack",
+    "cloud-region-version": "titanium_cloud",
+    "resource-version": "1",
+    "cloud-extra-info": json.dumps({"openstack-region-id": "RegionOne"}),
+}
+
+ESR_SYSTEM_INFO_LIST = {
+    "esr-system-info": [{
+        "user-name": "admin",
+        "password": "secret",
+        "service-url": "http://keystone:5000/v3",
+        "default-tenant": "admin",
+    }]
+}
+
+
+def fake_req_to_aai(resource, method, content='', appid=None,
+                    nocache=False):
+    if resource.endswith("/esr-system-info-list"):
+        return 0, json.dumps(ESR_SYSTEM_INFO_LIST), "200"
+    return 0, json.dumps(CLOUD_REGION), "200"
+
+
+class TestGetVimById(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(CACHES=LOCMEM_CACHES)
+        self.cache_settings.enable()
+        cache.clear()
+        aai_cache._local_tier.clear()
+        extsys._viminfo_cache.clear()
+
+    def tearDown(self):
+        self.cache_settings.disable()
+        extsys._viminfo_cache.clear()
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_assembled_viminfo_cached(self, mock_req_to_aai):
+        mock_req_to_aai.side_effect = fake_req_to_aai
+
+        viminfo = extsys.get_vim_by_id(VIMID)
+        self.assertEqual("admin", viminfo["userName"])
+        self.assertEqual(
+            "RegionOne", viminfo["cloud_extra_info_json"]["openstack-region-id"])
+        self.assertEqual(2, mock_req_to_aai.call_count)
+
+        # callers can not alter the cached entry
+        viminfo["userName"] = "altered"
+        self.assertEqual("admin", extsys.get_vim_by_id(VIMID)["userName"])
+        self.assertEqual(2, mock_req_to_aai.call_count)
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_invalidated_by_aai_write(self, mock_req_to_aai):
+        mock_req_to_aai.side_effect = fake_req_to_aai
+        extsys.get_vim_by_id(VIMID)
+
+        # a write from any worker bumps the generation of the cloud region
+        aai_cache.flush_cache_by_url(extsys.CLOUD_REGION_URL % ("owner", "region"))
+        extsys.get_vim_by_id(VIMID)
+        self.assertEqual(4, mock_req_to_aai.call_count)
+
+        extsys.flush_vim_by_id(VIMID)
+        extsys.get_vim_by_id(VIMID)
+        self.assertEqual(6, mock_req_to_aai.call_count)
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_esr_info_not_found(self, mock_req_to_aai):
+        def fake_req(resource, method, content='', appid=None, nocache=False):
+            if resource.endswith("/esr-system-info-list"):
+                return 1, "not found", "404"
+            return 0, json.dumps(CLOUD_REGION), "200"
+        mock_req_to_aai.side_effect = fake_req
+
+        self.assertRaises(
+            VimDriverNewtonException, extsys.get_vim_by_id, VIMID)
+        self.assertEqual(0, len(extsys._viminfo_cache))
@@ -0,0 +1,97 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+from keystoneauth1.exceptions import HttpError
+
+from newton_base import flavor_specs
+from newton_base.tests import test_base
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+VIMID = "starlingx_RegionOne"
+SERVICE = {'service_type': 'compute', 'interface': 'public'}
+
+MOCK_FLAVORS = {"flavors": [{"id": "1"}, {"id": "2"}]}
+MOCK_FLAVORS_W_SPECS = {"flavors": [
+    {"id": "1", "extra_specs": {"hw:cpu_policy": "dedicated"}},
+    {"id": "2", "extra_specs": {}},
+]}
+
+
+class TestFlavorSpecsLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(CACHES=LOCMEM_CACHES)
+        self.cache_settings.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.cache_settings.disable()
+
+    def _loader(self, responses):
+        self.session = mock.Mock()
+        self.session.get.side_effect = responses
+        return flavor_specs.FlavorSpecsLoader(
+            self.session, VIMID, SERVICE, "http://vim:5000/v3")
+
+    def test_embedded_extra_specs(self):
+        loader = self._loader(
+            [test_base.get_mock_response(MOCK_FLAVORS_W_SPECS)])
+        flavors = loader.load_extra_specs(
+            loader.get_flavors().json()["flavors"])
+
+        self.assertEqual("dedicated",
+                         flavors[0]["extra_specs"]["hw:cpu_policy"])
+        self.session.get.assert_called_once_with(
+            "/flavors/detail", endpoint_filter=SERVICE,
+            microversion=flavor_specs.EXTRA_SPECS_MICROVERSION)
+
+    def test_microversion_not_supported(self):
+        loader = self._loader([
+            HttpError(http_status=406),
+            test_base.get_mock_response(MOCK_FLAVORS),
+            test_base.get_mock_response(MOCK_FLAVORS),
+        ])
+        self.assertEqual(MOCK_FLAVORS, loader.get_flavors().json())
+        # not tried again
+        loader.get_flavors()
+        self.assertNotIn(
+            "microversion", self.session.get.call_args_list[2][1])
+
+    def test_load_extra_specs_cached(self):
+        specs = {"1": {"hw:numa_nodes": "2"}, "2": {}}
+        fetch = mock.Mock(side_effect=lambda flavorid: specs[flavorid])
+        loader = flavor_specs.FlavorSpecsLoader(
+            mock.Mock(), VIMID, SERVICE, "http://vim:5000/v3", fetch=fetch)
+
+        flavors = loader.load_extra_specs([{"id": "1"}, {"id": "2"}])
+        self.assertEqual(specs["1"], flavors[0]["extra_specs"])
+        self.assertEqual(2, fetch.call_count)
+
+        loader.load_extra_specs([{"id": "1"}, {"id": "2"}])
+        self.assertEqual(2, fetch.call_count)
+
+        # an updated flavor is fetched again
+        flavor_specs.invalidate(VIMID, "1")
+        loader.load_extra_specs([{"id": "1"}, {"id": "2"}])
+        self.assertEqual(3, fetch.call_count)
@@ -0,0 +1,125 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import unittest
+
+import requests
+from django.test.utils import override_settings
+
+from common.utils import conn_pool
+from common.utils import resilience
+from common.utils import restcall
+
+VIM_URL = "http://vim:5000/v3"
+
+
+class TestResilience(unittest.TestCase):
+
+    def setUp(self):
+        resilience.reset_breakers()
+        self.sleep = mock.patch.object(resilience.time, "sleep")
+        self.sleep.start()
+
+    def tearDown(self):
+        self.sleep.stop()
+        resilience.reset_breakers()
+
+    def test_retry_idempotent_only(self):
+        send = mock.Mock(return_value=(503, "unavailable"))
+        self.assertEqual(
+            "unavailable", resilience.call(VIM_URL, "GET", send))
+        self.assertEqual(3, send.call_count)
+
+        send.reset_mock()
+        resilience.call(VIM_URL, "POST", send)
+        self.assertEqual(1, send.call_count)
+
+        # the request was not sent, safe to send it again
+        resilience.reset_breakers()
+        send.reset_mock()
+        send.side_effect = [ConnectionRefusedError(), (201, "created")]
+        self.assertEqual("created", resilience.call(VIM_URL, "POST", send))
+
+    def test_not_replayable(self):
+        send = mock.Mock(side_effect=IOError("connection reset"))
+        with self.assertRaises(IOError):
+            resilience.call(VIM_URL, "PUT", send, replayable=False)
+        self.assertEqual(1, send.call_count)
+
+    def test_circuit_breaker(self):
+        send = mock.Mock(side_effect=IOError("connection reset"))
+        with override_settings(CIRCUIT_BREAKER_THRESHOLD=2,
+                               OUTBOUND_RETRY_ATTEMPTS=1):
+            for _ in range(2):
+                with self.assertRaises(IOError):
+                    resilience.call(VIM_URL, "GET", send)
+            with self.assertRaises(resilience.CircuitOpen):
+                resilience.call(VIM_URL + "/auth/tokens", "GET", send)
+            self.assertEqual(2, send.call_count)
+            # other endpoints are not affected
+            resilience.call("http://vim2:5000/v3", "GET",
+                            mock.Mock(return_value=(200, "ok")))
+
+            breaker = resilience.get_breaker(VIM_URL)
+            self.assertEqual(breaker.OPEN, breaker.state)
+            stats = resilience.get_breaker_stats()["http://vim:5000"]
+            self.assertEqual(1, stats["rejected"])
+
+            # half open: a single probe, closing the circuit on success
+            breaker._opened_at -= breaker.reset_timeout
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record(True)
+            self.assertEqual(breaker.CLOSED, breaker.state)
+
+            # a failed probe opens the circuit again
+            breaker.record(False)
+            breaker.record(False)
+            breaker._opened_at -= breaker.reset_timeout
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+            self.assertEqual(breaker.OPEN, breaker.state)
+
+    @mock.patch.object(conn_pool.HttpConnectionPool, "_new_http")
+    def test_call_req_circuit_open(self, mock_new_http):
+        mock_http = mock.Mock()
+        mock_http.request.side_effect = IOError("connection reset")
+        mock_new_http.return_value = mock_http
+        pool = conn_pool.HttpConnectionPool()
+
+        with override_settings(CIRCUIT_BREAKER_THRESHOLD=3), \
+                mock.patch.object(conn_pool, "get_pool", return_value=pool):
+            ret = restcall.req_to_vim("http://vim:5000/", "/v3", "GET")
+            self.assertEqual(3, ret[0])
+            ret = restcall.req_to_vim("http://vim:5000/", "/v3", "GET")
+
+        self.assertEqual(2, ret[0])
+        self.assertEqual("503", ret[2])
+        self.assertEqual(3, mock_http.request.call_count)
+        self.assertEqual(
+            "open", restcall.get_breaker_stats()["http://vim:5000"]["state"])
+
+    @mock.patch.object(requests.Session, "request")
+    def test_resilient_session(self, mock_request):
+        mock_request.side_effect = [
+            mock.Mock(status_code=502), mock.Mock(status_code=200)]
+        sess = resilience.ResilientSession()
+        resp = sess.request("GET", VIM_URL)
+        self.assertEqual(200, resp.status_code)
+
+        # a stream body can not be sent twice
+        mock_request.side_effect = [mock.Mock(status_code=502)]
+        resp = sess.request("PUT", VIM_URL, data=iter([b"chunk"]))
+        self.assertEqual(502, resp.status_code)
@@ -0,0 +1,209 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import mock
+import threading
+import time
+import unittest
+
+from django.test.utils import override_settings
+
+from common.utils import conn_pool
+from common.utils import resilience
+from common.utils import restcall
+from common.utils import restcall_async
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = conn_pool.HttpConnectionPool(
+            max_per_host=2, idle_timeout=60, acquire_timeout=0)
+
+    def tearDown(self):
+        self.pool.clear()
+
+    def test_make_key(self):
+        key1 = self.pool.make_key("https://aai.onap:8443/aai/v13/x")
+        key2 = self.pool.make_key("https://AAI.onap:8443/aai/v13/y")
+        key3 = self.pool.make_key(
+            "https://aai.onap:8443/aai/v13/x",
+            disable_ssl_certificate_validation=True)
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+        self.assertEqual(
+            ("http", "msb", 80, None), self.pool.make_key("http://msb/api"))
+
+    def test_reuse_released_http(self):
+        key = self.pool.make_key("http://msb:80/api")
+        http1, pooled = self.pool.acquire(key)
+        self.assertTrue(pooled)
+        self.pool.release(key, http1, pooled)
+
+        http2, pooled = self.pool.acquire(key)
+        self.assertIs(http1, http2)
+        stats = self.pool.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["inuse"])
+
+    def test_discard_and_overflow(self):
+        key = self.pool.make_key("http://msb:80/api")
+        http1, _ = self.pool.acquire(key)
+        http2, _ = self.pool.acquire(key)
+        # all slots are busy
+        http3, pooled = self.pool.acquire(key)
+        self.assertFalse(pooled)
+        self.pool.release(key, http3, pooled)
+        self.pool.release(key, http1, True, discard=True)
+        self.pool.release(key, http2, True)
+
+        stats = self.pool.stats()
+        self.assertEqual(1, stats["overflows"])
+        self.assertEqual(1, stats["discards"])
+        self.assertEqual(1, stats["idle"])
+        self.assertEqual(0, stats["inuse"])
+
+    def test_evict_idle(self):
+        key = self.pool.make_key("http://msb:80/api")
+        http1, pooled = self.pool.acquire(key)
+        self.pool.release(key, http1, pooled)
+        self.pool.idle_timeout = -1
+
+        http2, pooled = self.pool.acquire(key)
+        self.assertIsNot(http1, http2)
+        self.assertEqual(1, self.pool.stats()["evictions"])
+
+
+class TestRestCall(unittest.TestCase):
+
+    def setUp(self):
+        resilience.reset_breakers()
+
+    @mock.patch.object(conn_pool.HttpConnectionPool, "_new_http")
+    def test_call_req_reuses_connection(self, mock_new_http):
+        mock_http = mock.Mock()
+        mock_http.request.return_value = ({"status": "200"}, b'{"a": 1}')
+        mock_new_http.return_value = mock_http
+        pool = conn_pool.HttpConnectionPool()
+
+        with mock.patch.object(conn_pool, "get_pool", return_value=pool):
+            for _ in range(3):
+                ret = restcall.req_to_vim(
+                    "http://vim:5000/", "/v3", "GET")
+                self.assertEqual([0, '{"a": 1}', "200"], ret)
+
+        self.assertEqual(1, mock_new_http.call_count)
+        self.assertEqual(2, pool.stats()["hits"])
+
+    @mock.patch.object(conn_pool.HttpConnectionPool, "_new_http")
+    def test_call_req_discards_broken_connection(self, mock_new_http):
+        mock_http = mock.Mock()
+        mock_http.request.side_effect = IOError("connection reset")
+        mock_new_http.return_value = mock_http
+        pool = conn_pool.HttpConnectionPool()
+
+        with mock.patch.object(conn_pool, "get_pool", return_value=pool):
+            ret = restcall.req_to_vim("http://vim:5000/", "/v3", "GET")
+
+        self.assertEqual(3, ret[0])
+        # retried, each broken connection is discarded
+        self.assertEqual(restcall.MAX_RETRY_TIME, pool.stats()["discards"])
+        self.assertEqual(0, pool.stats()["idle"])
+
+
+class TestRestCallAsync(unittest.TestCase):
+
+    @mock.patch.object(restcall, "req_to_aai")
+    def test_run_batch_keeps_order(self, mock_req_to_aai):
+        mock_req_to_aai.side_effect = \
+            lambda resource, method, **kwargs: [0, resource, "200"]
+
+        results = restcall_async.run_batch([
+            (restcall_async.req_to_aai_async, ("/r%s" % i, "GET"))
+            for i in range(20)])
+
+        self.assertEqual(
+            ["/r%s" % i for i in range(20)], [r[1] for r in results])
+
+    @mock.patch.object(restcall, "req_to_vim")
+    def test_run_batch_returns_exceptions(self, mock_req_to_vim):
+        def fake_req_to_vim(base_url, resource, method, **kwargs):
+            if resource == "/bad":
+                raise IOError("boom")
+            return [0, "{}", "200"]
+        mock_req_to_vim.side_effect = fake_req_to_vim
+
+        results = restcall_async.run_batch([
+            (restcall_async.req_to_vim_async,
+             ("http://vim:5000", "/v3", "GET")),
+            (restcall_async.req_to_vim_async,
+             ("http://vim:5000", "/bad", "GET")),
+        ])
+
+        self.assertEqual([0, "{}", "200"], results[0])
+        self.assertIsInstance(results[1], IOError)
+
+    def test_concurrency_bounded_per_target(self):
+        inflight = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def slow_call():
+            with lock:
+                inflight["now"] += 1
+                inflight["max"] = max(inflight["max"], inflight["now"])
+            time.sleep(0.01)
+            with lock:
+                inflight["now"] -= 1
+
+        with override_settings(REST_ASYNC_MAX_PER_TARGET=2):
+            restcall_async.run_batch([
+                (restcall_async.call_async, ("http://vim:5000", slow_call))
+                for _ in range(8)])
+
+        self.assertEqual(2, inflight["max"])
+
+    def test_concurrency_bounded_across_batches(self):
+        inflight = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def slow_call():
+            with lock:
+                inflight["now"] += 1
+                inflight["max"] = max(inflight["max"], inflight["now"])
+            time.sleep(0.01)
+            with lock:
+                inflight["now"] -= 1
+
+        def batch():
+            restcall_async.run_batch([
+                (restcall_async.call_async, ("http://vim:5000", slow_call))
+                for _ in range(6)])
+
+        # batches of several threads, each in its own event loop
+        with override_settings(REST_ASYNC_MAX_PER_TARGET=2):
+            threads = [threading.Thread(target=batch) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(2, inflight["max"])
+
+    def test_run_sync_inside_running_loop(self):
+        async def inner():
+            return restcall_async.run_sync(asyncio.sleep(0, result="done"))
+
+        self.assertEqual("done", asyncio.run(inner()))
@@ -0,0 +1,195 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import threading
+import time
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from common.msapi import helper
+from common.utils import shared_backlog
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class TestSharedBacklog(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(
+            CACHES=LOCMEM_CACHES, BACKLOG_LEASE_TIME=0.3)
+        self.cache_settings.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.cache_settings.disable()
+
+    def test_lease(self):
+        first = shared_backlog.SharedBacklog("test")
+        second = shared_backlog.SharedBacklog("test")
+
+        self.assertTrue(first.acquire("job"))
+        self.assertFalse(second.acquire("job"))
+        # renewed by its holder only
+        self.assertEqual([], first.renew(["job"]))
+        self.assertEqual(["job"], second.renew(["job"]))
+
+        # taken over once expired
+        time.sleep(0.4)
+        self.assertTrue(second.acquire("job"))
+        self.assertFalse(first.acquire("job"))
+
+    def test_jobs(self):
+        first = shared_backlog.SharedBacklog("test")
+        second = shared_backlog.SharedBacklog("test")
+
+        first.publish("job1", {"worker": "w", "payload": [1]})
+        second.publish("job2", {"worker": "w", "payload": [2]})
+        self.assertEqual(["job1", "job2"], sorted(first.jobs().keys()))
+
+        second.acquire("job1")
+        first.withdraw("job1")
+        self.assertEqual(["job2"], list(second.jobs().keys()))
+        self.assertTrue(first.acquire("job1"))
+
+    def test_unlock_own_lock_only(self):
+        backlog = shared_backlog.SharedBacklog("test")
+        lock_key = shared_backlog._key("test", "lock")
+
+        def change(jobs):
+            # the lock expired and was taken by another process meanwhile
+            cache.set(lock_key, "other")
+            jobs["job"] = {}
+        backlog._update(change)
+
+        self.assertEqual("other", cache.get(lock_key))
+        self.assertEqual(["job"], list(backlog.jobs().keys()))
+
+    def test_lock(self):
+        backlog = shared_backlog.SharedBacklog("test")
+        with mock.patch.object(shared_backlog, "cache") as mock_cache:
+            # released between the first add and the get
+            mock_cache.add.side_effect = [False, True]
+            mock_cache.get.return_value = None
+            self.assertTrue(backlog._lock("lock"))
+
+            # the cache is not reachable
+            mock_cache.add.side_effect = None
+            mock_cache.add.return_value = False
+            self.assertIsNone(backlog._lock("lock"))
+
+            # taken again by another process meanwhile
+            mock_cache.get.side_effect = [None, "other", None]
+            mock_cache.add.side_effect = [False, False, True]
+            self.assertTrue(backlog._lock("lock"))
+
+
+class TestSharedThreadHelper(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(
+            CACHES=LOCMEM_CACHES, BACKLOG_LEASE_TIME=0.3)
+        self.cache_settings.enable()
+        cache.clear()
+        self.runs = []
+        # helpers of two processes
+        self.helpers = [helper.MultiCloudThreadHelper("test"),
+                        helper.MultiCloudThreadHelper("test")]
+        for index, thread_helper in enumerate(self.helpers):
+            thread_helper.register_worker(
+                "audit", lambda vimid, index=index: self.runs.append(index))
+
+    def tearDown(self):
+        for thread_helper in self.helpers:
+            thread_helper.stop()
+            thread_helper.thread.join(5)
+        self.cache_settings.disable()
+
+    def _wait(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail("condition not met in %s seconds" % timeout)
+            time.sleep(0.01)
+
+    def test_run_once_and_fail_over(self):
+        self.helpers[0].add({
+            "id": "vim1",
+            "worker_name": "audit",
+            "payload": ("vim1",),
+            "repeat": 50000,  # 0.05 second
+        })
+        # known by the other process from the shared backlog
+        self._wait(lambda: "vim1" in self.helpers[1].backlog)
+        self._wait(lambda: len(self.runs) >= 5)
+        self.assertEqual(1, len(set(self.runs)))
+
+        # the owner dies, the other takes over within a lease period
+        owner = self.runs[0]
+        self.helpers[owner].stop()
+        self.helpers[owner].thread.join(5)
+        count = len(self.runs)
+        self._wait(lambda: 1 - owner in self.runs[count:], timeout=2)
+
+    def test_remove(self):
+        self.helpers[0].add({
+            "id": "vim1",
+            "worker_name": "audit",
+            "payload": ("vim1",),
+            "repeat": 50000,
+        })
+        self._wait(lambda: "vim1" in self.helpers[1].backlog)
+
+        # removed through the other process
+        self.helpers[1].remove("vim1")
+        self._wait(lambda: "vim1" not in self.helpers[0].backlog)
+        count = len(self.runs)
+        time.sleep(0.2)
+        self.assertLessEqual(len(self.runs), count + 1)
+
+    @override_settings(BACKLOG_WORKERS=1)
+    def test_heartbeat_not_behind_items(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(vimid):
+            started.set()
+            release.wait(5)
+        thread_helper = helper.MultiCloudThreadHelper("slow")
+        self.helpers.append(thread_helper)
+        thread_helper.register_worker("slow", slow)
+        try:
+            with mock.patch.object(thread_helper.shared, "renew",
+                                   wraps=thread_helper.shared.renew) \
+                    as mock_renew:
+                thread_helper.add({
+                    "id": "vim1",
+                    "worker_name": "slow",
+                    "payload": ("vim1",),
+                    "repeat": 50000,
+                })
+                self.assertTrue(started.wait(5))
+                count = mock_renew.call_count
+                # the only worker is busy, the lease is renewed still
+                self._wait(lambda: mock_renew.call_count >= count + 2,
+                           timeout=2)
+                self.assertEqual(["vim1"], mock_renew.call_args[0][0])
+        finally:
+            release.set()
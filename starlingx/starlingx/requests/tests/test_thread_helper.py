@@ -0,0 +1,166 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import threading
+import time
+import unittest
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from common.msapi import helper
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class TestThreadHelper(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_settings = override_settings(CACHES=LOCMEM_CACHES)
+        self.cache_settings.enable()
+        cache.clear()
+        self.helper = helper.MultiCloudThreadHelper("test")
+        self.helper.start()
+
+    def tearDown(self):
+        self.helper.stop()
+        self.helper.thread.join(5)
+        self.cache_settings.disable()
+
+    def _wait_expired(self, backlog_id, timeout=5):
+        deadline = time.time() + timeout
+        while not self.helper.expired(backlog_id):
+            if time.time() > deadline:
+                self.fail("backlog item %s not processed" % backlog_id)
+            time.sleep(0.01)
+        return self.helper.get(backlog_id)
+
+    def test_record(self):
+        record = helper.BacklogRecord.from_item(
+            {"id": "item", "repeat": 0, "status": (0, "Done")})
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEqual((0, "Done"), record.get("status"))
+        self.assertEqual("default", record.get("payload", "default"))
+        self.assertRaises(KeyError, lambda: record["payload"])
+
+    @override_settings(BACKLOG_EXPIRED_MAX_SIZE=2)
+    def test_expired_bounded(self):
+        thread_helper = helper.MultiCloudThreadHelper("bounded")
+        thread_helper.start()
+        try:
+            for index in range(3):
+                thread_helper.add({
+                    "id": "item%s" % index,
+                    "worker": lambda index=index: (0, "Done %s" % index),
+                    "payload": (),
+                })
+            deadline = time.time() + 5
+            while thread_helper.backlog and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(2, len(thread_helper.expired_backlog))
+            # the evicted item is still known from the cache
+            self.assertEqual(
+                "Done 0", thread_helper.get("item0")["status"])
+        finally:
+            thread_helper.stop()
+            thread_helper.thread.join(5)
+
+    def test_status_written_on_change(self):
+        runs = []
+        done = threading.Event()
+
+        def worker():
+            runs.append(None)
+            if len(runs) >= 5:
+                done.set()
+            return 0, "Idle" if len(runs) <= 3 else "Busy"
+
+        with mock.patch.object(helper, "cache", wraps=cache) as mock_cache:
+            self.helper.add({
+                "worker": worker,
+                "payload": (),
+                "repeat": 10000,  # 0.01 second
+            })
+            self.assertTrue(done.wait(5))
+            time.sleep(0.05)
+            written = [json_str for (_, json_str, _), _
+                       in mock_cache.set.call_args_list]
+        self.assertEqual(2, len(written))
+        self.assertIn("Idle", written[0])
+        self.assertIn("Busy", written[1])
+
+    def test_slow_item_does_not_block(self):
+        release = threading.Event()
+        self.helper.add({
+            "id": "slow",
+            "worker": lambda: (0, "Succeed" if release.wait(5) else "Late"),
+            "payload": (),
+        })
+        # added while the slow item runs, processed at once
+        self.helper.add({
+            "id": "fast",
+            "worker": lambda: (0, "Fast"),
+            "payload": (),
+        })
+        self.assertEqual("Fast", self._wait_expired("fast")["status"])
+        self.assertFalse(self.helper.expired("slow"))
+
+        release.set()
+        self.assertEqual("Succeed", self._wait_expired("slow")["status"])
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.helper.add({
+            "id": "hung",
+            "worker": lambda: (0, "Succeed" if release.wait(5) else "Late"),
+            "payload": (),
+            "timeout": 0.1,
+        })
+        self.assertEqual("Timed out", self._wait_expired("hung")["status"])
+
+        # the late result is dropped
+        release.set()
+        time.sleep(0.1)
+        self.assertEqual("Timed out", self.helper.get("hung")["status"])
+
+    def test_repeat(self):
+        runs = []
+        repeated = threading.Event()
+
+        def worker():
+            runs.append(time.time())
+            if len(runs) == 2:
+                repeated.set()
+            return 0, "Run %s" % len(runs)
+
+        self.helper.add({
+            "id": "repeat",
+            "worker": worker,
+            "payload": (),
+            "repeat": 100000,  # 0.1 second
+        })
+        self.assertTrue(repeated.wait(5))
+        self.assertGreaterEqual(runs[1] - runs[0], 0.09)
+        self.assertFalse(self.helper.expired("repeat"))
+
+        self.helper.remove("repeat")
+        count = len(runs)
+        time.sleep(0.3)
+        self.assertLessEqual(len(runs), count + 1)
+        self.assertIsNone(self.helper.get("repeat"))
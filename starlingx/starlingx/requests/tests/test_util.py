@@ -0,0 +1,71 @@
+# Copyright (c) 2019 Intel Corporation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mock
+import unittest
+
+from newton_base import util
+from newton_base.tests import mock_info
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        util._session_pool.clear()
+
+    def tearDown(self):
+        util._session_pool.clear()
+
+    def test_session_reused_per_project(self):
+        vim_info = mock_info.MOCK_VIM_INFO.copy()
+        sess = util.VimDriverUtils.get_session(vim_info, tenant_name="admin")
+        self.assertIs(
+            sess, util.VimDriverUtils.get_session(vim_info))
+        self.assertIsNot(
+            sess, util.VimDriverUtils.get_session(vim_info, tenant_id="p1"))
+        self.assertEqual(2, len(util._session_pool))
+
+    def test_credentials_updated(self):
+        vim_info = mock_info.MOCK_VIM_INFO.copy()
+        sess = util.VimDriverUtils.get_session(vim_info)
+        vim_info["password"] = "changed"
+        new_sess = util.VimDriverUtils.get_session(vim_info)
+        self.assertIsNot(sess, new_sess)
+        self.assertEqual(
+            "changed", new_sess.auth.auth_methods[0].password)
+
+    def test_auth_state_not_pooled(self):
+        vim_info = mock_info.MOCK_VIM_INFO.copy()
+        sess = util.VimDriverUtils.get_session(
+            vim_info, auth_state=json.dumps(mock_info.MOCK_AUTH_STATE))
+        self.assertIsNot(sess, util.VimDriverUtils.get_session(
+            vim_info, auth_state=json.dumps(mock_info.MOCK_AUTH_STATE)))
+        self.assertEqual(0, len(util._session_pool))
+
+    def test_not_pooled(self):
+        vim_info = mock_info.MOCK_VIM_INFO.copy()
+        sess = util.VimDriverUtils.get_session(vim_info)
+        self.assertIsNot(
+            sess, util.VimDriverUtils.get_session(vim_info, pooled=False))
+        self.assertEqual(1, len(util._session_pool))
+
+    def test_discard_on_auth_failure(self):
+        vim_info = mock_info.MOCK_VIM_INFO.copy()
+        sess = util.VimDriverUtils.get_session(vim_info)
+        with mock.patch.object(
+                sess, "get_auth_headers", side_effect=Exception("401")):
+            self.assertRaises(
+                Exception, util.VimDriverUtils.get_auth_state, sess)
+        self.assertIsNot(sess, util.VimDriverUtils.get_session(vim_info))
@@ -17,6 +17,7 @@ from starlingx_base.registration import registration
 from newton_base.openoapi import tenants
 from starlingx_base.resource import capacity
 from starlingx_base.resource import infra_workload
+from common.utils import bulkhead
 
 urlpatterns = [
     url(r'^', include('starlingx.swagger.urls')),
@@ -40,6 +41,9 @@ urlpatterns = [
     url(r'^api/multicloud-starlingx/v0/(?P<vimid>[0-9a-zA-Z_-]+)/'
         r'infra_workload/(?P<workloadid>[0-9a-zA-Z_-]+)/?$',
         infra_workload.InfraWorkload.as_view()),
+    url(r'^api/multicloud-starlingx/v0/(?P<vimid>[0-9a-zA-Z_-]+)/'
+        r'bulkhead/?$',
+        bulkhead.VimBulkheadGauges.as_view()),
     url(r'^api/multicloud-starlingx/v0/(?P<vimid>[0-9a-zA-Z_-]+)/',
         include('starlingx.proxy.urls')),
 
@@ -50,6 +54,9 @@ urlpatterns = [
     url(r'^api/multicloud-starlingx/v1/(?P<cloud_owner>[0-9a-zA-Z_-]+)/'
         r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/?$',
         registration.APIv1Registry.as_view()),
+    url(r'^api/multicloud-starlingx/v1/(?P<cloud_owner>[0-9a-zA-Z_-]+)/'
+        r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/bulkhead/?$',
+        bulkhead.VimBulkheadGauges.as_view()),
     url(r'^api/multicloud-starlingx/v1/(?P<cloud_owner>[0-9a-zA-Z_-]+)/'
         r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/',
         include('starlingx.proxy.urlsV1')),
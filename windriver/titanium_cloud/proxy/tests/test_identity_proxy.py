@@ -634,6 +634,10 @@ class TestIdentityService(unittest.TestCase):
         self.assertEqual(mock_info.MOCK_TOKEN_ID,
                          response['X-Subject-Token'])
         self.assertIsNotNone(context['token']['catalog'])
+        # not the token of a pooled session
+        mock_get_session.assert_called_once_with(
+            mock_info.MOCK_VIM_INFO, tenant_name="Integration",
+            tenant_id=None, pooled=False)
 
     @mock.patch.object(VimDriverUtils, 'get_vim_info')
     @mock.patch.object(VimDriverUtils, 'get_session')
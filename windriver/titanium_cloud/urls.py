@@ -18,6 +18,7 @@ from starlingx_base.registration import registration
 from newton_base.openoapi import tenants
 from starlingx_base.resource import capacity
 from starlingx_base.resource import infra_workload
+from common.utils import bulkhead
 
 urlpatterns = [
     url(r'^', include('titanium_cloud.swagger.urls')),
@@ -89,6 +90,9 @@ urlpatterns = [
     url(r'^api/multicloud-titaniumcloud/v0/(?P<vimid>[0-9a-zA-Z_-]+)/'
         r'infra_workload/(?P<workloadid>[0-9a-zA-Z_-]+)/?$',
         infra_workload.InfraWorkload.as_view()),
+    url(r'^api/multicloud-titaniumcloud/v0/(?P<vimid>[0-9a-zA-Z_-]+)/'
+        r'bulkhead/?$',
+        bulkhead.VimBulkheadGauges.as_view()),
     url(r'^api/multicloud-titaniumcloud/v0/(?P<vimid>[0-9a-zA-Z_-]+)/',
         include('titanium_cloud.proxy.urls')),
     url(r'^api/multicloud-titaniumcloud/v0/(?P<vimid>[0-9a-zA-Z_-]+)/'
@@ -128,6 +132,9 @@ urlpatterns = [
         r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/infra_workload/'
         r'(?P<workloadid>[0-9a-zA-Z_-]+)/?$',
         infra_workload.APIv1InfraWorkload.as_view()),
+    url(r'^api/multicloud-titaniumcloud/v1/(?P<cloud_owner>[0-9a-zA-Z_-]+)/'
+        r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/bulkhead/?$',
+        bulkhead.VimBulkheadGauges.as_view()),
     url(r'^api/multicloud-titaniumcloud/v1/(?P<cloud_owner>[0-9a-zA-Z_-]+)/'
         r'(?P<cloud_region_id>[0-9a-zA-Z_-]+)/',
         include('titanium_cloud.proxy.urlsV1')),